@@ -1,27 +1,132 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query
+from datetime import datetime, timedelta, timezone
+from typing import Optional
 
-from app.db.mongodb import get_database
+from app.db.mongodb import get_database, get_read_database, pool_stats
+from app.db.slow_queries import slow_query_log
 from app.models.user import UserResponse, UserRole
 from app.core.security import require_role
+from app.core.tasks import spawn_task
+from app.services.stats_service import get_stats, reconcile_stats
+from app.services.rollup_service import get_timeseries, backfill_rollups
+from app.services.geocoding_service import get_geocoder
+from app.services.dispatch_service import run_dispatch, dispatch_stats
+from app.services.eta_service import eta_model, retrain_eta_model
+from app.services.location_service import location_store
+from app.services.agent_index import agent_index
 
 router = APIRouter()
 
+def _to_utc_naive(value: Optional[datetime]) -> Optional[datetime]:
+    # Stored timestamps are naive UTC
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
 @router.get("/stats")
 async def get_admin_stats(current_user: UserResponse = Depends(require_role([UserRole.ADMIN]))):
+    db = await get_read_database()
+    # Served from counters maintained on order, user and product writes
+    return await get_stats(db)
+
+@router.post("/stats/reconcile")
+async def reconcile_admin_stats(current_user: UserResponse = Depends(require_role([UserRole.ADMIN]))):
     db = await get_database()
-    total_products = await db.products.count_documents({})
-    total_orders = await db.orders.count_documents({})
-    total_customers = await db.users.count_documents({"role": UserRole.CUSTOMER})
-    total_agents = await db.users.count_documents({"role": UserRole.DELIVERY_AGENT})
+    return await reconcile_stats(db)
+
+@router.get("/stats/timeseries")
+async def get_stats_timeseries(
+    granularity: str = Query("day", description="Bucket size: hour or day"),
+    start: Optional[datetime] = Query(None, description="Range start (defaults to 30 days / 48 hours ago)"),
+    end: Optional[datetime] = Query(None, description="Range end, exclusive (defaults to now)"),
+    dimension: str = Query("all", description="all, zone or category"),
+    key: Optional[str] = Query(None, description="Zone id or category name for non-'all' dimensions"),
+    current_user: UserResponse = Depends(require_role([UserRole.ADMIN]))
+):
+    db = await get_read_database()
+    end = _to_utc_naive(end) or datetime.utcnow()
+    start = _to_utc_naive(start) or end - (timedelta(hours=48) if granularity == "hour" else timedelta(days=30))
+    if start >= end:
+        raise HTTPException(status_code=400, detail="start must be before end")
     
-    # Calculate revenue
-    orders = await db.orders.find({"status": "delivered"}).to_list(1000)
-    total_revenue = sum(order.get('total_amount', 0) for order in orders)
+    try:
+        series = await get_timeseries(db, granularity, start, end, dimension, key)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
     return {
-        "total_products": total_products,
-        "total_orders": total_orders,
-        "total_customers": total_customers,
-        "total_agents": total_agents,
-        "total_revenue": total_revenue
+        "granularity": granularity,
+        "dimension": dimension,
+        "key": key,
+        "buckets": series
     }
+
+@router.post("/stats/timeseries/backfill")
+async def backfill_stats_timeseries(
+    since: Optional[datetime] = Query(None, description="Only rebuild buckets from this day on (up to yesterday; today stays live)"),
+    current_user: UserResponse = Depends(require_role([UserRole.ADMIN]))
+):
+    if not spawn_task("rollup-backfill", backfill_rollups, _to_utc_naive(since)):
+        raise HTTPException(status_code=409, detail="A rollup backfill is already running")
+    return {"message": "Rollup backfill started"}
+
+
+@router.get("/geocoding/stats")
+async def get_geocoding_stats(current_user: UserResponse = Depends(require_role([UserRole.ADMIN]))):
+    return get_geocoder().stats()
+
+@router.post("/dispatch/run")
+async def run_admin_dispatch(
+    dry_run: bool = Query(False, description="Plan assignments without writing them"),
+    current_user: UserResponse = Depends(require_role([UserRole.ADMIN]))
+):
+    db = await get_database()
+    return await run_dispatch(db, dry_run=dry_run)
+
+@router.get("/dispatch/stats")
+async def get_dispatch_stats(current_user: UserResponse = Depends(require_role([UserRole.ADMIN]))):
+    return dispatch_stats()
+
+@router.get("/eta/stats")
+async def get_eta_stats(current_user: UserResponse = Depends(require_role([UserRole.ADMIN]))):
+    return eta_model.stats()
+
+@router.post("/eta/retrain")
+async def retrain_eta(
+    days: Optional[int] = Query(None, ge=1, description="Training window in days (defaults to ETA_TRAINING_DAYS)"),
+    current_user: UserResponse = Depends(require_role([UserRole.ADMIN]))
+):
+    if not spawn_task("eta-retrain", retrain_eta_model, days):
+        raise HTTPException(status_code=409, detail="ETA retraining is already running")
+    return {"message": "ETA retraining started"}
+
+@router.get("/locations/stats")
+async def get_location_stats(current_user: UserResponse = Depends(require_role([UserRole.ADMIN]))):
+    """Location ingestion counters for this worker"""
+    return location_store.stats()
+
+@router.get("/agent-index/stats")
+async def get_agent_index_stats(current_user: UserResponse = Depends(require_role([UserRole.ADMIN]))):
+    return agent_index.stats()
+
+@router.get("/db/pool")
+async def get_db_pool_stats(current_user: UserResponse = Depends(require_role([UserRole.ADMIN]))):
+    """MongoDB client options and connection pool usage for this worker"""
+    return pool_stats()
+
+@router.get("/db/slow-queries")
+async def get_slow_queries(
+    limit: int = Query(50, ge=1, le=500),
+    current_user: UserResponse = Depends(require_role([UserRole.ADMIN]))
+):
+    """
+    Slow MongoDB commands seen by this worker: query shapes by total time, with the
+    routes or jobs that issued them and their sampled explain plan, and the latest occurrences
+    """
+    return slow_query_log.report(limit)
+
+@router.delete("/db/slow-queries")
+async def reset_slow_queries(current_user: UserResponse = Depends(require_role([UserRole.ADMIN]))):
+    """Forget recorded slow queries (e.g. after adding an index)"""
+    slow_query_log.reset()
+    return {"message": "Slow query log cleared"}
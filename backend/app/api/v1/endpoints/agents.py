@@ -0,0 +1,126 @@
+from fastapi import APIRouter, HTTPException, Depends, Query, WebSocket, WebSocketDisconnect, status
+from pydantic import ValidationError
+from datetime import datetime, timedelta
+from typing import List, Optional
+import json
+
+from app.db.mongodb import get_database
+from app.models.location import LocationPing, LocationBatch, AgentLocation, AgentSuggestion
+from app.models.user import UserResponse, UserRole
+from app.core.security import require_role, get_user_from_token
+from app.core.config import settings
+from app.services.location_service import AgentPosition, location_store, get_agent_position, get_agent_history
+from app.services.agent_index import agent_index, refresh_agent_index
+
+router = APIRouter()
+
+def _ingest(agent_id: str, ping: LocationPing) -> bool:
+    return location_store.ingest(
+        agent_id, ping.latitude, ping.longitude,
+        ping.accuracy_m, ping.speed_mps, ping.heading, ping.recorded_at
+    )
+
+@router.post("/location")
+async def report_location(ping: LocationPing, current_user: UserResponse = Depends(require_role([UserRole.DELIVERY_AGENT]))):
+    """Report the agent's current position (the app sends one every few seconds while on shift)"""
+    return {"received": 1, "latest": _ingest(current_user.id, ping)}
+
+@router.post("/location/batch")
+async def report_location_batch(batch: LocationBatch, current_user: UserResponse = Depends(require_role([UserRole.DELIVERY_AGENT]))):
+    """Report positions buffered while the app was offline"""
+    latest = [_ingest(current_user.id, ping) for ping in batch.pings]
+    return {"received": len(latest), "latest": any(latest)}
+
+@router.websocket("/location/ws")
+async def location_stream(websocket: WebSocket, token: str = Query(...)):
+    """
+    Stream positions over one connection instead of a request per ping.
+
+    Authenticates once with `?token=<access token>`. Each message is a ping
+    object, a list of pings or {"pings": [...]}, and is acknowledged with
+    {"received": n}; invalid messages get {"error": ...} and the connection stays open.
+    """
+    try:
+        user = await get_user_from_token(token)
+    except HTTPException as e:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason=e.detail)
+        return
+    if user.role != UserRole.DELIVERY_AGENT:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="Not enough permissions")
+        return
+
+    await websocket.accept()
+    try:
+        while True:
+            message = await websocket.receive_text()
+            try:
+                payload = json.loads(message)
+                if isinstance(payload, dict) and "pings" in payload:
+                    pings = LocationBatch(**payload).pings
+                else:
+                    pings = LocationBatch(pings=payload if isinstance(payload, list) else [payload]).pings
+            except (ValueError, TypeError, ValidationError) as e:
+                await websocket.send_json({"error": str(e)})
+                continue
+            for ping in pings:
+                _ingest(user.id, ping)
+            await websocket.send_json({"received": len(pings)})
+    except WebSocketDisconnect:
+        pass
+
+@router.get("/locations", response_model=List[AgentLocation])
+async def get_agent_locations(
+    include_stale: bool = Query(False, description="Include agents not heard from within LOCATION_STALE_SECONDS"),
+    current_user: UserResponse = Depends(require_role([UserRole.ADMIN]))
+):
+    """Latest position of every agent, across all workers"""
+    db = await get_database()
+    now = datetime.utcnow()
+    query = {} if include_stale else {"recorded_at": {"$gte": now - timedelta(seconds=settings.LOCATION_STALE_SECONDS)}}
+    positions = {doc['agent_id']: AgentPosition.from_document(doc) for doc in await db.agent_locations.find(query, {"_id": 0}).to_list(None)}
+    # Pings this worker has not flushed yet
+    for agent_id, local in location_store.latest.items():
+        stored = positions.get(agent_id)
+        if stored is None or local.recorded_at > stored.recorded_at:
+            positions[agent_id] = local
+    return [
+        AgentLocation(**p.describe(now))
+        for p in sorted(positions.values(), key=lambda p: p.agent_id)
+        if include_stale or (now - p.recorded_at).total_seconds() <= settings.LOCATION_STALE_SECONDS
+    ]
+
+@router.get("/nearest", response_model=List[AgentSuggestion])
+async def get_nearest_agents(
+    latitude: float = Query(..., ge=-90, le=90),
+    longitude: float = Query(..., ge=-180, le=180),
+    k: int = Query(None, ge=1, le=50, description="Number of agents (defaults to AGENT_SUGGESTIONS_K)"),
+    zone_id: Optional[str] = Query(None, description="Only agents serving this zone"),
+    include_busy: bool = Query(False, description="Include agents at capacity or without a fresh position"),
+    current_user: UserResponse = Depends(require_role([UserRole.ADMIN]))
+):
+    """Agents closest to a point, by their live positions"""
+    if agent_index.loaded_at is None:
+        await refresh_agent_index(await get_database())
+    now = datetime.utcnow()
+    matches = agent_index.nearest(latitude, longitude, k, zone_id=zone_id, available_only=not include_busy, now=now)
+    return [AgentSuggestion(**agent_index.describe(distance, entry, now)) for distance, entry in matches]
+
+@router.get("/{agent_id}/location", response_model=AgentLocation)
+async def get_agent_location(agent_id: str, current_user: UserResponse = Depends(require_role([UserRole.ADMIN]))):
+    db = await get_database()
+    position = await get_agent_position(db, agent_id)
+    if position is None:
+        raise HTTPException(status_code=404, detail="No location reported for this agent")
+    return AgentLocation(**position.describe())
+
+@router.get("/{agent_id}/track")
+async def get_agent_track(
+    agent_id: str,
+    minutes: int = Query(60, ge=1, le=24 * 60),
+    current_user: UserResponse = Depends(require_role([UserRole.ADMIN]))
+):
+    """Points an agent reported in the last `minutes` (flushed history only)"""
+    db = await get_database()
+    since = datetime.utcnow() - timedelta(minutes=minutes)
+    points = await get_agent_history(db, agent_id, since)
+    return {"agent_id": agent_id, "since": since, "count": len(points), "points": points}
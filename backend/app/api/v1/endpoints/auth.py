@@ -5,6 +5,7 @@ import logging
 from app.db.mongodb import get_database
 from app.models.user import UserCreate, UserLogin, TokenResponse, UserResponse, User # Import User model
 from app.core.security import hash_password, verify_password, create_access_token, get_current_user
+from app.services.stats_service import record_user_created
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -24,6 +25,7 @@ async def register(user_data: UserCreate):
             password=hash_password(user_data.password)
         )
         await db.users.insert_one(user.dict())
+        await record_user_created(db, user.role)
         
         # Create token
         access_token = create_access_token(data={"sub": user.id, "role": user.role})
@@ -1,83 +1,118 @@
-from fastapi import APIRouter, HTTPException, Depends
-from typing import List, Dict, Any
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response
+from fastapi.encoders import jsonable_encoder
+from typing import List, Dict, Any, Optional
 import uuid
-from datetime import datetime
+import json
+import logging
 
 from app.db.mongodb import get_database
-from app.models.delivery_zone import DeliveryZone, DeliveryZoneCreate, DeliveryZoneLegacy, GeoJSONPolygon
+from app.models.delivery_zone import DeliveryZone, DeliveryZoneCreate, DeliveryZoneLegacy, GeoJSONPolygon, ServiceabilityBatchRequest, ServiceabilityBatchResponse
 from app.models.user import UserResponse, UserRole
 from app.core.security import require_role, get_current_user
+from app.services.zone_index import refresh_zone_index, zone_index
+from app.services.geospatial_service import get_zones_for_locations
+from app.services.zone_geometry import extract_zone_features, merge_geometries, normalize_zone_geometry
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
+
+MAX_SERVICEABILITY_BATCH = 50000
+
+# Serialized zone listing for the current zone index version
+_listing_cache: Dict[str, Any] = {}
 
 @router.get("", response_model=List[DeliveryZone])
-async def get_delivery_zones(current_user: UserResponse = Depends(get_current_user)):
-    db = await get_database()
-    zones = await db.delivery_zones.find().to_list(1000)
+async def get_delivery_zones(request: Request, current_user: UserResponse = Depends(get_current_user)):
+    """
+    List zones from the in-process zone index.
     
-    # Convert legacy format to new format if needed
-    converted_zones = []
-    for zone in zones:
-        if 'coordinates' in zone and 'geometry' not in zone:
-            # Convert legacy format to GeoJSON
-            coords = [[point['lng'], point['lat']] for point in zone['coordinates']]
-            # Close the polygon if not already closed
-            if coords and coords[0] != coords[-1]:
-                coords.append(coords[0])
-            zone['geometry'] = {
-                'type': 'Polygon',
-                'coordinates': [coords]
-            }
-            # Remove old coordinates field
-            del zone['coordinates']
-        converted_zones.append(zone)
+    Every stored zone is listed (legacy zones converted to GeoJSON), including
+    any the index could not compile, so the body matches the ETag computed
+    over the stored documents. The serialized body is cached per index version,
+    so unchanged listings are answered with 304 Not Modified.
+    """
+    if not zone_index.loaded:
+        db = await get_database()
+        await zone_index.refresh(db)
     
-    return [DeliveryZone(**z) for z in converted_zones]
+    # ETag and documents from the same build
+    snapshot = zone_index.snapshot
+    etag = snapshot.etag
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    
+    if _listing_cache.get("etag") != etag:
+        zones = [DeliveryZone(**z) for z in snapshot.documents]
+        _listing_cache.update(etag=etag, body=json.dumps(jsonable_encoder(zones)).encode())
+    return Response(content=_listing_cache["body"], media_type="application/json", headers=headers)
 
 @router.post("/", response_model=DeliveryZone)
-async def create_delivery_zone(zone_data: Dict[str, Any], current_user: UserResponse = Depends(require_role([UserRole.ADMIN]))):
+async def create_delivery_zone(
+    zone_data: Dict[str, Any],
+    simplify_tolerance_m: Optional[float] = Query(None, ge=0, description="Douglas-Peucker tolerance in metres"),
+    current_user: UserResponse = Depends(require_role([UserRole.ADMIN]))
+):
     db = await get_database()
     
     # Handle GeoJSON FeatureCollection format
     if zone_data.get('type') == 'FeatureCollection':
-        features = zone_data.get('features', [])
-        if not features:
-            raise HTTPException(status_code=400, detail="FeatureCollection must contain at least one feature")
-        
-        # Process the first feature (assuming single polygon)
-        feature = features[0]
-        geometry = feature.get('geometry', {})
-        
-        if geometry.get('type') != 'Polygon':
-            raise HTTPException(status_code=400, detail="Geometry must be a Polygon")
-        
-        # Create delivery zone with the polygon data
-        delivery_zone_data = {
-            "id": str(uuid.uuid4()),
-            "name": feature.get('properties', {}).get('name', f'Delivery Zone {str(uuid.uuid4())[:8]}'),
-            "geometry": {
-                "type": "Polygon",
-                "coordinates": geometry.get('coordinates', [])
-            },
-            "assigned_agents": [],
-            "created_at": datetime.utcnow()
-        }
+        try:
+            features = extract_zone_features(zone_data)
+            # Every feature becomes part of the same zone
+            geometry, report = normalize_zone_geometry(merge_geometries([g for _, g in features]), simplify_tolerance_m)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         
-        await db.delivery_zones.insert_one(delivery_zone_data)
-        return DeliveryZone(**delivery_zone_data)
+        name = zone_data.get('name') or features[0][0] or f'Delivery Zone {str(uuid.uuid4())[:8]}'
+        zone = DeliveryZone(name=name, geometry=geometry)
     
     # Handle standard DeliveryZoneCreate format
     elif 'name' in zone_data and 'geometry' in zone_data:
         try:
             delivery_zone_create = DeliveryZoneCreate(**zone_data)
-            zone = DeliveryZone(**delivery_zone_create.dict())
-            await db.delivery_zones.insert_one(zone.dict())
-            return zone
+            geometry, report = normalize_zone_geometry(delivery_zone_create.geometry.dict(), simplify_tolerance_m)
+            zone = DeliveryZone(name=delivery_zone_create.name, geometry=geometry)
         except Exception as e:
             raise HTTPException(status_code=400, detail=f"Invalid delivery zone format: {str(e)}")
     
     else:
         raise HTTPException(status_code=400, detail="Invalid delivery zone data format. Must be either DeliveryZoneCreate or GeoJSON FeatureCollection.")
+    
+    logger.info(f"Delivery zone {zone.id} ingested: {report}")
+    await db.delivery_zones.insert_one(zone.dict())
+    await refresh_zone_index(db)
+    return zone
+
+@router.post("/import")
+async def import_delivery_zones(
+    zone_data: Dict[str, Any],
+    simplify_tolerance_m: Optional[float] = Query(None, ge=0, description="Douglas-Peucker tolerance in metres"),
+    current_user: UserResponse = Depends(require_role([UserRole.ADMIN]))
+):
+    """Create one zone per feature of a FeatureCollection, with an ingest report for each"""
+    db = await get_database()
+    try:
+        features = extract_zone_features(zone_data)
+        zones, reports = [], []
+        for i, (name, geometry) in enumerate(features):
+            try:
+                geometry, report = normalize_zone_geometry(geometry, simplify_tolerance_m)
+            except ValueError as e:
+                raise ValueError(f"Feature {i}: {e}")
+            zones.append(DeliveryZone(name=name or f'Delivery Zone {str(uuid.uuid4())[:8]}', geometry=geometry))
+            reports.append({"name": zones[-1].name, **report})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    await db.delivery_zones.insert_many([zone.dict() for zone in zones])
+    await refresh_zone_index(db)
+    return {
+        "zones": zones,
+        "reports": reports,
+        "vertices_before": sum(r["vertices_before"] for r in reports),
+        "vertices_after": sum(r["vertices_after"] for r in reports)
+    }
 
 @router.put("/{zone_id}/assign-agent")
 async def assign_agent_to_zone(zone_id: str, agent_id: str, current_user: UserResponse = Depends(require_role([UserRole.ADMIN]))):
@@ -100,6 +135,7 @@ async def assign_agent_to_zone(zone_id: str, agent_id: str, current_user: UserRe
         {"id": zone_id},
         {"$set": {"assigned_agents": assigned_agents}}
     )
+    await refresh_zone_index(db)
     
     # Update agent's zone
     await db.users.update_one(
@@ -107,4 +143,24 @@ async def assign_agent_to_zone(zone_id: str, agent_id: str, current_user: UserRe
         {"$set": {"delivery_zone_id": zone_id}}
     )
     
-    return {"message": "Agent assigned to zone"}
\ No newline at end of file
+    return {"message": "Agent assigned to zone"}
+
+@router.get("/index/stats")
+async def get_zone_index_stats(current_user: UserResponse = Depends(require_role([UserRole.ADMIN]))):
+    return zone_index.stats()
+
+
+@router.post("/serviceability/batch", response_model=ServiceabilityBatchResponse)
+async def check_serviceability_batch(request: ServiceabilityBatchRequest, current_user: UserResponse = Depends(require_role([UserRole.ADMIN]))):
+    if len(request.points) > MAX_SERVICEABILITY_BATCH:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_SERVICEABILITY_BATCH} points per request")
+    
+    db = await get_database()
+    zones = await get_zones_for_locations(db, request.points)
+    zone_ids = [zone['id'] if zone else None for zone in zones]
+    
+    return ServiceabilityBatchResponse(
+        zone_ids=zone_ids,
+        total=len(zone_ids),
+        serviceable=sum(1 for zone_id in zone_ids if zone_id)
+    )
@@ -1,81 +1,27 @@
-from fastapi import APIRouter, HTTPException, Depends
-from typing import List
+from fastapi import APIRouter, HTTPException, Depends, Query
+from typing import List, Optional
 from datetime import datetime
 import httpx
+from pymongo import ReturnDocument
 
 from app.db.mongodb import get_database
 from app.models.order import Order, OrderCreate, OrderStatusUpdate, OrderItem
 from app.models.product import Product
 from app.models.user import UserResponse, UserRole
 from app.models.route import Waypoint
+from app.models.location import OrderAgentLocation, AgentSuggestion
 from app.core.security import require_role, get_current_user
 from app.services.geospatial_service import get_zone_for_location, extract_coordinates_from_address
+from app.services import order_events
+from app.services.geocoding_service import get_geocoder
+from app.services.eta_service import eta_model
+from app.services.dispatch_service import ACTIVE_STATUSES
+from app.services.geo_math import haversine_km, format_delivery_minutes
+from app.services.location_service import get_agent_position
+from app.services.agent_index import claim_order, suggest_agents
 
 router = APIRouter()
 
-# Average delivery speed in km/h
-AVERAGE_DELIVERY_SPEED = 30  # Adjust based on your requirements
-
-def calculate_distance(coord1: dict, coord2: dict) -> float:
-    """
-    Calculate the approximate distance between two coordinates using the haversine formula.
-    Returns distance in kilometers.
-    """
-    import math
-    
-    # Earth's radius in kilometers
-    R = 6371.0
-    
-    lat1_rad = math.radians(coord1['latitude'])
-    lon1_rad = math.radians(coord1['longitude'])
-    lat2_rad = math.radians(coord2['latitude'])
-    lon2_rad = math.radians(coord2['longitude'])
-    
-    dlat = lat2_rad - lat1_rad
-    dlon = lon2_rad - lon1_rad
-    
-    a = math.sin(dlat / 2)**2 + math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(dlon / 2)**2
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-    
-    distance = R * c
-    return distance
-
-def estimate_delivery_time(distance_km: float, speed_kmh: float = AVERAGE_DELIVERY_SPEED) -> dict:
-    """
-    Estimate delivery time based on distance and speed.
-    Returns a dictionary with estimated time and formatted string.
-    """
-    if distance_km <= 0:
-        return {
-            "minutes": 5,
-            "formatted": "5 minutes or less"
-        }
-    
-    # Calculate time in hours
-    time_hours = distance_km / speed_kmh
-    
-    # Convert to minutes
-    time_minutes = int(time_hours * 60)
-    
-    # Ensure minimum time of 5 minutes
-    time_minutes = max(time_minutes, 5)
-    
-    # Format the time string
-    if time_minutes < 60:
-        formatted_time = f"{time_minutes} minutes"
-    else:
-        hours = time_minutes // 60
-        minutes = time_minutes % 60
-        if minutes == 0:
-            formatted_time = f"{hours} hour{'s' if hours > 1 else ''}"
-        else:
-            formatted_time = f"{hours} hour{'s' if hours > 1 else ''} and {minutes} minute{'s' if minutes > 1 else ''}"
-    
-    return {
-        "minutes": time_minutes,
-        "formatted": formatted_time
-    }
-
 @router.post("", response_model=Order)
 async def create_order(order_data: OrderCreate, current_user: UserResponse = Depends(get_current_user)):
     db = await get_database()
@@ -100,13 +46,14 @@ async def create_order(order_data: OrderCreate, current_user: UserResponse = Dep
                 detail="Invalid delivery coordinates format. Latitude and longitude must be numeric."
             )
     else:
-        # Extract coordinates from address string (fallback method)
+        # Extract coordinates from address string, then fall back to geocoding
         coordinates = extract_coordinates_from_address(order_data.delivery_address)
         if not coordinates:
-            # In a real implementation, we would use a geocoding service here
+            coordinates = await get_geocoder().geocode(db, order_data.delivery_address)
+        if not coordinates:
             raise HTTPException(
                 status_code=400, 
-                detail="Could not extract coordinates from delivery address. Please include coordinates in format 'lat,lng: 13.1056,77.5951' at the end of the address or provide delivery_coordinates object"
+                detail="Could not locate the delivery address. Please include coordinates in format 'lat,lng: 13.1056,77.5951' at the end of the address or provide delivery_coordinates object"
             )
     
     latitude, longitude = coordinates
@@ -137,7 +84,8 @@ async def create_order(order_data: OrderCreate, current_user: UserResponse = Dep
             product_id=product['id'],
             product_name=product['name'],
             quantity=cart_item['quantity'],
-            price=product['price']
+            price=product['price'],
+            category=product.get('category')
         ).dict())
         
         # Update stock
@@ -146,19 +94,10 @@ async def create_order(order_data: OrderCreate, current_user: UserResponse = Dep
             {"$inc": {"stock": -cart_item['quantity']}}
         )
     
-    # Calculate estimated delivery time
+    # Estimate delivery time from the learned per-zone, per-hour model (in-memory lookup)
     estimated_time = None
     try:
-        # Get the delivery agent's location (for demo purposes, we'll use a fixed point)
-        # In a real implementation, you would get the actual agent's location
-        agent_location = {"latitude": 13.1056, "longitude": 77.5951}  # Example agent location
-        customer_location = {"latitude": latitude, "longitude": longitude}
-        
-        # Calculate distance between agent and customer
-        distance = calculate_distance(agent_location, customer_location)
-        
-        # Estimate delivery time
-        estimated_time = estimate_delivery_time(distance)
+        estimated_time = eta_model.estimate(zone.get('id'), (latitude, longitude))
     except Exception as e:
         # If there's an error calculating ETA, we'll just leave it as None
         print(f"Error calculating estimated delivery time: {e}")
@@ -175,10 +114,12 @@ async def create_order(order_data: OrderCreate, current_user: UserResponse = Dep
             "latitude": latitude,
             "longitude": longitude
         },
+        zone_id=zone.get('id'),
         estimated_delivery_time=estimated_time
     )
     
     await db.orders.insert_one(order.dict())
+    await order_events.order_created(db, order.dict())
     
     # Clear cart
     await db.carts.update_one(
@@ -218,6 +159,90 @@ async def get_order(order_id: str, current_user: UserResponse = Depends(get_curr
     
     return Order(**order)
 
+@router.get("/{order_id}/agent-location", response_model=OrderAgentLocation)
+async def get_order_agent_location(order_id: str, current_user: UserResponse = Depends(get_current_user)):
+    """Live position of the agent delivering an order, with the remaining ETA to the drop"""
+    db = await get_database()
+    order = await db.orders.find_one(
+        {"id": order_id},
+        {"_id": 0, "user_id": 1, "status": 1, "zone_id": 1, "delivery_agent_id": 1, "delivery_location": 1}
+    )
+    if not order:
+        raise HTTPException(status_code=404, detail="Order not found")
+    
+    # Check permissions: the customer, the assigned agent or an admin
+    if current_user.role != UserRole.ADMIN and current_user.id not in (order['user_id'], order.get('delivery_agent_id')):
+        raise HTTPException(status_code=403, detail="Not authorized to view this order")
+    if not order.get('delivery_agent_id') or order.get('status') not in ACTIVE_STATUSES:
+        raise HTTPException(status_code=404, detail="Order is not out for delivery")
+    
+    position = await get_agent_position(db, order['delivery_agent_id'])
+    if position is None:
+        raise HTTPException(status_code=404, detail="Agent location not available yet")
+    
+    result = {**position.describe(), "order_id": order_id}
+    drop = order.get('delivery_location')
+    if drop:
+        distance_km = haversine_km(position.latitude, position.longitude, drop['latitude'], drop['longitude'])
+        result["distance_km"] = round(distance_km, 3)
+        result["eta"] = format_delivery_minutes(eta_model.travel_minutes(order.get('zone_id'), distance_km))
+    return OrderAgentLocation(**result)
+
+@router.get("/{order_id}/agent-suggestions", response_model=List[AgentSuggestion])
+async def get_order_agent_suggestions(
+    order_id: str,
+    k: int = Query(None, ge=1, le=50, description="Number of agents (defaults to AGENT_SUGGESTIONS_K)"),
+    current_user: UserResponse = Depends(require_role([UserRole.ADMIN]))
+):
+    """Closest available agents serving the order's zone, nearest to the drop first"""
+    db = await get_database()
+    order = await db.orders.find_one({"id": order_id}, {"_id": 0, "zone_id": 1, "delivery_location": 1})
+    if not order:
+        raise HTTPException(status_code=404, detail="Order not found")
+    return [AgentSuggestion(**s) for s in await suggest_agents(db, order, k)]
+
+@router.post("/{order_id}/assign")
+async def assign_order(
+    order_id: str,
+    agent_id: Optional[str] = Query(None, description="Agent to assign (defaults to the closest suggestion)"),
+    current_user: UserResponse = Depends(require_role([UserRole.ADMIN]))
+):
+    db = await get_database()
+    order = await db.orders.find_one({"id": order_id}, {"_id": 0})
+    if not order:
+        raise HTTPException(status_code=404, detail="Order not found")
+    
+    if agent_id is None:
+        suggestions = await suggest_agents(db, order, 1)
+        if not suggestions:
+            raise HTTPException(status_code=409, detail="No available agent near this order")
+        agent_id = suggestions[0]['agent_id']
+    elif not await db.users.count_documents({"id": agent_id, "role": UserRole.DELIVERY_AGENT}, limit=1):
+        raise HTTPException(status_code=404, detail="Delivery agent not found")
+    
+    # Same conditional claim as accept_order, so it cannot race an agent or the dispatcher
+    now = datetime.utcnow()
+    changes = {
+        "delivery_agent_id": agent_id,
+        "status": "preparing",
+        "accepted_at": now,
+        "updated_at": now
+    }
+    previous, at_capacity = await claim_order(
+        db, agent_id,
+        {"id": order_id, "delivery_agent_id": None, "status": {"$in": ["pending", "confirmed"]}},
+        changes,
+        return_document=ReturnDocument.BEFORE
+    )
+    if at_capacity:
+        raise HTTPException(status_code=409, detail="Delivery agent is at capacity")
+    if not previous:
+        raise HTTPException(status_code=400, detail="Order is already assigned or no longer open")
+    
+    await order_events.order_status_changed(db, {**previous, **changes}, previous.get('status'), "preparing")
+    
+    return {"message": "Order assigned", "agent_id": agent_id}
+
 @router.put("/{order_id}/status")
 async def update_order_status(order_id: str, status_update: OrderStatusUpdate, current_user: UserResponse = Depends(get_current_user)):
     db = await get_database()
@@ -229,30 +254,47 @@ async def update_order_status(order_id: str, status_update: OrderStatusUpdate, c
     if current_user.role == UserRole.CUSTOMER:
         raise HTTPException(status_code=403, detail="Not authorized to update order status")
     
+    now = datetime.utcnow()
+    changes = {"status": status_update.status, "updated_at": now}
+    if status_update.status == "delivered" and order.get('status') != "delivered":
+        changes["delivered_at"] = now
+    
     await db.orders.update_one(
         {"id": order_id},
-        {"$set": {"status": status_update.status, "updated_at": datetime.utcnow()}}
+        {"$set": changes}
     )
+    await order_events.order_status_changed(db, {**order, **changes}, order.get('status'), status_update.status)
     
     return {"message": "Order status updated"}
 
 @router.post("/{order_id}/accept")
 async def accept_order(order_id: str, current_user: UserResponse = Depends(require_role([UserRole.DELIVERY_AGENT]))):
     db = await get_database()
-    order = await db.orders.find_one({"id": order_id})
+    # Claim the order in one conditional write so two agents (or an agent and
+    # the dispatcher) cannot both take it, within the agent's capacity
+    now = datetime.utcnow()
+    changes = {
+        "delivery_agent_id": current_user.id,
+        "status": "preparing",
+        "accepted_at": now,
+        "updated_at": now
+    }
+    order, at_capacity = await claim_order(
+        db, current_user.id,
+        {"id": order_id, "delivery_agent_id": None, "status": {"$in": ["pending", "confirmed"]}},
+        changes,
+        return_document=ReturnDocument.BEFORE
+    )
+    if at_capacity:
+        raise HTTPException(status_code=409, detail="You already carry the maximum number of active orders")
     if not order:
-        raise HTTPException(status_code=404, detail="Order not found")
-    
-    if order.get('delivery_agent_id'):
-        raise HTTPException(status_code=400, detail="Order already accepted by another agent")
+        current = await db.orders.find_one({"id": order_id}, {"_id": 0, "status": 1, "delivery_agent_id": 1})
+        if not current:
+            raise HTTPException(status_code=404, detail="Order not found")
+        if current.get('delivery_agent_id'):
+            raise HTTPException(status_code=400, detail="Order already accepted by another agent")
+        raise HTTPException(status_code=409, detail=f"Order can no longer be accepted (status: {current.get('status')})")
     
-    await db.orders.update_one(
-        {"id": order_id},
-        {"$set": {
-            "delivery_agent_id": current_user.id,
-            "status": "preparing",
-            "updated_at": datetime.utcnow()
-        }}
-    )
+    await order_events.order_status_changed(db, {**order, **changes}, order.get('status'), "preparing")
     
     return {"message": "Order accepted"}
\ No newline at end of file
@@ -1,10 +1,13 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query
 from typing import List, Optional
 
-from app.db.mongodb import get_database
+from app.db.mongodb import get_database, get_read_database
 from app.models.product import Product, ProductCreate, PaginatedProductsResponse
+from app.models.search import TopSellerMetric
 from app.models.user import UserResponse, UserRole
 from app.core.security import require_role, get_current_user
+from app.services.stats_service import record_product_created, record_product_deleted
+from app.services.product_service import ProductService
 
 router = APIRouter()
 
@@ -15,7 +18,8 @@ async def get_products(
     page: int = 1, 
     limit: int = 20
 ):
-    db = await get_database()
+    # Catalogue reads tolerate replication lag, so they may be served by a secondary
+    db = await get_read_database()
     query = {}
     
     if category:
@@ -40,9 +44,19 @@ async def get_products(
         products=[Product(**p) for p in products]
     )
 
+@router.get("/top-sellers")
+async def get_top_sellers(
+    limit: int = Query(10, ge=1, le=100),
+    metric: TopSellerMetric = TopSellerMetric.DECAYED_UNITS,
+    category: Optional[str] = None
+):
+    db = await get_read_database()
+    products = await ProductService(db).get_top_sellers(limit=limit, metric=metric, category=category)
+    return {"metric": metric, "products": products}
+
 @router.get("/{product_id}", response_model=Product)
 async def get_product(product_id: str):
-    db = await get_database()
+    db = await get_read_database()
     product = await db.products.find_one({"id": product_id})
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
@@ -53,6 +67,7 @@ async def create_product(product_data: ProductCreate, current_user: UserResponse
     db = await get_database()
     product = Product(**product_data.dict())
     await db.products.insert_one(product.dict())
+    await record_product_created(db)
     return product
 
 @router.put("/{product_id}", response_model=Product)
@@ -70,10 +85,11 @@ async def delete_product(product_id: str, current_user: UserResponse = Depends(r
     result = await db.products.delete_one({"id": product_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Product not found")
+    await record_product_deleted(db)
     return {"message": "Product deleted successfully"}
 
 @router.get("/categories")
 async def get_categories():
-    db = await get_database()
+    db = await get_read_database()
     categories = await db.products.distinct("category")
     return {"categories": categories}
@@ -1,4 +1,5 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query
+from starlette.concurrency import run_in_threadpool
 from typing import List, Optional
 import httpx
 import logging
@@ -7,116 +8,99 @@ from datetime import datetime, timedelta
 from app.models.route import Waypoint
 from app.models.user import UserResponse, UserRole
 from app.core.security import require_role
+from app.services.osrm_client import CircuitOpenError, osrm_client
+from app.services.eta_service import eta_model
+from app.services.geo_math import format_delivery_minutes, path_distances
+from app.services.zone_index import zone_index
+from app.services.route_cache import get_route, route_cache, route_source
+from app.services.route_geometry import format_route_geometry
+from app.services.route_optimizer import build_matrix, optimize_order
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
-# Average delivery speed in km/h
-AVERAGE_DELIVERY_SPEED = 30  # Adjust based on your requirements
+# Opt-in compact geometry: the default keeps the original [{latitude, longitude}] list
+GEOMETRY_QUERY = Query("objects", pattern="^(objects|polyline|flat)$", description="Route geometry format: objects, polyline (encoded, precision 5) or flat [lat, lng, ...]")
+ZOOM_QUERY = Query(None, ge=0, le=22, description="Simplify the geometry for this map zoom level")
 
-def calculate_distance(coord1: dict, coord2: dict) -> float:
-    """
-    Calculate the approximate distance between two coordinates using the haversine formula.
-    Returns distance in kilometers.
-    """
-    import math
-    
-    # Earth's radius in kilometers
-    R = 6371.0
-    
-    lat1_rad = math.radians(coord1['latitude'])
-    lon1_rad = math.radians(coord1['longitude'])
-    lat2_rad = math.radians(coord2['latitude'])
-    lon2_rad = math.radians(coord2['longitude'])
-    
-    dlat = lat2_rad - lat1_rad
-    dlon = lon2_rad - lon1_rad
-    
-    a = math.sin(dlat / 2)**2 + math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(dlon / 2)**2
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-    
-    distance = R * c
-    return distance
-
-def estimate_delivery_time(distance_km: float, speed_kmh: float = AVERAGE_DELIVERY_SPEED) -> dict:
-    """
-    Estimate delivery time based on distance and speed.
-    Returns a dictionary with estimated time and formatted string.
-    """
-    if distance_km <= 0:
-        return {
-            "minutes": 5,
-            "formatted": "5 minutes or less"
-        }
-    
-    # Calculate time in hours
-    time_hours = distance_km / speed_kmh
-    
-    # Convert to minutes
-    time_minutes = int(time_hours * 60)
-    
-    # Ensure minimum time of 5 minutes
-    time_minutes = max(time_minutes, 5)
-    
-    # Format the time string
-    if time_minutes < 60:
-        formatted_time = f"{time_minutes} minutes"
-    else:
-        hours = time_minutes // 60
-        minutes = time_minutes % 60
-        if minutes == 0:
-            formatted_time = f"{hours} hour{'s' if hours > 1 else ''}"
-        else:
-            formatted_time = f"{hours} hour{'s' if hours > 1 else ''} and {minutes} minute{'s' if minutes > 1 else ''}"
-    
-    return {
-        "minutes": time_minutes,
-        "formatted": formatted_time
-    }
+def _route_zone_id(waypoints: List[Waypoint]) -> Optional[str]:
+    # The zone the route starts in selects the ETA model's speed factors
+    zone = zone_index.locate(waypoints[0].longitude, waypoints[0].latitude) if zone_index.loaded else None
+    return zone.get('id') if zone else None
+
+def _leg_durations(route: dict) -> List[Optional[float]]:
+    return [leg.get("duration") for leg in route.get("legs") or []]
+
+def _source_fields(osrm_data: dict) -> dict:
+    # Tells the client whether it got a road route or the straight-line fallback
+    fields = {"source": route_source(osrm_data)}
+    if fields["source"] == "fallback":
+        fields["fallback_reason"] = osrm_data.get("fallback_reason")
+    return fields
 
 @router.post("/optimize")
-async def optimize_route(waypoints: List[Waypoint], current_user: UserResponse = Depends(require_role([UserRole.DELIVERY_AGENT, UserRole.ADMIN]))):
+async def optimize_route(
+    waypoints: List[Waypoint],
+    fix_start: bool = Query(True, description="Keep the first waypoint first (e.g. the agent's position)"),
+    fix_end: bool = Query(False, description="Keep the last waypoint last"),
+    matrix: Optional[str] = Query(None, pattern="^(haversine|osrm)$", description="Cost matrix source"),
+    geometry: str = GEOMETRY_QUERY,
+    zoom: Optional[int] = ZOOM_QUERY,
+    current_user: UserResponse = Depends(require_role([UserRole.DELIVERY_AGENT, UserRole.ADMIN]))
+):
+    """
+    Reorder the waypoints into a short visiting sequence and route them.
+    `order` maps each position in the returned sequence to its index in the request.
+    """
     if not waypoints or len(waypoints) < 2:
         raise HTTPException(status_code=400, detail="At least two waypoints are required for routing.")
 
-    # Format waypoints for OSRM API
-    osrm_waypoints = ";".join([f"{wp.longitude},{wp.latitude}" for wp in waypoints])
-    osrm_url = f"http://router.project-osrm.org/route/v1/driving/{osrm_waypoints}?geometries=geojson&overview=full"
-
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(osrm_url)
-            response.raise_for_status()  # Raise an exception for HTTP errors
-            osrm_data = response.json()
+        cost_matrix, matrix_source, unit = await build_matrix([(wp.latitude, wp.longitude) for wp in waypoints], matrix)
+        # CPU-bound search; keep it off the event loop
+        optimization = await run_in_threadpool(optimize_order, cost_matrix, fix_start, fix_end)
+        waypoints = [waypoints[i] for i in optimization["order"]]
+
+        osrm_data = await get_route([(wp.longitude, wp.latitude) for wp in waypoints])
 
         if osrm_data.get("routes") and len(osrm_data["routes"]) > 0:
-            route_geometry = osrm_data["routes"][0]["geometry"]["coordinates"]
-            # OSRM returns [longitude, latitude], convert to [latitude, longitude]
-            route_coordinates = [{
-                "latitude": coord[1],
-                "longitude": coord[0]
-            } for coord in route_geometry]
+            route_geometry = format_route_geometry(osrm_data["routes"][0]["geometry"]["coordinates"], geometry, zoom)
             
             # Calculate total distance
-            total_distance = 0.0
-            for i in range(len(waypoints) - 1):
-                distance = calculate_distance(
-                    {"latitude": waypoints[i].latitude, "longitude": waypoints[i].longitude},
-                    {"latitude": waypoints[i+1].latitude, "longitude": waypoints[i+1].longitude}
-                )
-                total_distance += distance
+            total_distance = float(path_distances([(wp.latitude, wp.longitude) for wp in waypoints]).sum())
             
-            # Estimate delivery time
-            estimated_time = estimate_delivery_time(total_distance)
+            # Estimate delivery time from the OSRM duration scaled by the learned hour-of-day factor
+            # (a fallback route has no road duration, so the distance-based speed model is used)
+            osrm_duration = osrm_data["routes"][0].get("duration") if route_source(osrm_data) == "osrm" else None
+            estimated_time = format_delivery_minutes(eta_model.travel_minutes(
+                _route_zone_id(waypoints), total_distance, osrm_duration_s=osrm_duration
+            ))
             
             return {
-                "route": route_coordinates,
+                **route_geometry,
+                **_source_fields(osrm_data),
                 "distance_km": round(total_distance, 2),
-                "estimated_delivery_time": estimated_time
+                "estimated_delivery_time": estimated_time,
+                "order": optimization["order"],
+                "waypoints": [wp.dict() for wp in waypoints],
+                "optimization": {
+                    "matrix": matrix_source,
+                    "unit": unit,
+                    "cost_before": round(optimization["cost_before"], 3),
+                    "cost_after": round(optimization["cost_after"], 3),
+                    "gain": round(optimization["gain"], 3),
+                    "gain_pct": optimization["gain_pct"],
+                    "moves": optimization["moves"],
+                    "elapsed_ms": optimization["elapsed_ms"]
+                }
             }
         else:
             raise HTTPException(status_code=404, detail="No route found for the given waypoints.")
 
+    except HTTPException:
+        raise
+    except CircuitOpenError:
+        raise HTTPException(status_code=503, detail="Routing service is temporarily unavailable.")
     except httpx.HTTPStatusError as e:
         logger.error(f"OSRM HTTP error: {e.response.status_code} - {e.response.text}")
         raise HTTPException(status_code=e.response.status_code, detail=f"Routing service error: {e.response.text}")
@@ -128,49 +112,43 @@ async def optimize_route(waypoints: List[Waypoint], current_user: UserResponse =
         raise HTTPException(status_code=500, detail="An unexpected error occurred during routing.")
 
 @router.post("/optimize-with-eta")
-async def optimize_route_with_eta(waypoints: List[Waypoint], current_user: UserResponse = Depends(require_role([UserRole.DELIVERY_AGENT, UserRole.ADMIN]))):
+async def optimize_route_with_eta(
+    waypoints: List[Waypoint],
+    geometry: str = GEOMETRY_QUERY,
+    zoom: Optional[int] = ZOOM_QUERY,
+    current_user: UserResponse = Depends(require_role([UserRole.DELIVERY_AGENT, UserRole.ADMIN]))
+):
     """
     Optimize route and provide detailed ETA information including delivery times for each waypoint.
     """
     if not waypoints or len(waypoints) < 2:
         raise HTTPException(status_code=400, detail="At least two waypoints are required for routing.")
 
-    # Format waypoints for OSRM API
-    osrm_waypoints = ";".join([f"{wp.longitude},{wp.latitude}" for wp in waypoints])
-    osrm_url = f"http://router.project-osrm.org/route/v1/driving/{osrm_waypoints}?geometries=geojson&overview=full&steps=true"
-
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(osrm_url)
-            response.raise_for_status()  # Raise an exception for HTTP errors
-            osrm_data = response.json()
+        osrm_data = await get_route([(wp.longitude, wp.latitude) for wp in waypoints], steps=True)
 
         if osrm_data.get("routes") and len(osrm_data["routes"]) > 0:
-            route_geometry = osrm_data["routes"][0]["geometry"]["coordinates"]
-            # OSRM returns [longitude, latitude], convert to [latitude, longitude]
-            route_coordinates = [{
-                "latitude": coord[1],
-                "longitude": coord[0]
-            } for coord in route_geometry]
+            route_geometry = format_route_geometry(osrm_data["routes"][0]["geometry"]["coordinates"], geometry, zoom)
             
             # Calculate total distance and individual segment distances
-            total_distance = 0.0
-            segment_distances = []
+            segment_distances = path_distances([(wp.latitude, wp.longitude) for wp in waypoints]).tolist()
+            total_distance = sum(segment_distances)
             
-            for i in range(len(waypoints) - 1):
-                distance = calculate_distance(
-                    {"latitude": waypoints[i].latitude, "longitude": waypoints[i].longitude},
-                    {"latitude": waypoints[i+1].latitude, "longitude": waypoints[i+1].longitude}
-                )
-                segment_distances.append(distance)
-                total_distance += distance
+            # Per-leg travel times: OSRM leg durations when present, else distance,
+            # scaled by the ETA model's factor for the zone and hour
+            zone_id = _route_zone_id(waypoints)
+            durations = _leg_durations(osrm_data["routes"][0]) if route_source(osrm_data) == "osrm" else []
+            segment_minutes = [
+                eta_model.travel_minutes(zone_id, distance, osrm_duration_s=durations[i] if i < len(durations) else None)
+                for i, distance in enumerate(segment_distances)
+            ]
             
             # Estimate delivery time for the entire route
-            estimated_time = estimate_delivery_time(total_distance)
+            estimated_time = format_delivery_minutes(sum(segment_minutes))
             
             # Calculate ETA for each waypoint
             waypoint_etas = []
-            cumulative_time = 0
+            cumulative_time = 0.0
             
             # Start time is now
             start_time = datetime.now()
@@ -181,20 +159,20 @@ async def optimize_route_with_eta(waypoints: List[Waypoint], current_user: UserR
                 "cumulative_minutes": 0
             })
             
-            for i, distance in enumerate(segment_distances):
-                segment_time = estimate_delivery_time(distance)
-                cumulative_time += segment_time["minutes"]
+            for i, minutes in enumerate(segment_minutes):
+                cumulative_time += minutes
                 
                 eta_time = start_time + timedelta(minutes=cumulative_time)
                 waypoint_etas.append({
                     "waypoint_index": i + 1,
                     "waypoint": waypoints[i + 1].dict(),
                     "eta": eta_time.isoformat(),
-                    "cumulative_minutes": cumulative_time
+                    "cumulative_minutes": round(cumulative_time)
                 })
             
             return {
-                "route": route_coordinates,
+                **route_geometry,
+                **_source_fields(osrm_data),
                 "distance_km": round(total_distance, 2),
                 "estimated_delivery_time": estimated_time,
                 "waypoint_etas": waypoint_etas
@@ -202,6 +180,10 @@ async def optimize_route_with_eta(waypoints: List[Waypoint], current_user: UserR
         else:
             raise HTTPException(status_code=404, detail="No route found for the given waypoints.")
 
+    except HTTPException:
+        raise
+    except CircuitOpenError:
+        raise HTTPException(status_code=503, detail="Routing service is temporarily unavailable.")
     except httpx.HTTPStatusError as e:
         logger.error(f"OSRM HTTP error: {e.response.status_code} - {e.response.text}")
         raise HTTPException(status_code=e.response.status_code, detail=f"Routing service error: {e.response.text}")
@@ -210,4 +192,13 @@ async def optimize_route_with_eta(waypoints: List[Waypoint], current_user: UserR
         raise HTTPException(status_code=503, detail=f"Could not connect to routing service: {e}")
     except Exception as e:
         logger.error(f"Unexpected routing error: {e}")
-        raise HTTPException(status_code=500, detail="An unexpected error occurred during routing.")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail="An unexpected error occurred during routing.")
+
+@router.get("/upstream/stats")
+async def get_routing_upstream_stats(current_user: UserResponse = Depends(require_role([UserRole.ADMIN]))):
+    return osrm_client.snapshot()
+
+
+@router.get("/cache/stats")
+async def get_route_cache_stats(current_user: UserResponse = Depends(require_role([UserRole.ADMIN]))):
+    return route_cache.stats()
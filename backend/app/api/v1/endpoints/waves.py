@@ -0,0 +1,51 @@
+from fastapi import APIRouter, HTTPException, Depends, Query
+from typing import List, Optional
+
+from app.db.mongodb import get_database
+from app.models.user import UserResponse, UserRole
+from app.models.wave import DeliveryWave
+from app.core.security import require_role
+from app.services.zone_index import zone_index
+from app.services.wave_service import accept_wave, build_waves, list_open_waves
+
+router = APIRouter()
+
+def _agent_zone_ids(agent: UserResponse) -> List[str]:
+    # Zones an agent serves: listed in the zone's assigned_agents or set on the agent
+    zone_ids = {entry.zone.get('id') for entry in zone_index.zones if agent.id in (entry.zone.get('assigned_agents') or [])}
+    if agent.delivery_zone_id:
+        zone_ids.add(agent.delivery_zone_id)
+    return sorted(zone_ids)
+
+@router.get("", response_model=List[DeliveryWave])
+async def get_open_waves(
+    zone_id: Optional[str] = Query(None, description="Only waves in this zone (admins)"),
+    current_user: UserResponse = Depends(require_role([UserRole.DELIVERY_AGENT, UserRole.ADMIN]))
+):
+    """Open waves; agents see the waves in the zones they serve"""
+    db = await get_database()
+    if current_user.role == UserRole.ADMIN:
+        zone_ids = [zone_id] if zone_id else None
+    else:
+        if not zone_index.loaded:
+            await zone_index.refresh(db)
+        zone_ids = _agent_zone_ids(current_user)
+    waves = await list_open_waves(db, zone_ids)
+    return [DeliveryWave(**w) for w in waves]
+
+@router.post("/build")
+async def rebuild_waves(current_user: UserResponse = Depends(require_role([UserRole.ADMIN]))):
+    db = await get_database()
+    return await build_waves(db)
+
+@router.post("/{wave_id}/accept", response_model=DeliveryWave)
+async def accept_delivery_wave(wave_id: str, current_user: UserResponse = Depends(require_role([UserRole.DELIVERY_AGENT]))):
+    db = await get_database()
+    wave = await accept_wave(db, wave_id, current_user.id)
+    if not wave:
+        if await db.delivery_waves.count_documents({"id": wave_id}, limit=1):
+            raise HTTPException(status_code=409, detail="Wave is no longer open")
+        raise HTTPException(status_code=404, detail="Wave not found")
+    if not wave['order_ids']:
+        raise HTTPException(status_code=409, detail="All orders in this wave were already taken")
+    return DeliveryWave(**wave)
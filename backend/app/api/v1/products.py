@@ -38,7 +38,7 @@ async def search_products(
     - **category**: Filter by specific category
     - **min_price/max_price**: Price range filtering
     - **in_stock_only**: Show only available products
-    - **sort_by**: Sort results (name_asc, name_desc, price_asc, price_desc, created_asc, created_desc, relevance)
+    - **sort_by**: Sort results (name_asc, name_desc, price_asc, price_desc, created_asc, created_desc, popularity, relevance)
     - **page**: Page number for pagination
     - **limit**: Number of items per page (max 100)
     """
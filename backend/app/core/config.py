@@ -15,4 +15,152 @@ class Settings:
     ALGORITHM: str = os.environ.get("ALGORITHM", "HS256")
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 43200  # 30 days
 
+    # MongoDB client pool and wire options (timeouts of 0 keep the driver default)
+    MONGO_MAX_POOL_SIZE: int = int(os.environ.get("MONGO_MAX_POOL_SIZE", 100))
+    MONGO_MIN_POOL_SIZE: int = int(os.environ.get("MONGO_MIN_POOL_SIZE", 0))
+    MONGO_MAX_CONNECTING: int = int(os.environ.get("MONGO_MAX_CONNECTING", 2))
+    MONGO_MAX_IDLE_TIME_MS: int = int(os.environ.get("MONGO_MAX_IDLE_TIME_MS", 0))
+    MONGO_WAIT_QUEUE_TIMEOUT_MS: int = int(os.environ.get("MONGO_WAIT_QUEUE_TIMEOUT_MS", 0))
+    MONGO_SERVER_SELECTION_TIMEOUT_MS: int = int(os.environ.get("MONGO_SERVER_SELECTION_TIMEOUT_MS", 0))
+    MONGO_CONNECT_TIMEOUT_MS: int = int(os.environ.get("MONGO_CONNECT_TIMEOUT_MS", 0))
+    MONGO_SOCKET_TIMEOUT_MS: int = int(os.environ.get("MONGO_SOCKET_TIMEOUT_MS", 0))
+    # Comma-separated, in preference order: zstd (needs zstandard), snappy (needs python-snappy), zlib
+    MONGO_COMPRESSORS: str = os.environ.get("MONGO_COMPRESSORS", "")
+    MONGO_ZLIB_LEVEL: int = int(os.environ.get("MONGO_ZLIB_LEVEL", -1))
+    # Read routing: the default for every query, and the one for catalogue/analytics reads
+    MONGO_READ_PREFERENCE: str = os.environ.get("MONGO_READ_PREFERENCE", "primary")
+    MONGO_SECONDARY_READ_PREFERENCE: str = os.environ.get("MONGO_SECONDARY_READ_PREFERENCE", "secondaryPreferred")
+    MONGO_MAX_STALENESS_SECONDS: int = int(os.environ.get("MONGO_MAX_STALENESS_SECONDS", -1))  # -1: no limit, else >= 90
+
+    # Production server (serve.py); 0 workers sizes the pool from the CPUs this process may use.
+    # Each worker is a separate process with its own lifespan, so its own Mongo pool of
+    # MONGO_MAX_POOL_SIZE and its own in-memory indexes; migrations run once in the launcher.
+    WEB_HOST: str = os.environ.get("WEB_HOST", "0.0.0.0")
+    WEB_PORT: int = int(os.environ.get("WEB_PORT", 8000))
+    WEB_WORKERS: int = int(os.environ.get("WEB_WORKERS", 0))
+    WEB_MAX_WORKERS: int = int(os.environ.get("WEB_MAX_WORKERS", 16))
+    WEB_BACKLOG: int = int(os.environ.get("WEB_BACKLOG", 2048))
+    WEB_KEEPALIVE_SECONDS: int = int(os.environ.get("WEB_KEEPALIVE_SECONDS", 5))
+    WEB_GRACEFUL_TIMEOUT_SECONDS: int = int(os.environ.get("WEB_GRACEFUL_TIMEOUT_SECONDS", 30))
+    WEB_LIMIT_CONCURRENCY: int = int(os.environ.get("WEB_LIMIT_CONCURRENCY", 0))  # per worker; 0: unlimited
+    WEB_ACCESS_LOG: bool = os.environ.get("WEB_ACCESS_LOG", "false").lower() == "true"
+
+    # Metrics in Prometheus text format on /metrics (latency buckets are in seconds). With several
+    # workers each one writes its series to METRICS_MULTIPROCESS_DIR and /metrics sums them.
+    METRICS_ENABLED: bool = os.environ.get("METRICS_ENABLED", "true").lower() == "true"
+    METRICS_LATENCY_BUCKETS: str = os.environ.get("METRICS_LATENCY_BUCKETS", "0.001,0.0025,0.005,0.01,0.025,0.05,0.1,0.25,0.5,1,2.5,5,10")
+    METRICS_MULTIPROCESS_DIR: str = os.environ.get("METRICS_MULTIPROCESS_DIR", "")
+    METRICS_EXPORT_INTERVAL_SECONDS: float = float(os.environ.get("METRICS_EXPORT_INTERVAL_SECONDS", 5))
+
+    # Slow query log: data commands over SLOW_QUERY_MS are grouped by query shape and attributed
+    # to the route (via the metrics middleware) or background job that issued them. Each shape is
+    # explained in the background at most once per interval; executionStats re-runs the query,
+    # "queryPlanner" only plans it (no documents-examined counts), "" disables explain.
+    SLOW_QUERY_ENABLED: bool = os.environ.get("SLOW_QUERY_ENABLED", "true").lower() == "true"
+    SLOW_QUERY_MS: float = float(os.environ.get("SLOW_QUERY_MS", 100))
+    SLOW_QUERY_RECENT_SIZE: int = int(os.environ.get("SLOW_QUERY_RECENT_SIZE", 200))
+    SLOW_QUERY_MAX_SHAPES: int = int(os.environ.get("SLOW_QUERY_MAX_SHAPES", 500))
+    SLOW_QUERY_EXPLAIN_VERBOSITY: str = os.environ.get("SLOW_QUERY_EXPLAIN_VERBOSITY", "executionStats")
+    SLOW_QUERY_EXPLAIN_INTERVAL_SECONDS: float = float(os.environ.get("SLOW_QUERY_EXPLAIN_INTERVAL_SECONDS", 600))
+    SLOW_QUERY_EXPLAIN_QUEUE_SIZE: int = int(os.environ.get("SLOW_QUERY_EXPLAIN_QUEUE_SIZE", 100))
+
+    # Ensure indexes and apply pending migrations at startup (otherwise run `python -m app.db.migrate`)
+    RUN_MIGRATIONS_ON_STARTUP: bool = os.environ.get("RUN_MIGRATIONS_ON_STARTUP", "true").lower() == "true"
+    # A migration claim not renewed for this long belongs to a dead worker and is taken over
+    MIGRATION_LEASE_SECONDS: float = float(os.environ.get("MIGRATION_LEASE_SECONDS", 120))
+
+    # Background jobs (0 disables a job). Jobs that act on shared data (dispatch, waves, stats,
+    # sales velocity) run in one process at a time; the holder of a job's lease keeps it until it
+    # stops renewing it for the job's interval plus this grace period.
+    JOB_LEASE_GRACE_SECONDS: float = float(os.environ.get("JOB_LEASE_GRACE_SECONDS", 60))
+    STATS_RECONCILE_INTERVAL_SECONDS: float = float(os.environ.get("STATS_RECONCILE_INTERVAL_SECONDS", 900))
+    SALES_VELOCITY_REFRESH_INTERVAL_SECONDS: float = float(os.environ.get("SALES_VELOCITY_REFRESH_INTERVAL_SECONDS", 3600))
+
+    ZONE_INDEX_REFRESH_INTERVAL_SECONDS: float = float(os.environ.get("ZONE_INDEX_REFRESH_INTERVAL_SECONDS", 60))
+    DISPATCH_INTERVAL_SECONDS: float = float(os.environ.get("DISPATCH_INTERVAL_SECONDS", 30))
+    WAVE_BUILD_INTERVAL_SECONDS: float = float(os.environ.get("WAVE_BUILD_INTERVAL_SECONDS", 60))
+    ETA_REFRESH_INTERVAL_SECONDS: float = float(os.environ.get("ETA_REFRESH_INTERVAL_SECONDS", 300))
+    LOCATION_FLUSH_INTERVAL_SECONDS: float = float(os.environ.get("LOCATION_FLUSH_INTERVAL_SECONDS", 5))
+    AGENT_INDEX_REFRESH_INTERVAL_SECONDS: float = float(os.environ.get("AGENT_INDEX_REFRESH_INTERVAL_SECONDS", 10))
+    AGENT_LOAD_RECONCILE_INTERVAL_SECONDS: float = float(os.environ.get("AGENT_LOAD_RECONCILE_INTERVAL_SECONDS", 300))
+    ROUTE_UPGRADE_INTERVAL_SECONDS: float = float(os.environ.get("ROUTE_UPGRADE_INTERVAL_SECONDS", 15))
+
+    # In-process delivery zone index
+    ZONE_INDEX_CELL_DEG: float = float(os.environ.get("ZONE_INDEX_CELL_DEG", 0.05))
+    # Precomputed cell -> zone table (~550 m cells at 0.005 deg; 0 disables it)
+    ZONE_CELL_TABLE_DEG: float = float(os.environ.get("ZONE_CELL_TABLE_DEG", 0.005))
+    ZONE_CELL_TABLE_MAX_CELLS: int = int(os.environ.get("ZONE_CELL_TABLE_MAX_CELLS", 2_000_000))
+
+    # Geocoding
+    GEOCODER_PROVIDER: str = os.environ.get("GEOCODER_PROVIDER", "gazetteer")
+    GEOCODER_GAZETTEER_PATH: str = os.environ.get("GEOCODER_GAZETTEER_PATH", str(ROOT_DIR / "data" / "gazetteer.csv"))
+    GEOCODER_CACHE_SIZE: int = int(os.environ.get("GEOCODER_CACHE_SIZE", 10000))
+    GEOCODER_CACHE_TTL_SECONDS: int = int(os.environ.get("GEOCODER_CACHE_TTL_SECONDS", 30 * 86400))
+    GEOCODER_BUDGET_MS: float = float(os.environ.get("GEOCODER_BUDGET_MS", 300))
+
+    # OSRM routing upstream (point at a local OSRM or stub server in development)
+    OSRM_BASE_URL: str = os.environ.get("OSRM_BASE_URL", "https://router.project-osrm.org")
+    OSRM_PROFILE: str = os.environ.get("OSRM_PROFILE", "driving")
+    OSRM_TIMEOUT_SECONDS: float = float(os.environ.get("OSRM_TIMEOUT_SECONDS", 5))
+    OSRM_MAX_RETRIES: int = int(os.environ.get("OSRM_MAX_RETRIES", 2))
+    OSRM_BACKOFF_BASE_SECONDS: float = float(os.environ.get("OSRM_BACKOFF_BASE_SECONDS", 0.2))
+    OSRM_MAX_CONNECTIONS: int = int(os.environ.get("OSRM_MAX_CONNECTIONS", 50))
+    OSRM_MAX_KEEPALIVE_CONNECTIONS: int = int(os.environ.get("OSRM_MAX_KEEPALIVE_CONNECTIONS", 20))
+    OSRM_HTTP2: bool = os.environ.get("OSRM_HTTP2", "true").lower() == "true"
+    OSRM_CIRCUIT_FAILURE_THRESHOLD: int = int(os.environ.get("OSRM_CIRCUIT_FAILURE_THRESHOLD", 5))
+    OSRM_CIRCUIT_RESET_SECONDS: float = float(os.environ.get("OSRM_CIRCUIT_RESET_SECONDS", 30))
+
+    # Route cache (precision is decimal places of lng/lat; 4 is ~11 m)
+    ROUTE_CACHE_MAX_ENTRIES: int = int(os.environ.get("ROUTE_CACHE_MAX_ENTRIES", 5000))
+    ROUTE_CACHE_TTL_SECONDS: float = float(os.environ.get("ROUTE_CACHE_TTL_SECONDS", 300))
+    ROUTE_CACHE_PRECISION: int = int(os.environ.get("ROUTE_CACHE_PRECISION", 4))
+
+    # Degraded routing: past the budget (or when OSRM fails) serve straight-line routes
+    ROUTE_FALLBACK_ENABLED: bool = os.environ.get("ROUTE_FALLBACK_ENABLED", "true").lower() == "true"
+    ROUTE_BUDGET_MS: float = float(os.environ.get("ROUTE_BUDGET_MS", 1500))
+    ROUTE_FALLBACK_TTL_SECONDS: float = float(os.environ.get("ROUTE_FALLBACK_TTL_SECONDS", 60))
+    ROUTE_UPGRADE_BATCH: int = int(os.environ.get("ROUTE_UPGRADE_BATCH", 50))
+
+    # Stop-order optimization (matrix is "haversine" or "osrm")
+    ROUTE_OPTIMIZE_MATRIX: str = os.environ.get("ROUTE_OPTIMIZE_MATRIX", "haversine")
+    ROUTE_OPTIMIZE_BUDGET_MS: float = float(os.environ.get("ROUTE_OPTIMIZE_BUDGET_MS", 200))
+
+    # Order dispatch (costs are in km: distance + load penalty - waiting credit)
+    DISPATCH_ON_EVENTS: bool = os.environ.get("DISPATCH_ON_EVENTS", "true").lower() == "true"
+    DISPATCH_AGENT_CAPACITY: int = int(os.environ.get("DISPATCH_AGENT_CAPACITY", 3))
+    DISPATCH_LOAD_PENALTY_KM: float = float(os.environ.get("DISPATCH_LOAD_PENALTY_KM", 2.0))
+    DISPATCH_WAIT_KM_PER_MINUTE: float = float(os.environ.get("DISPATCH_WAIT_KM_PER_MINUTE", 0.1))
+    DISPATCH_MAX_DISTANCE_KM: float = float(os.environ.get("DISPATCH_MAX_DISTANCE_KM", 15))
+    DISPATCH_BUDGET_MS: float = float(os.environ.get("DISPATCH_BUDGET_MS", 500))
+    DISPATCH_MAX_ORDERS: int = int(os.environ.get("DISPATCH_MAX_ORDERS", 5000))
+
+    # Delivery waves (orders clustered by drop location and creation time)
+    WAVE_RADIUS_M: float = float(os.environ.get("WAVE_RADIUS_M", 300))
+    WAVE_WINDOW_MINUTES: float = float(os.environ.get("WAVE_WINDOW_MINUTES", 15))
+    WAVE_MAX_ORDERS: int = int(os.environ.get("WAVE_MAX_ORDERS", 6))
+    WAVE_MIN_ORDERS: int = int(os.environ.get("WAVE_MIN_ORDERS", 2))
+    # Dispatch leaves orders in an open wave to the wave for this long, then assigns them singly
+    WAVE_HOLD_MINUTES: float = float(os.environ.get("WAVE_HOLD_MINUTES", 10))
+
+    # Delivery ETA model (per-zone, per-hour factors learned from delivered orders)
+    ETA_MIN_SAMPLES: int = int(os.environ.get("ETA_MIN_SAMPLES", 20))
+    ETA_DEFAULT_WAIT_MINUTES: float = float(os.environ.get("ETA_DEFAULT_WAIT_MINUTES", 0))
+    # Travel time assumed when a zone has no origin and there are too few deliveries to learn one
+    ETA_DEFAULT_TRAVEL_MINUTES: float = float(os.environ.get("ETA_DEFAULT_TRAVEL_MINUTES", 30))
+    ETA_TRAINING_DAYS: int = int(os.environ.get("ETA_TRAINING_DAYS", 30))
+
+    # Agent locations (latest position in memory, history in time-bucketed documents)
+    LOCATION_BUCKET_SECONDS: int = int(os.environ.get("LOCATION_BUCKET_SECONDS", 600))
+    LOCATION_BUFFER_MAX_PINGS: int = int(os.environ.get("LOCATION_BUFFER_MAX_PINGS", 200_000))
+    LOCATION_STALE_SECONDS: float = float(os.environ.get("LOCATION_STALE_SECONDS", 120))
+    LOCATION_HISTORY_TTL_DAYS: int = int(os.environ.get("LOCATION_HISTORY_TTL_DAYS", 30))
+
+    # Nearest-agent index over live positions (0.01 deg cells are ~1.1 km)
+    AGENT_INDEX_CELL_DEG: float = float(os.environ.get("AGENT_INDEX_CELL_DEG", 0.01))
+    AGENT_SUGGESTIONS_K: int = int(os.environ.get("AGENT_SUGGESTIONS_K", 5))
+
+    # Product sales velocity
+    SALES_VELOCITY_HALF_LIFE_DAYS: float = float(os.environ.get("SALES_VELOCITY_HALF_LIFE_DAYS", 7))
+    SALES_VELOCITY_WINDOW_DAYS: int = int(os.environ.get("SALES_VELOCITY_WINDOW_DAYS", 7))
+
 settings = Settings()
@@ -0,0 +1,310 @@
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Any, Dict, List, Sequence, Tuple
+
+from app.core.config import settings
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+Labels = Tuple[str, ...]
+
+def _latency_buckets() -> Tuple[float, ...]:
+    return tuple(sorted(float(b) for b in settings.METRICS_LATENCY_BUCKETS.split(",") if b.strip()))
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+class Metric:
+    """
+    A labelled metric family kept in process memory.
+
+    Label values are passed positionally in `labelnames` order. Observers may
+    run on driver threads (Motor runs pymongo in a thread pool), so updates
+    take a lock; uncontended it costs well under a microsecond.
+    """
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values: Dict[Labels, Any] = {}
+        self._lock = threading.Lock()
+        registry.register(self)
+
+    def dump(self) -> List[list]:
+        """[[label values, value], ...] as plain JSON-able data"""
+        with self._lock:
+            return [[list(labels), self._copy(value)] for labels, value in self.values.items()]
+
+    @staticmethod
+    def _copy(value):
+        return value
+
+    @staticmethod
+    def merge(a, b):
+        return a + b
+
+    def render(self, series: Dict[Labels, Any]) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for labels, value in sorted(series.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_number(value)}")
+        return lines
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        with self._lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        with self._lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def dec(self, *labels: str, amount: float = 1) -> None:
+        self.inc(*labels, amount=-amount)
+
+class Histogram(Metric):
+    """
+    Fixed-bucket histogram. Each series is [per-bucket counts (the last one
+    is +Inf), sum]; counts are made cumulative only when rendered.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = None):
+        self.buckets = tuple(buckets) if buckets else _latency_buckets()
+        super().__init__(name, documentation, labelnames)
+
+    def observe(self, value: float, *labels: str) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self.values.get(labels)
+            if series is None:
+                series = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    @staticmethod
+    def _copy(value):
+        return [list(value[0]), value[1]]
+
+    @staticmethod
+    def merge(a, b):
+        return [[x + y for x, y in zip(a[0], b[0])], a[1] + b[1]]
+
+    def render(self, series: Dict[Labels, Any]) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        bounds = [_format_number(bound) for bound in self.buckets + (float("inf"),)]
+        for labels, (counts, total) in sorted(series.items()):
+            plain = _format_labels(self.labelnames, labels)
+            prefix = f"{self.name}_bucket{plain[:-1]},le=" if plain else f"{self.name}_bucket{{le="
+            cumulative = 0
+            for bound, count in zip(bounds, counts):
+                cumulative += count
+                lines.append(f'{prefix}"{bound}"}} {cumulative}')
+            lines.append(f"{self.name}_sum{plain} {_format_number(total)}")
+            lines.append(f"{self.name}_count{plain} {cumulative}")
+        return lines
+
+class MetricsRegistry:
+    """
+    Every metric of this process, rendered in the Prometheus text format.
+
+    Under serve.py each worker process has its own registry. When
+    METRICS_MULTIPROCESS_DIR is set each worker also writes its series to
+    `<dir>/<pid>.json` (export_metrics) and a scrape, whichever worker it
+    lands on, sums its live series with the other workers' recent files.
+    """
+
+    def __init__(self):
+        self.metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> None:
+        self.metrics[metric.name] = metric
+
+    def dump(self) -> Dict[str, List[list]]:
+        return {name: metric.dump() for name, metric in self.metrics.items()}
+
+    def _worker_dumps(self) -> List[Dict[str, List[list]]]:
+        directory = settings.METRICS_MULTIPROCESS_DIR
+        if not directory or not os.path.isdir(directory):
+            return []
+        fresh_after = time.time() - 3 * max(settings.METRICS_EXPORT_INTERVAL_SECONDS, 1)
+        own = f"{os.getpid()}.json"
+        dumps = []
+        for filename in os.listdir(directory):
+            if filename == own or not filename.endswith(".json"):
+                continue
+            path = os.path.join(directory, filename)
+            try:
+                if os.path.getmtime(path) < fresh_after:
+                    continue  # a worker that exited or died
+                with open(path) as f:
+                    dumps.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return dumps
+
+    def render(self) -> str:
+        merged: Dict[str, Dict[Labels, Any]] = {name: {} for name in self.metrics}
+        for dump in [self.dump()] + self._worker_dumps():
+            for name, series in dump.items():
+                metric = self.metrics.get(name)
+                if metric is None:
+                    continue
+                target = merged[name]
+                for labels, value in series:
+                    labels = tuple(labels)
+                    target[labels] = metric.merge(target[labels], value) if labels in target else value
+        lines = []
+        for name, metric in self.metrics.items():
+            lines.extend(metric.render(merged[name]))
+        return "\n".join(lines) + "\n"
+
+registry = MetricsRegistry()
+
+http_request_duration = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template and status",
+    ("method", "route", "status")
+)
+http_requests_in_flight = Gauge("http_requests_in_flight", "HTTP requests being served", ("method",))
+http_response_size = Histogram(
+    "http_response_size_bytes", "HTTP response body size by route template",
+    ("method", "route"), buckets=SIZE_BUCKETS
+)
+mongo_command_duration = Histogram(
+    "mongodb_command_duration_seconds", "MongoDB command latency as seen by the driver",
+    ("command", "collection", "outcome")
+)
+osrm_request_duration = Histogram(
+    "osrm_request_duration_seconds", "OSRM upstream call latency per attempt (outcome is the HTTP status or 'error')",
+    ("service", "outcome")
+)
+osrm_circuit_rejections = Counter(
+    "osrm_circuit_rejections_total", "OSRM calls refused by the open circuit breaker", ("service",)
+)
+
+# What the current code is running for: the ASGI scope of the request being served,
+# or a background job's name. Set by MetricsMiddleware and the task runners; Motor
+# copies it into the driver thread, so command listeners can read it too.
+current_source: ContextVar = ContextVar("current_source", default=None)
+
+_endpoint_templates: Dict[Any, str] = {}
+
+def route_template(scope) -> str:
+    """Path template of the route that served a request ("unmatched" if none)"""
+    route = scope.get("route")
+    if route is not None:
+        template = getattr(route, "path", None)
+    else:
+        # Older Starlette only leaves the endpoint in the scope
+        endpoint = scope.get("endpoint")
+        template = _endpoint_templates.get(endpoint)
+        if template is None and endpoint is not None:
+            for candidate in getattr(scope.get("app"), "routes", []):
+                if getattr(candidate, "endpoint", None) is endpoint:
+                    template = _endpoint_templates[endpoint] = candidate.path
+                    break
+    if not template:
+        return "unmatched"
+    # Newer FastAPI matches included routers lazily and leaves only the route's own
+    # path here; the router prefix is the request path minus that many segments
+    segments = scope["path"].split("/")
+    depth = template.count("/")
+    if len(segments) > depth + 1:
+        return "/".join(segments[:-depth]) + template
+    return template
+
+def describe_source(source=None) -> str:
+    """"GET /api/v1/orders/{order_id}", "job:dispatch" or "unknown" for a current_source value"""
+    if source is None:
+        source = current_source.get()
+    if source is None:
+        return "unknown"
+    if isinstance(source, str):
+        return source
+    return f"{source['method']} {route_template(source)}"
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording request latency, in-flight requests and
+    response sizes. Requests are labelled by route template
+    (/api/v1/orders/{order_id}), never by raw path, so ids do not create
+    series; requests that match no route are labelled "unmatched".
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status = 500
+        size = 0
+
+        async def send_with_metrics(message):
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        http_requests_in_flight.inc(method)
+        token = current_source.set(scope)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_metrics)
+        finally:
+            elapsed = time.perf_counter() - started
+            current_source.reset(token)
+            http_requests_in_flight.dec(method)
+            route = route_template(scope)
+            http_request_duration.observe(elapsed, method, route, str(status))
+            http_response_size.observe(size, method, route)
+
+def render_metrics() -> str:
+    return registry.render()
+
+def _export_path() -> str:
+    return os.path.join(settings.METRICS_MULTIPROCESS_DIR, f"{os.getpid()}.json")
+
+async def export_metrics(db=None) -> None:
+    """Write this worker's series for the other workers' /metrics (no-op without METRICS_MULTIPROCESS_DIR)"""
+    if not settings.METRICS_MULTIPROCESS_DIR:
+        return
+    path = _export_path()
+    temporary = f"{path}.tmp"
+    with open(temporary, "w") as f:
+        json.dump(registry.dump(), f)
+    os.replace(temporary, path)
+
+def remove_metrics_export() -> None:
+    if settings.METRICS_MULTIPROCESS_DIR:
+        try:
+            os.remove(_export_path())
+        except OSError:
+            pass
@@ -25,7 +25,10 @@ def create_access_token(data: dict):
     return encoded_jwt
 
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    token = credentials.credentials
+    return await get_user_from_token(credentials.credentials)
+
+async def get_user_from_token(token: str) -> UserResponse:
+    """Resolve a bearer token to its user (also used where there is no Authorization header, e.g. WebSockets)"""
     try:
         payload = jwt.decode(token, settings.JWT_SECRET_KEY, algorithms=[settings.ALGORITHM])
         user_id: str = payload.get("sub")
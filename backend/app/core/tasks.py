@@ -0,0 +1,124 @@
+import asyncio
+import logging
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict
+
+from pymongo.errors import DuplicateKeyError
+
+from app.core.config import settings
+from app.core.metrics import current_source
+from app.db.mongodb import get_database
+
+logger = logging.getLogger(__name__)
+
+# Background jobs receive the database handle and run on the app's event loop
+Job = Callable[..., Awaitable[None]]
+
+_tasks: Dict[str, asyncio.Task] = {}
+
+# Identifies this process in `job_leases`
+INSTANCE_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+async def acquire_job_lease(db, name: str, ttl_seconds: float) -> bool:
+    """
+    Take or renew the lease on a job shared by every worker and host.
+
+    The holder keeps renewing it on every run; another process takes over
+    only once it has not been renewed for `ttl_seconds` (the holder exited
+    or died).
+
+    Returns:
+        bool: True if this process holds the lease
+    """
+    now = datetime.utcnow()
+    try:
+        await db.job_leases.update_one(
+            {"_id": name, "$or": [{"owner": INSTANCE_ID}, {"expires_at": {"$lt": now}}]},
+            {"$set": {"owner": INSTANCE_ID, "expires_at": now + timedelta(seconds=ttl_seconds), "renewed_at": now}},
+            upsert=True
+        )
+        return True
+    except DuplicateKeyError:
+        # The lease exists and is held by someone else, so the upsert tried to insert it
+        return False
+
+def start_periodic_task(name: str, job: Job, interval_seconds: float, run_immediately: bool = True, singleton: bool = False) -> None:
+    """
+    Run a job forever on a fixed interval until the app shuts down.
+    A failing run is logged and retried on the next tick instead of killing the loop.
+
+    Args:
+        name: Unique task name, used in logs
+        job: Coroutine function taking the database handle
+        interval_seconds: Delay between the end of one run and the start of the next
+        run_immediately: Run once at startup instead of waiting a full interval
+        singleton: Run in one process only (across workers and hosts), the one
+            holding the job's lease in `job_leases`; the others just keep ticking
+            in case the holder goes away
+    """
+    if interval_seconds <= 0:
+        logger.info(f"Background task '{name}' disabled (interval={interval_seconds})")
+        return
+
+    async def runner():
+        current_source.set(f"job:{name}")
+        if not run_immediately:
+            await asyncio.sleep(interval_seconds)
+        while True:
+            try:
+                db = await get_database()
+                if not singleton or await acquire_job_lease(db, name, interval_seconds + settings.JOB_LEASE_GRACE_SECONDS):
+                    await job(db)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Background task '{name}' failed: {e}")
+            await asyncio.sleep(interval_seconds)
+
+    _register(name, asyncio.create_task(runner(), name=name))
+
+def spawn_task(name: str, job: Job, *args, **kwargs) -> bool:
+    """
+    Run a one-off job in the background (e.g. a backfill triggered by an admin).
+
+    Returns:
+        bool: False if a task with the same name is still running
+    """
+    existing = _tasks.get(name)
+    if existing and not existing.done():
+        return False
+
+    async def runner():
+        current_source.set(f"job:{name}")
+        try:
+            db = await get_database()
+            await job(db, *args, **kwargs)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Background task '{name}' failed: {e}")
+
+    _register(name, asyncio.create_task(runner(), name=name))
+    return True
+
+def _register(name: str, task: asyncio.Task) -> None:
+    previous = _tasks.get(name)
+    if previous and not previous.done():
+        previous.cancel()
+    _tasks[name] = task
+
+async def stop_background_tasks() -> None:
+    """Cancel every background task, wait for them to unwind and hand over held job leases"""
+    tasks = list(_tasks.values())
+    _tasks.clear()
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    try:
+        db = await get_database()
+        await db.job_leases.delete_many({"owner": INSTANCE_ID})
+    except Exception as e:
+        logger.error(f"Could not release job leases: {e}")
@@ -0,0 +1,213 @@
+import logging
+from datetime import datetime
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from pymongo.errors import OperationFailure
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+@dataclass(frozen=True)
+class IndexSpec:
+    """Declarative description of a collection index"""
+    collection: str
+    keys: List[Tuple[str, Any]]
+    unique: bool = False
+    sparse: bool = False
+    expire_after_seconds: Optional[int] = None
+    name: Optional[str] = None
+
+    @property
+    def index_name(self) -> str:
+        return self.name or "_".join(f"{k}_{v}" for k, v in self.keys)
+
+    def options(self) -> Dict[str, Any]:
+        options: Dict[str, Any] = {"name": self.index_name}
+        if self.unique:
+            options["unique"] = True
+        if self.sparse:
+            options["sparse"] = True
+        if self.expire_after_seconds is not None:
+            options["expireAfterSeconds"] = self.expire_after_seconds
+        return options
+
+    def drift(self, info: Dict[str, Any]) -> List[str]:
+        """Differences between this spec and an existing index (an index_information() entry)"""
+        differences = []
+
+        def normalize(value):
+            # The server may hand back 1.0 for 1
+            return int(value) if isinstance(value, (int, float)) and not isinstance(value, bool) else value
+
+        keys = [(k, normalize(v)) for k, v in info.get("key", [])]
+        if keys != [(k, normalize(v)) for k, v in self.keys]:
+            differences.append(f"keys {keys} != {self.keys}")
+        if bool(info.get("unique")) != self.unique:
+            differences.append(f"unique {bool(info.get('unique'))} != {self.unique}")
+        if bool(info.get("sparse")) != self.sparse:
+            differences.append(f"sparse {bool(info.get('sparse'))} != {self.sparse}")
+        ttl = info.get("expireAfterSeconds")
+        if (None if ttl is None else int(ttl)) != self.expire_after_seconds:
+            differences.append(f"expireAfterSeconds {ttl} != {self.expire_after_seconds}")
+        return differences
+
+# Every index the application relies on. Add new hot queries here, not ad hoc.
+INDEXES: List[IndexSpec] = [
+    # Application-level ids
+    IndexSpec("users", [("id", 1)], unique=True),
+    IndexSpec("products", [("id", 1)], unique=True),
+    IndexSpec("orders", [("id", 1)], unique=True),
+    IndexSpec("delivery_zones", [("id", 1)], unique=True),
+
+    # Users: login, role counts, agents per zone
+    IndexSpec("users", [("email", 1)], unique=True),
+    IndexSpec("users", [("role", 1), ("delivery_zone_id", 1)]),
+
+    # Carts: one per user
+    IndexSpec("carts", [("user_id", 1)], unique=True),
+
+    # Orders: per-customer and per-agent history, status queues, admin listing
+    IndexSpec("orders", [("user_id", 1), ("created_at", -1)]),
+    IndexSpec("orders", [("delivery_agent_id", 1), ("created_at", -1)]),
+    IndexSpec("orders", [("status", 1), ("created_at", -1)]),
+    IndexSpec("orders", [("status", 1), ("delivered_at", -1)]),
+    IndexSpec("orders", [("created_at", -1)]),
+
+    # Products: catalogue filters, sorts and best-seller rankings
+    IndexSpec("products", [("category", 1), ("created_at", -1)]),
+    IndexSpec("products", [("created_at", -1)]),
+    IndexSpec("products", [("price", 1)]),
+    IndexSpec("products", [("sales.score_units", -1)], sparse=True),
+    IndexSpec("products", [("sales.units_window", -1)], sparse=True),
+    IndexSpec("products", [("sales.revenue_window", -1)], sparse=True),
+
+    # Delivery zones: native geospatial queries
+    IndexSpec("delivery_zones", [("geometry", "2dsphere")]),
+
+    # Analytics rollups
+    IndexSpec("order_rollups", [("granularity", 1), ("dimension", 1), ("key", 1), ("bucket", 1)]),
+    IndexSpec("product_sales_daily", [("day", 1)]),
+
+    # Delivery waves: open waves per zone, oldest first
+    IndexSpec("delivery_waves", [("id", 1)], unique=True),
+    IndexSpec("delivery_waves", [("status", 1), ("zone_id", 1), ("created_at", 1)]),
+    IndexSpec("delivery_waves", [("status", 1), ("held_since", 1)]),
+
+    # Agent location history: an agent's track by time, expired after the retention period
+    IndexSpec("agent_location_history", [("agent_id", 1), ("bucket_start", 1)]),
+    IndexSpec("agent_location_history", [("bucket_start", 1)], expire_after_seconds=settings.LOCATION_HISTORY_TTL_DAYS * 86400),
+
+    # Geocoding cache expiry
+    IndexSpec("geocode_cache", [("created_at", 1)], expire_after_seconds=settings.GEOCODER_CACHE_TTL_SECONDS),
+]
+
+# Representative hot queries checked for collection scans: (collection, filter, sort)
+HOT_QUERIES: List[Tuple[str, Dict[str, Any], Optional[List[Tuple[str, int]]]]] = [
+    ("users", {"id": "x"}, None),
+    ("users", {"email": "x@example.com"}, None),
+    ("users", {"role": "delivery_agent"}, None),
+    ("products", {"id": "x"}, None),
+    ("products", {"category": "x"}, [("created_at", -1)]),
+    ("products", {"sales.score_units": {"$gt": 0}}, [("sales.score_units", -1)]),
+    ("orders", {"id": "x"}, None),
+    ("orders", {"user_id": "x"}, [("created_at", -1)]),
+    ("orders", {"status": "confirmed"}, [("created_at", -1)]),
+    ("orders", {"delivery_agent_id": "x"}, [("created_at", -1)]),
+    ("orders", {}, [("created_at", -1)]),
+    ("carts", {"user_id": "x"}, None),
+    ("delivery_zones", {"id": "x"}, None),
+    ("delivery_zones", {"geometry": {"$geoIntersects": {"$geometry": {"type": "Point", "coordinates": [77.59, 13.1]}}}}, None),
+    ("order_rollups", {"granularity": "day", "dimension": "all", "key": "all", "bucket": {"$gte": datetime(1970, 1, 1)}}, None),
+    ("agent_location_history", {"agent_id": "x", "bucket_start": {"$gt": datetime(1970, 1, 1)}}, [("bucket_start", 1)]),
+]
+
+async def ensure_indexes(db, dry_run: bool = False) -> Dict[str, List[str]]:
+    """
+    Create any registered index that does not exist yet, and check existing
+    ones against their spec.
+
+    create_index is idempotent, so this is safe to run on every startup. A failure
+    on one index (e.g. duplicate values under a new unique index) is reported and
+    does not stop the others. An existing index whose keys or options differ from
+    its spec is reported as drifted; a changed TTL alone is applied in place with
+    collMod, anything else has to be dropped and recreated by an admin.
+
+    Returns:
+        dict: Index names grouped into created / existing / drifted / failed
+    """
+    report: Dict[str, List[str]] = {"created": [], "existing": [], "drifted": [], "failed": []}
+    existing: Dict[str, Dict[str, Any]] = {}
+
+    for spec in INDEXES:
+        label = f"{spec.collection}.{spec.index_name}"
+        if spec.collection not in existing:
+            existing[spec.collection] = await db[spec.collection].index_information()
+        info = existing[spec.collection].get(spec.index_name)
+        if info is not None:
+            differences = spec.drift(info)
+            ttl_only = bool(differences) and all(d.startswith("expireAfterSeconds") for d in differences)
+            if ttl_only and spec.expire_after_seconds is not None and not dry_run:
+                try:
+                    await db.command({
+                        "collMod": spec.collection,
+                        "index": {"name": spec.index_name, "expireAfterSeconds": spec.expire_after_seconds},
+                    })
+                    logger.info(f"Updated TTL of index {label} to {spec.expire_after_seconds}s")
+                    differences = []
+                except OperationFailure as e:
+                    differences.append(f"collMod failed: {e}")
+            if differences:
+                report["drifted"].append(f"{label}: {'; '.join(differences)}")
+                logger.warning(f"Index {label} differs from its spec: {'; '.join(differences)}")
+            else:
+                report["existing"].append(label)
+            continue
+        if dry_run:
+            report["created"].append(label)
+            continue
+        try:
+            await db[spec.collection].create_index(spec.keys, **spec.options())
+            existing[spec.collection][spec.index_name] = {"key": spec.keys, **spec.options()}
+            report["created"].append(label)
+            logger.info(f"Created index {label}")
+        except OperationFailure as e:
+            report["failed"].append(f"{label}: {e}")
+            logger.error(f"Could not create index {label}: {e}")
+
+    return report
+
+def _plan_stages(plan: Dict[str, Any]):
+    yield plan.get("stage")
+    for child_key in ("inputStage", "queryPlan"):
+        if child_key in plan:
+            yield from _plan_stages(plan[child_key])
+    for child in plan.get("inputStages", []):
+        yield from _plan_stages(child)
+
+async def check_hot_queries(db) -> List[Dict[str, Any]]:
+    """
+    Explain every registered hot query and report its winning plan.
+
+    Returns:
+        list: One entry per query with its plan stages and a `collscan` flag
+    """
+    results = []
+    for collection, query_filter, sort in HOT_QUERIES:
+        command: Dict[str, Any] = {"find": collection, "filter": query_filter}
+        if sort:
+            command["sort"] = dict(sort)
+        try:
+            explain = await db.command({"explain": command, "verbosity": "queryPlanner"})
+            stages = [s for s in _plan_stages(explain["queryPlanner"]["winningPlan"]) if s]
+            results.append({
+                "collection": collection,
+                "filter": query_filter,
+                "sort": sort,
+                "stages": stages,
+                "collscan": "COLLSCAN" in stages,
+            })
+        except OperationFailure as e:
+            results.append({"collection": collection, "filter": query_filter, "sort": sort, "error": str(e)})
+    return results
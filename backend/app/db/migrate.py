@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""
+Database migration CLI
+
+    python -m app.db.migrate            Ensure indexes and apply pending migrations; exit 1 on
+                                        a failure or an index that differs from its spec
+    python -m app.db.migrate --dry-run  Show what would be created or applied
+    python -m app.db.migrate --check    Explain hot queries; exit 1 if any is a COLLSCAN
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+
+from app.db.mongodb import connect_to_mongo, close_mongo_connection, get_database
+from app.db.indexes import check_hot_queries
+from app.db.migrations import run_migrations
+
+async def main(args) -> int:
+    await connect_to_mongo()
+    try:
+        db = await get_database()
+        if args.check:
+            results = await check_hot_queries(db)
+            for result in results:
+                if "error" in result:
+                    status = "ERROR   "
+                else:
+                    status = "COLLSCAN" if result["collscan"] else "ok      "
+                detail = result.get("error") or " > ".join(result["stages"])
+                print(f"{status} {result['collection']} {json.dumps(result['filter'], default=str)}: {detail}")
+            return 1 if any(r.get("collscan") or "error" in r for r in results) else 0
+
+        report = await run_migrations(db, dry_run=args.dry_run)
+        print(json.dumps(report, indent=2, default=str))
+        indexes = report["indexes"]
+        return 1 if indexes["failed"] or indexes["drifted"] or report["failed"] else 0
+    finally:
+        await close_mongo_connection()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage MongoDB indexes and schema migrations")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--check", action="store_true", help="Report hot queries whose plan is a COLLSCAN")
+    mode.add_argument("--dry-run", action="store_true", help="Report pending work without changing anything")
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,190 @@
+import asyncio
+import logging
+import os
+import socket
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List
+
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from app.core.config import settings
+from app.db.indexes import ensure_indexes
+
+logger = logging.getLogger(__name__)
+
+MIGRATION_BATCH_SIZE = 500
+# How often a process waiting on another's migration checks the claim
+MIGRATION_POLL_SECONDS = 1
+
+@dataclass(frozen=True)
+class Migration:
+    """A one-time data migration; `apply` must be safe to re-run after a partial failure"""
+    id: str
+    description: str
+    apply: Callable[[Any], Awaitable[Any]]
+
+async def migrate_legacy_zones(db, batch_size: int = MIGRATION_BATCH_SIZE) -> Dict[str, Any]:
+    """
+    Rewrite legacy `coordinates: [{lat, lng}]` zones as GeoJSON `geometry` in batches.
+
+    Converted zones no longer match the query, so an interrupted run simply
+    resumes with whatever is left. Rings are repaired where possible. A zone that
+    cannot be repaired is never written to `geometry` (the 2dsphere index would
+    reject the whole batch): it keeps its legacy coordinates, gets the reason in
+    `invalid_geometry` and is reported for an admin to fix.
+    """
+    # Imported here to keep app.db free of service imports at module load
+    from app.services.zone_geometry import normalize_zone_geometry
+    from app.services.zone_index import legacy_to_geojson
+
+    query: Dict[str, Any] = {"coordinates": {"$exists": True}, "geometry": {"$exists": False}, "invalid_geometry": {"$exists": False}}
+    converted, unrepaired, last_id = 0, [], None
+    while True:
+        batch_query = {**query, "_id": {"$gt": last_id}} if last_id is not None else query
+        batch = await db.delivery_zones.find(batch_query, {"_id": 1, "id": 1, "coordinates": 1}).sort("_id", 1).limit(batch_size).to_list(batch_size)
+        if not batch:
+            break
+
+        updates, quarantined = [], 0
+        for zone in batch:
+            geometry = legacy_to_geojson(zone.get('coordinates') or [])
+            try:
+                geometry, _ = normalize_zone_geometry(geometry)
+            except ValueError as e:
+                unrepaired.append(f"{zone.get('id')}: {e}")
+                # Quarantined outside the geo index; later batches skip it
+                updates.append(UpdateOne({"_id": zone["_id"]}, {"$set": {"invalid_geometry": str(e)}}))
+                quarantined += 1
+                continue
+            updates.append(UpdateOne(
+                {"_id": zone["_id"], "geometry": {"$exists": False}},
+                {"$set": {"geometry": geometry}, "$unset": {"coordinates": ""}}
+            ))
+        result = await db.delivery_zones.bulk_write(updates, ordered=False)
+        converted += result.modified_count - quarantined
+        last_id = batch[-1]["_id"]
+        logger.info(f"Legacy zone migration: converted {converted} zones so far")
+
+    return {"converted": converted, "unrepaired": unrepaired}
+
+async def migrate_velocity_scores(db) -> Dict[str, Any]:
+    from app.services.velocity_service import migrate_legacy_velocity_scores
+    return await migrate_legacy_velocity_scores(db)
+
+# Applied in order; ids are recorded in `schema_migrations` and never reused
+MIGRATIONS: List[Migration] = [
+    Migration("0001_legacy_zones_to_geojson", "Rewrite legacy {lat,lng} delivery zones as GeoJSON geometry", migrate_legacy_zones),
+    Migration("0002_velocity_score_epoch", "Move decayed sales scores from the fixed 2025-01-01 scale to a per-product epoch", migrate_velocity_scores),
+]
+
+def _owner() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+async def _claim(db, migration: Migration, owner: str) -> bool:
+    """
+    Claim a migration for this process: a new claim, or one whose holder stopped
+    renewing its lease (crashed mid-migration). False if someone else holds it.
+    """
+    now = datetime.utcnow()
+    try:
+        await db.schema_migrations.insert_one({
+            "_id": migration.id,
+            "description": migration.description,
+            "status": "running",
+            "owner": owner,
+            "started_at": now,
+            "heartbeat_at": now,
+        })
+        return True
+    except DuplicateKeyError:
+        pass
+
+    stale = now - timedelta(seconds=settings.MIGRATION_LEASE_SECONDS)
+    previous = await db.schema_migrations.find_one_and_update(
+        {"_id": migration.id, "status": "running", "$or": [
+            {"heartbeat_at": {"$lt": stale}},
+            {"heartbeat_at": {"$exists": False}, "started_at": {"$lt": stale}},
+        ]},
+        {"$set": {"owner": owner, "started_at": now, "heartbeat_at": now}, "$inc": {"reclaims": 1}}
+    )
+    if previous is not None:
+        logger.warning(f"Reclaimed migration {migration.id} from {previous.get('owner', 'an unknown worker')} (lease expired)")
+    return previous is not None
+
+async def _renew_lease(db, migration_id: str, owner: str) -> None:
+    # Keeps the claim fresh while the migration runs; a crashed worker stops renewing
+    while True:
+        await asyncio.sleep(settings.MIGRATION_LEASE_SECONDS / 3)
+        await db.schema_migrations.update_one(
+            {"_id": migration_id, "owner": owner, "status": "running"},
+            {"$set": {"heartbeat_at": datetime.utcnow()}}
+        )
+
+async def run_migrations(db, dry_run: bool = False) -> Dict[str, Any]:
+    """
+    Ensure every registered index, then apply pending data migrations in order.
+
+    Each migration is claimed in `schema_migrations` with a lease the claimant
+    renews while it runs, so when several processes start at once only one of
+    them runs it and the others wait for it to finish before moving on (later
+    migrations may depend on it). A failed migration releases its claim and is
+    retried on the next run; the claim of a process that died mid-migration
+    expires after MIGRATION_LEASE_SECONDS and is taken over.
+
+    Returns:
+        dict: Index report plus applied / pending / failed migration ids
+    """
+    report: Dict[str, Any] = {
+        "indexes": await ensure_indexes(db, dry_run=dry_run),
+        "applied": [],
+        "pending": [],
+        "failed": [],
+    }
+
+    applied = {doc["_id"] async for doc in db.schema_migrations.find({"status": "applied"}, {"_id": 1})}
+    owner = _owner()
+    for migration in MIGRATIONS:
+        if migration.id in applied:
+            continue
+        if dry_run:
+            report["pending"].append(migration.id)
+            continue
+
+        claimed = await _claim(db, migration, owner)
+        waiting = False
+        while not claimed:
+            claim = await db.schema_migrations.find_one({"_id": migration.id})
+            if claim is not None and claim.get("status") == "applied":
+                break
+            if not waiting:
+                holder = claim.get("owner", "another process") if claim else "another process"
+                logger.info(f"Waiting for migration {migration.id} to finish on {holder}")
+                waiting = True
+            await asyncio.sleep(MIGRATION_POLL_SECONDS)
+            claimed = await _claim(db, migration, owner)
+        if not claimed:
+            continue
+
+        logger.info(f"Applying migration {migration.id}: {migration.description}")
+        lease = asyncio.create_task(_renew_lease(db, migration.id, owner))
+        try:
+            result = await migration.apply(db)
+        except Exception as e:
+            logger.error(f"Migration {migration.id} failed: {e}")
+            await db.schema_migrations.delete_one({"_id": migration.id, "owner": owner})
+            report["failed"].append(f"{migration.id}: {e}")
+            # Later migrations may depend on this one
+            break
+        finally:
+            lease.cancel()
+
+        await db.schema_migrations.update_one(
+            {"_id": migration.id, "owner": owner},
+            {"$set": {"status": "applied", "applied_at": datetime.utcnow(), "result": result}}
+        )
+        report["applied"].append(migration.id)
+
+    return report
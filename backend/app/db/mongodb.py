@@ -1,22 +1,217 @@
+import importlib.util
+import logging
+from collections import deque
+from typing import Any, Dict, List, Optional
+
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import monitoring
 from pymongo.errors import ConnectionFailure
+from pymongo.read_preferences import read_pref_mode_from_name, make_read_preference
 from app.core.config import settings
+from app.core.metrics import mongo_command_duration
+from app.db.slow_queries import SlowQueryListener
+
+logger = logging.getLogger(__name__)
+
+# Wire compressors and the package each one needs (zlib ships with Python)
+COMPRESSOR_MODULES = {"zstd": "zstandard", "snappy": "snappy", "zlib": "zlib"}
+
+class PoolStatsListener(monitoring.ConnectionPoolListener):
+    """
+    Connection pool counters per server, fed by the driver's CMAP events.
+
+    `checked_out` is the number of connections in use right now and
+    `waiting` the number of operations queued for one; a pool that is often
+    at max_pool_size with operations waiting is too small for the load.
+    """
+
+    def __init__(self, window: int = 1000):
+        self.servers: Dict[str, Dict[str, Any]] = {}
+        self.checkout_ms: deque = deque(maxlen=window)
+
+    def _server(self, address) -> Dict[str, Any]:
+        key = f"{address[0]}:{address[1]}"
+        server = self.servers.get(key)
+        if server is None:
+            server = self.servers[key] = {
+                "open": 0, "checked_out": 0, "max_checked_out": 0, "waiting": 0, "max_waiting": 0,
+                "created": 0, "closed": 0, "checkouts": 0, "checkout_failures": {}, "cleared": 0,
+            }
+        return server
+
+    def pool_created(self, event):
+        self._server(event.address)
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self._server(event.address)["cleared"] += 1
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        server = self._server(event.address)
+        server["created"] += 1
+        server["open"] += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        server = self._server(event.address)
+        server["closed"] += 1
+        server["open"] -= 1
+
+    def connection_check_out_started(self, event):
+        server = self._server(event.address)
+        server["waiting"] += 1
+        server["max_waiting"] = max(server["max_waiting"], server["waiting"])
+
+    def connection_check_out_failed(self, event):
+        server = self._server(event.address)
+        server["waiting"] -= 1
+        failures = server["checkout_failures"]
+        failures[event.reason] = failures.get(event.reason, 0) + 1
 
-class MongoDB: 
+    def connection_checked_out(self, event):
+        server = self._server(event.address)
+        server["waiting"] -= 1
+        server["checkouts"] += 1
+        server["checked_out"] += 1
+        server["max_checked_out"] = max(server["max_checked_out"], server["checked_out"])
+        duration = getattr(event, "duration", None)
+        if duration is not None:
+            self.checkout_ms.append(duration * 1000)
+
+    def connection_checked_in(self, event):
+        self._server(event.address)["checked_out"] -= 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        waits = sorted(self.checkout_ms)
+
+        def percentile(p: float) -> Optional[float]:
+            if not waits:
+                return None
+            return round(waits[min(len(waits) - 1, int(p * len(waits)))], 3)
+
+        return {
+            "servers": self.servers,
+            "checkout_wait_ms": {"p50": percentile(0.5), "p95": percentile(0.95), "p99": percentile(0.99), "max": percentile(1.0)},
+        }
+
+class CommandMetricsListener(monitoring.CommandListener):
+    """Feeds MongoDB command latencies into the mongodb_command_duration_seconds histogram"""
+
+    def __init__(self):
+        # (connection, request id) -> (command, collection) between started and finished
+        self.pending: Dict[Any, tuple] = {}
+
+    def started(self, event):
+        name = event.command_name
+        collection = event.command.get(name)
+        if not isinstance(collection, str):
+            collection = event.command.get("collection", "")  # getMore carries the cursor id
+        self.pending[(event.connection_id, event.request_id)] = (name, collection)
+
+    def _finished(self, event, outcome: str):
+        name, collection = self.pending.pop((event.connection_id, event.request_id), (event.command_name, ""))
+        mongo_command_duration.observe(event.duration_micros / 1e6, name, collection, outcome)
+
+    def succeeded(self, event):
+        self._finished(event, "ok")
+
+    def failed(self, event):
+        self._finished(event, "error")
+
+class MongoDB:
     client: AsyncIOMotorClient = None
+    options: Dict[str, Any] = {}
+    pool_stats: PoolStatsListener = None
 
 mongodb = MongoDB()
 
+def available_compressors(names: str) -> List[str]:
+    """Configured wire compressors whose package is installed, in preference order"""
+    compressors = []
+    for name in (n.strip() for n in names.split(",") if n.strip()):
+        module = COMPRESSOR_MODULES.get(name)
+        if module is None:
+            logger.warning(f"Unknown MongoDB compressor '{name}' ignored")
+        elif importlib.util.find_spec(module) is None:
+            logger.warning(f"MongoDB compressor '{name}' needs the '{module}' package; skipped")
+        else:
+            compressors.append(name)
+    return compressors
+
+def client_options() -> Dict[str, Any]:
+    """Driver options from settings; timeouts of 0 keep the driver default"""
+    options: Dict[str, Any] = {
+        "maxPoolSize": settings.MONGO_MAX_POOL_SIZE,
+        "minPoolSize": settings.MONGO_MIN_POOL_SIZE,
+        "maxConnecting": settings.MONGO_MAX_CONNECTING,
+        "readPreference": settings.MONGO_READ_PREFERENCE,
+        "appname": settings.PROJECT_NAME,
+    }
+    for option, value in (
+        ("maxIdleTimeMS", settings.MONGO_MAX_IDLE_TIME_MS),
+        ("waitQueueTimeoutMS", settings.MONGO_WAIT_QUEUE_TIMEOUT_MS),
+        ("serverSelectionTimeoutMS", settings.MONGO_SERVER_SELECTION_TIMEOUT_MS),
+        ("connectTimeoutMS", settings.MONGO_CONNECT_TIMEOUT_MS),
+        ("socketTimeoutMS", settings.MONGO_SOCKET_TIMEOUT_MS),
+    ):
+        if value:
+            options[option] = value
+    compressors = available_compressors(settings.MONGO_COMPRESSORS)
+    if compressors:
+        options["compressors"] = compressors
+        if "zlib" in compressors:
+            options["zlibCompressionLevel"] = settings.MONGO_ZLIB_LEVEL
+    return options
+
 async def connect_to_mongo():
-    mongodb.client = AsyncIOMotorClient(settings.MONGO_URL)
+    mongodb.pool_stats = PoolStatsListener()
+    options = mongodb.options = client_options()
+    listeners = [mongodb.pool_stats]
+    if settings.METRICS_ENABLED:
+        listeners.append(CommandMetricsListener())
+    if settings.SLOW_QUERY_ENABLED:
+        listeners.append(SlowQueryListener())
+    mongodb.client = AsyncIOMotorClient(settings.MONGO_URL, event_listeners=listeners, **options)
+    logger.info(
+        f"MongoDB client: maxPoolSize={options['maxPoolSize']}, compressors={options.get('compressors', [])}, "
+        f"readPreference={options['readPreference']}, secondary reads={settings.MONGO_SECONDARY_READ_PREFERENCE}"
+    )
     try:
         await mongodb.client.admin.command('ping')
-        print("Pinged your deployment. You successfully connected to MongoDB!")
+        logger.info("Pinged your deployment. You successfully connected to MongoDB!")
     except ConnectionFailure:
-        print("MongoDB connection failed.")
+        logger.error("MongoDB connection failed.")
 
 async def close_mongo_connection():
     mongodb.client.close()
 
 async def get_database():
     return mongodb.client[settings.DB_NAME]
+
+async def get_read_database():
+    """
+    Database handle for read-heavy, staleness-tolerant queries (catalogue,
+    analytics). Reads go through MONGO_SECONDARY_READ_PREFERENCE so they can
+    be served by secondaries; on a standalone server this is the primary.
+    Never use it for a read that must see the caller's own write.
+    """
+    mode = read_pref_mode_from_name(settings.MONGO_SECONDARY_READ_PREFERENCE)
+    max_staleness = settings.MONGO_MAX_STALENESS_SECONDS if mode else -1
+    return mongodb.client.get_database(
+        settings.DB_NAME,
+        read_preference=make_read_preference(mode, tag_sets=None, max_staleness=max_staleness)
+    )
+
+def pool_stats() -> Dict[str, Any]:
+    return {
+        "options": {k: v for k, v in mongodb.options.items() if k != "appname"},
+        "secondary_read_preference": settings.MONGO_SECONDARY_READ_PREFERENCE,
+        **(mongodb.pool_stats.snapshot() if mongodb.pool_stats else {}),
+    }
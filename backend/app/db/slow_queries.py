@@ -0,0 +1,281 @@
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from pymongo import monitoring
+
+from app.core.config import settings
+from app.core.metrics import current_source, describe_source
+
+logger = logging.getLogger(__name__)
+
+# Commands that read or write collection data; handshakes, auth and admin commands are ignored
+DATA_COMMANDS = {"find", "aggregate", "count", "distinct", "getMore", "insert", "update", "delete", "findAndModify"}
+EXPLAINABLE = {"find", "aggregate", "count", "distinct", "update", "delete", "findAndModify"}
+# Session, transaction, routing and concern fields explain rejects inside the explained command
+EXPLAIN_STRIP_FIELDS = {
+    "lsid", "txnNumber", "autocommit", "startTransaction", "$db", "$clusterTime", "$readPreference",
+    "readConcern", "writeConcern",
+}
+
+def _shape(value: Any) -> Any:
+    """A filter with every value replaced by "?" (keys and operators kept)"""
+    if isinstance(value, dict):
+        return {key: _shape(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        if any(isinstance(item, dict) for item in value):
+            return [_shape(item) for item in value]
+        return ["?"]  # $in / $all lists
+    return "?"
+
+def query_shape(command_name: str, command: Dict[str, Any]) -> Dict[str, Any]:
+    """The parts of a command that decide its plan, without the values"""
+    if command_name == "find":
+        return {"filter": _shape(command.get("filter", {})), "sort": command.get("sort")}
+    if command_name == "aggregate":
+        return {"pipeline": [
+            {name: _shape(stage[name]) if name == "$match" else "..."}
+            for stage in command.get("pipeline", []) for name in stage
+        ]}
+    if command_name == "count":
+        return {"query": _shape(command.get("query", {}))}
+    if command_name == "distinct":
+        return {"key": command.get("key"), "query": _shape(command.get("query", {}))}
+    if command_name == "findAndModify":
+        return {"query": _shape(command.get("query", {})), "sort": command.get("sort")}
+    if command_name == "update":
+        return {"q": _shape((command.get("updates") or [{}])[0].get("q", {}))}
+    if command_name == "delete":
+        return {"q": _shape((command.get("deletes") or [{}])[0].get("q", {}))}
+    return {}
+
+def _plan_stages(node: Any, stages: List[str], indexes: List[str]) -> None:
+    # Walks queryPlanner.winningPlan (classic and SBE layouts) collecting stage and index names
+    if isinstance(node, dict):
+        if isinstance(node.get("stage"), str):
+            stages.append(node["stage"])
+            if node.get("indexName"):
+                indexes.append(node["indexName"])
+        for value in node.values():
+            _plan_stages(value, stages, indexes)
+    elif isinstance(node, list):
+        for item in node:
+            _plan_stages(item, stages, indexes)
+
+def _find_key(node: Any, key: str) -> Optional[Any]:
+    # First value stored under `key` anywhere in an explain document (aggregate
+    # explains nest the planner under stages[0].$cursor, sharded ones under shards)
+    if isinstance(node, dict):
+        if key in node:
+            return node[key]
+        children = node.values()
+    elif isinstance(node, list):
+        children = node
+    else:
+        return None
+    for child in children:
+        found = _find_key(child, key)
+        if found is not None:
+            return found
+    return None
+
+def summarize_explain(explain: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Reduce an explain document to what the slow query log reports.
+
+    Returns:
+        dict: collscan (the winning plan scans the collection), stages and indexes
+        of the winning plan, and from executionStats (when present) docs/keys
+        examined, documents returned and docs examined per document returned
+    """
+    stages, indexes = [], []
+    _plan_stages(_find_key(explain, "winningPlan"), stages, indexes)
+    summary = {
+        "collscan": "COLLSCAN" in stages,
+        "stages": sorted(set(stages)),
+        "indexes": sorted(set(indexes)),
+    }
+    stats = _find_key(explain, "executionStats")
+    if isinstance(stats, dict) and "totalDocsExamined" in stats:
+        returned = stats.get("nReturned", 0)
+        summary.update({
+            "docs_examined": stats.get("totalDocsExamined", 0),
+            "keys_examined": stats.get("totalKeysExamined", 0),
+            "n_returned": returned,
+            "docs_examined_ratio": round(stats.get("totalDocsExamined", 0) / max(returned, 1), 2),
+            "execution_ms": stats.get("executionTimeMillis"),
+        })
+    return summary
+
+class SlowQueryLog:
+    """
+    Slow commands of this worker, grouped by (database, command, collection,
+    shape), plus a ring of the most recent ones. Shapes carry no values, so
+    nothing a user typed into a filter is kept or logged.
+
+    Commands are recorded from driver threads and explained on the event
+    loop, so both go through a lock.
+    """
+
+    def __init__(self):
+        self.shapes: Dict[str, Dict[str, Any]] = {}
+        self.recent: deque = deque(maxlen=settings.SLOW_QUERY_RECENT_SIZE)
+        self.explain_queue: Optional[asyncio.Queue] = None
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.commands_seen = 0
+        self.explains = 0
+        self.explain_errors = 0
+        self.explains_dropped = 0
+        self._lock = threading.Lock()
+
+    def record(self, database: str, command_name: str, command: Dict[str, Any], duration_ms: float, source: str, returned: Optional[int]) -> None:
+        collection = command.get(command_name)
+        if not isinstance(collection, str):
+            collection = command.get("collection", "")
+        shape = query_shape(command_name, command)
+        key = json.dumps([database, command_name, collection, shape], sort_keys=True, default=str)
+        now = datetime.utcnow()
+        entry = {
+            "at": now, "database": database, "command": command_name, "collection": collection,
+            "duration_ms": round(duration_ms, 2), "source": source, "returned": returned, "shape": shape,
+        }
+        logger.warning("slow_query " + json.dumps(entry, default=str))
+
+        with self._lock:
+            self.recent.append(entry)
+            stats = self.shapes.get(key)
+            if stats is None:
+                if len(self.shapes) >= settings.SLOW_QUERY_MAX_SHAPES:
+                    # Forget the shape that has cost the least so far
+                    del self.shapes[min(self.shapes, key=lambda k: self.shapes[k]["total_ms"])]
+                stats = self.shapes[key] = {
+                    "database": database, "command": command_name, "collection": collection, "shape": shape,
+                    "count": 0, "total_ms": 0.0, "max_ms": 0.0, "first_seen": now, "last_seen": now,
+                    "sources": {}, "plan": None, "explained_at": None, "_explain_after": 0.0,
+                }
+            stats["count"] += 1
+            stats["total_ms"] += duration_ms
+            stats["max_ms"] = max(stats["max_ms"], duration_ms)
+            stats["last_seen"] = now
+            stats["sources"][source] = stats["sources"].get(source, 0) + 1
+            explain_due = (
+                command_name in EXPLAINABLE
+                and settings.SLOW_QUERY_EXPLAIN_VERBOSITY
+                and time.monotonic() >= stats["_explain_after"]
+            )
+            if explain_due:
+                stats["_explain_after"] = time.monotonic() + settings.SLOW_QUERY_EXPLAIN_INTERVAL_SECONDS
+
+        if explain_due and self.loop is not None:
+            explain = {k: v for k, v in command.items() if k not in EXPLAIN_STRIP_FIELDS}
+            self.loop.call_soon_threadsafe(self._enqueue, (key, database, explain))
+
+    def _enqueue(self, item) -> None:
+        try:
+            self.explain_queue.put_nowait(item)
+        except asyncio.QueueFull:
+            self.explains_dropped += 1
+            with self._lock:
+                stats = self.shapes.get(item[0])
+                if stats is not None:
+                    stats["_explain_after"] = 0.0  # try again on the next occurrence
+
+    async def explain(self, db, key: str, database: str, command: Dict[str, Any]) -> None:
+        try:
+            explain = await db.client[database].command(
+                {"explain": command, "verbosity": settings.SLOW_QUERY_EXPLAIN_VERBOSITY}
+            )
+        except Exception as e:
+            self.explain_errors += 1
+            logger.error(f"Explain of a slow {next(iter(command))} on {database} failed: {e}")
+            return
+        self.explains += 1
+        summary = summarize_explain(explain)
+        with self._lock:
+            stats = self.shapes.get(key)
+            if stats is not None:
+                stats["plan"] = summary
+                stats["explained_at"] = datetime.utcnow()
+                context = {k: stats[k] for k in ("database", "command", "collection", "shape")}
+            else:
+                context = {"key": key}
+        logger.warning("slow_query_plan " + json.dumps({**context, **summary}, default=str))
+
+    def report(self, limit: int = 50) -> Dict[str, Any]:
+        with self._lock:
+            shapes = sorted(self.shapes.values(), key=lambda s: s["total_ms"], reverse=True)[:limit]
+            shapes = [{
+                **{k: v for k, v in s.items() if not k.startswith("_")},
+                "total_ms": round(s["total_ms"], 2),
+                "max_ms": round(s["max_ms"], 2),
+                "avg_ms": round(s["total_ms"] / s["count"], 2),
+            } for s in shapes]
+            recent = list(self.recent)[-limit:][::-1]
+        return {
+            "threshold_ms": settings.SLOW_QUERY_MS,
+            "explain_verbosity": settings.SLOW_QUERY_EXPLAIN_VERBOSITY or None,
+            "commands_seen": self.commands_seen,
+            "shapes_tracked": len(self.shapes),
+            "explains": self.explains,
+            "explain_errors": self.explain_errors,
+            "explains_dropped": self.explains_dropped,
+            "shapes": shapes,
+            "recent": recent,
+        }
+
+    def reset(self) -> None:
+        with self._lock:
+            self.shapes.clear()
+            self.recent.clear()
+
+slow_query_log = SlowQueryLog()
+
+class SlowQueryListener(monitoring.CommandListener):
+    """Hands data commands slower than SLOW_QUERY_MS to the slow query log"""
+
+    def __init__(self, log: SlowQueryLog = slow_query_log):
+        self.log = log
+        # (connection, request id) -> (command, source) between started and finished
+        self.pending: Dict[Any, tuple] = {}
+
+    def started(self, event):
+        if event.command_name in DATA_COMMANDS:
+            self.pending[(event.connection_id, event.request_id)] = (event.command, current_source.get())
+
+    def _finished(self, event, reply: Optional[Dict[str, Any]]):
+        pending = self.pending.pop((event.connection_id, event.request_id), None)
+        if pending is None:
+            return
+        self.log.commands_seen += 1
+        duration_ms = event.duration_micros / 1000
+        if duration_ms < settings.SLOW_QUERY_MS:
+            return
+        command, source = pending
+        returned = None
+        if reply:
+            cursor = reply.get("cursor") or {}
+            batch = cursor.get("firstBatch", cursor.get("nextBatch"))
+            returned = len(batch) if batch is not None else reply.get("n")
+        self.log.record(event.database_name, event.command_name, command, duration_ms, describe_source(source), returned)
+
+    def succeeded(self, event):
+        self._finished(event, event.reply)
+
+    def failed(self, event):
+        self._finished(event, None)
+
+async def run_slow_query_explainer(db) -> None:
+    """Explain queued slow query shapes one at a time, off the request path (runs until cancelled)"""
+    slow_query_log.loop = asyncio.get_running_loop()
+    slow_query_log.explain_queue = asyncio.Queue(maxsize=settings.SLOW_QUERY_EXPLAIN_QUEUE_SIZE)
+    try:
+        while True:
+            key, database, command = await slow_query_log.explain_queue.get()
+            await slow_query_log.explain(db, key, database, command)
+    finally:
+        slow_query_log.loop = None
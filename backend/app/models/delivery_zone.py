@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple, Union
 from datetime import datetime
 import uuid
 
@@ -7,16 +7,20 @@ class GeoJSONPolygon(BaseModel):
     type: str = "Polygon"
     coordinates: List[List[List[float]]]  # [longitude, latitude] pairs
 
+class GeoJSONMultiPolygon(BaseModel):
+    type: str = "MultiPolygon"
+    coordinates: List[List[List[List[float]]]]  # polygons of rings of [longitude, latitude] pairs
+
 class DeliveryZone(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     name: str
-    geometry: GeoJSONPolygon
+    geometry: Union[GeoJSONPolygon, GeoJSONMultiPolygon]
     assigned_agents: List[str] = []  # user IDs of delivery agents
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
 class DeliveryZoneCreate(BaseModel):
     name: str
-    geometry: GeoJSONPolygon
+    geometry: Union[GeoJSONPolygon, GeoJSONMultiPolygon]
 
 # Keep the old model for backward compatibility
 class DeliveryZoneLegacy(BaseModel):
@@ -24,4 +28,12 @@ class DeliveryZoneLegacy(BaseModel):
     name: str
     coordinates: List[dict]  # [{lat, lng}] polygon points
     assigned_agents: List[str] = []  # user IDs of delivery agents
-    created_at: datetime = Field(default_factory=datetime.utcnow)
\ No newline at end of file
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+class ServiceabilityBatchRequest(BaseModel):
+    points: List[Tuple[float, float]]  # (latitude, longitude) pairs
+
+class ServiceabilityBatchResponse(BaseModel):
+    zone_ids: List[Optional[str]]  # None where the point is not serviceable
+    total: int
+    serviceable: int
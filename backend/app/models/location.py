@@ -0,0 +1,45 @@
+from pydantic import BaseModel, Field
+from typing import Optional, List
+from datetime import datetime
+
+class LocationPing(BaseModel):
+    latitude: float = Field(..., ge=-90, le=90)
+    longitude: float = Field(..., ge=-180, le=180)
+    accuracy_m: Optional[float] = Field(None, ge=0)
+    speed_mps: Optional[float] = Field(None, ge=0)
+    heading: Optional[float] = Field(None, ge=0, le=360)
+    recorded_at: Optional[datetime] = None  # device time; defaults to the time it was received
+
+# About 15 minutes of pings at one per second; a device that was offline longer sends several batches
+MAX_PINGS_PER_BATCH = 1000
+
+class LocationBatch(BaseModel):
+    pings: List[LocationPing] = Field(..., max_length=MAX_PINGS_PER_BATCH)  # buffered while offline, any order
+
+class AgentLocation(BaseModel):
+    agent_id: str
+    latitude: float
+    longitude: float
+    accuracy_m: Optional[float] = None
+    speed_mps: Optional[float] = None
+    heading: Optional[float] = None
+    recorded_at: datetime
+    received_at: datetime
+    age_seconds: float
+    stale: bool
+
+class OrderAgentLocation(AgentLocation):
+    order_id: str
+    distance_km: Optional[float] = None  # straight line to the drop
+    eta: Optional[dict] = None  # {minutes, formatted} from the agent's position
+
+class AgentSuggestion(BaseModel):
+    agent_id: str
+    latitude: float
+    longitude: float
+    distance_km: float  # straight line from the query point
+    load: int  # active orders
+    capacity: int
+    zone_ids: List[str]
+    recorded_at: datetime
+    age_seconds: float
@@ -8,6 +8,7 @@ class OrderItem(BaseModel):
     product_name: str
     quantity: int
     price: float
+    category: Optional[str] = None
 
 class Order(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -20,9 +21,13 @@ class Order(BaseModel):
     status: str = "pending"  # pending, confirmed, preparing, out_for_delivery, delivered, cancelled
     delivery_agent_id: Optional[str] = None
     delivery_location: Optional[dict] = None  # {latitude, longitude}
+    zone_id: Optional[str] = None
+    wave_id: Optional[str] = None  # set when the order was accepted as part of a delivery wave
     estimated_delivery_time: Optional[dict] = None  # {minutes: int, formatted: str}
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
+    accepted_at: Optional[datetime] = None  # when an agent took the order
+    delivered_at: Optional[datetime] = None
 
 class OrderCreate(BaseModel):
     items: List[dict]  # Use dict here to avoid circular dependency with CartItem
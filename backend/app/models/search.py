@@ -10,8 +10,17 @@ class SearchSort(str, Enum):
     PRICE_DESC = "price_desc"
     CREATED_ASC = "created_asc"
     CREATED_DESC = "created_desc"
+    POPULARITY = "popularity"
     RELEVANCE = "relevance"
 
+class TopSellerMetric(str, Enum):
+    """Ranking metrics for best-seller lists"""
+    DECAYED_UNITS = "decayed_units"
+    DECAYED_REVENUE = "decayed_revenue"
+    UNITS_WINDOW = "units_window"
+    REVENUE_WINDOW = "revenue_window"
+    UNITS_TOTAL = "units_total"
+
 class ProductSearchRequest(BaseModel):
     """Request model for product search"""
     query: Optional[str] = Field(None, description="Search query for name, description, or brand")
@@ -0,0 +1,22 @@
+from pydantic import BaseModel, Field
+from typing import Optional, List
+from datetime import datetime
+import uuid
+
+class WaveStop(BaseModel):
+    order_id: str
+    latitude: float
+    longitude: float
+
+class DeliveryWave(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    zone_id: str
+    order_ids: List[str]
+    stops: List[WaveStop]  # in visiting order
+    distance_km: float  # straight-line length of the stop sequence
+    status: str = "open"  # open, accepted, expired
+    agent_id: Optional[str] = None
+    skipped_order_ids: List[str] = []  # taken by someone else before the wave was accepted
+    held_since: Optional[datetime] = None  # creation time of the oldest order; the dispatch hold runs from here
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    accepted_at: Optional[datetime] = None
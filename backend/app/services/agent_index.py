@@ -0,0 +1,365 @@
+import heapq
+import logging
+import math
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, FrozenSet, List, Optional, Set, Tuple
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from app.core.config import settings
+from app.models.user import UserRole
+from app.services.geo_math import EARTH_RADIUS_KM, haversine_km
+from app.services.zone_index import zone_index
+
+logger = logging.getLogger(__name__)
+
+# Statuses in which an order counts against its agent's capacity
+ACTIVE_STATUSES = ["preparing", "out_for_delivery"]
+
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+Cell = Tuple[int, int]
+
+class AgentEntry:
+    """An agent's last known position and the grid cell it is filed under"""
+    __slots__ = ("agent_id", "latitude", "longitude", "recorded_at", "cell")
+
+    def __init__(self, agent_id: str, latitude: float, longitude: float, recorded_at: datetime, cell: Cell):
+        self.agent_id = agent_id
+        self.latitude = latitude
+        self.longitude = longitude
+        self.recorded_at = recorded_at
+        self.cell = cell
+
+class AgentIndex:
+    """
+    Uniform grid over live agent positions for k-nearest-agent queries.
+
+    Positions are filed under AGENT_INDEX_CELL_DEG cells and moved between
+    cells as pings arrive, so updates are O(1) and nothing is rebuilt. A query
+    scans rings of cells outward from the query point and stops once the k-th
+    best match is closer than anything an unscanned ring could contain, so it
+    only touches the agents near the point.
+
+    Zone membership (DeliveryZone.assigned_agents and User.delivery_zone_id)
+    and current load are refreshed periodically from MongoDB and used as
+    query filters along with position freshness.
+    """
+
+    def __init__(self, cell_deg: float = None):
+        self.cell_deg = cell_deg or settings.AGENT_INDEX_CELL_DEG
+        self.grid: Dict[Cell, Dict[str, AgentEntry]] = {}
+        self.entries: Dict[str, AgentEntry] = {}
+        self.zones: Dict[str, FrozenSet[str]] = {}
+        self.loads: Dict[str, int] = {}
+        self.loaded_at: Optional[datetime] = None
+        self.queries = 0
+        self.query_seconds = 0.0
+
+    def _cell(self, latitude: float, longitude: float) -> Cell:
+        return math.floor(latitude / self.cell_deg), math.floor(longitude / self.cell_deg)
+
+    def update(self, agent_id: str, latitude: float, longitude: float, recorded_at: datetime) -> None:
+        """File a position, unless the index already holds a newer one for the agent"""
+        entry = self.entries.get(agent_id)
+        if entry is not None and recorded_at < entry.recorded_at:
+            return
+        cell = self._cell(latitude, longitude)
+        if entry is None:
+            entry = self.entries[agent_id] = AgentEntry(agent_id, latitude, longitude, recorded_at, cell)
+            self.grid.setdefault(cell, {})[agent_id] = entry
+            return
+        if cell != entry.cell:
+            self._unfile(entry)
+            self.grid.setdefault(cell, {})[agent_id] = entry
+            entry.cell = cell
+        entry.latitude, entry.longitude, entry.recorded_at = latitude, longitude, recorded_at
+
+    def _unfile(self, entry: AgentEntry) -> None:
+        bucket = self.grid.get(entry.cell)
+        if bucket is not None:
+            bucket.pop(entry.agent_id, None)
+            if not bucket:
+                del self.grid[entry.cell]
+
+    def remove(self, agent_id: str) -> None:
+        entry = self.entries.pop(agent_id, None)
+        if entry is not None:
+            self._unfile(entry)
+
+    def prune(self, older_than: datetime) -> int:
+        """Drop positions recorded before `older_than`; returns how many were dropped"""
+        stale = [agent_id for agent_id, entry in self.entries.items() if entry.recorded_at < older_than]
+        for agent_id in stale:
+            self.remove(agent_id)
+        return len(stale)
+
+    def nearest(
+        self,
+        latitude: float,
+        longitude: float,
+        k: int = None,
+        zone_id: Optional[str] = None,
+        available_only: bool = True,
+        max_km: Optional[float] = None,
+        exclude: Optional[Set[str]] = None,
+        now: Optional[datetime] = None,
+    ) -> List[Tuple[float, AgentEntry]]:
+        """
+        The k agents closest to a point (straight-line distance).
+
+        Args:
+            latitude, longitude: Query point
+            k: Number of agents (defaults to AGENT_SUGGESTIONS_K)
+            zone_id: Only agents serving this zone
+            available_only: Skip agents at capacity or without a fresh position
+            max_km: Search radius (defaults to DISPATCH_MAX_DISTANCE_KM)
+            exclude: Agent ids to skip
+
+        Returns:
+            list: (distance_km, entry) pairs, closest first
+        """
+        started = time.perf_counter()
+        k = k or settings.AGENT_SUGGESTIONS_K
+        max_km = max_km or settings.DISPATCH_MAX_DISTANCE_KM
+        now = now or datetime.utcnow()
+        fresh_after = now - timedelta(seconds=settings.LOCATION_STALE_SECONDS)
+        capacity = settings.DISPATCH_AGENT_CAPACITY
+
+        best: List[Tuple[float, str, AgentEntry]] = []  # max-heap on distance via negation
+        cx, cy = self._cell(latitude, longitude)
+        scanned = 0
+        ring = 0
+        while scanned < len(self.entries):
+            cells = [(cx, cy)] if ring == 0 else [
+                (cx + dx, cy + dy)
+                for dx in range(-ring, ring + 1)
+                for dy in ((-ring, ring) if abs(dx) != ring else range(-ring, ring + 1))
+            ]
+            for cell in cells:
+                bucket = self.grid.get(cell)
+                if not bucket:
+                    continue
+                scanned += len(bucket)
+                for entry in bucket.values():
+                    agent_id = entry.agent_id
+                    if exclude and agent_id in exclude:
+                        continue
+                    if zone_id is not None and zone_id not in self.zones.get(agent_id, ()):
+                        continue
+                    if available_only and (entry.recorded_at < fresh_after or self.loads.get(agent_id, 0) >= capacity):
+                        continue
+                    distance = haversine_km(latitude, longitude, entry.latitude, entry.longitude)
+                    if distance > max_km:
+                        continue
+                    if len(best) < k:
+                        heapq.heappush(best, (-distance, agent_id, entry))
+                    elif distance < -best[0][0]:
+                        heapq.heapreplace(best, (-distance, agent_id, entry))
+            # Anything in ring + 1 or beyond is at least `ring` whole cells away
+            reach_lat = min(89.9, abs(latitude) + (ring + 1) * self.cell_deg)
+            bound_km = ring * self.cell_deg * KM_PER_DEGREE * math.cos(math.radians(reach_lat))
+            if bound_km > max_km or (len(best) == k and -best[0][0] <= bound_km):
+                break
+            ring += 1
+
+        self.queries += 1
+        self.query_seconds += time.perf_counter() - started
+        return [(-d, entry) for d, _, entry in sorted(best, reverse=True)]
+
+    def describe(self, distance_km: float, entry: AgentEntry, now: Optional[datetime] = None) -> Dict[str, Any]:
+        """A query result for API responses"""
+        now = now or datetime.utcnow()
+        return {
+            "agent_id": entry.agent_id,
+            "latitude": entry.latitude,
+            "longitude": entry.longitude,
+            "distance_km": round(distance_km, 3),
+            "load": self.loads.get(entry.agent_id, 0),
+            "capacity": settings.DISPATCH_AGENT_CAPACITY,
+            "zone_ids": sorted(self.zones.get(entry.agent_id, ())),
+            "recorded_at": entry.recorded_at,
+            "age_seconds": round(max((now - entry.recorded_at).total_seconds(), 0.0), 1),
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "agents": len(self.entries),
+            "cells": len(self.grid),
+            "cell_deg": self.cell_deg,
+            "agents_with_zones": len(self.zones),
+            "agents_with_load": sum(1 for load in self.loads.values() if load),
+            "queries": self.queries,
+            "mean_query_us": round(self.query_seconds / self.queries * 1e6, 1) if self.queries else None,
+            "loaded_at": self.loaded_at,
+        }
+
+agent_index = AgentIndex()
+
+async def agent_zone_membership(db) -> Dict[str, Set[str]]:
+    """Zones each delivery agent serves: listed in the zone's assigned_agents or set on the agent"""
+    users = await db.users.find(
+        {"role": UserRole.DELIVERY_AGENT},
+        {"_id": 0, "id": 1, "delivery_zone_id": 1}
+    ).to_list(None)
+    membership: Dict[str, Set[str]] = {u['id']: set() for u in users}
+    for entry in zone_index.zones:
+        for agent_id in entry.zone.get('assigned_agents') or []:
+            if agent_id in membership:
+                membership[agent_id].add(entry.zone.get('id'))
+    for user in users:
+        if user.get('delivery_zone_id'):
+            membership[user['id']].add(user['delivery_zone_id'])
+    return membership
+
+async def agent_loads(db, agent_ids: List[str]) -> List[Dict[str, Any]]:
+    """Active orders per agent, with the most recently updated drop ({_id, load, location})"""
+    return await db.orders.aggregate([
+        {"$match": {"delivery_agent_id": {"$in": agent_ids}, "status": {"$in": ACTIVE_STATUSES}}},
+        {"$sort": {"updated_at": -1}},
+        {"$group": {"_id": "$delivery_agent_id", "load": {"$sum": 1}, "location": {"$first": "$delivery_location"}}}
+    ]).to_list(None)
+
+# Agent capacity is enforced at write time with a per-agent counter of active orders in
+# `agent_load_counters` ({_id: agent_id, load, v}): a claim first takes a slot with a
+# conditional $inc, so planners in different workers (dispatch, waves, admin assignment,
+# agents accepting orders) cannot together push an agent past its capacity. Slots are
+# given back when the claim loses or the order leaves ACTIVE_STATUSES, and
+# reconcile_agent_load_counters repairs any drift from the orders themselves. `v` is
+# bumped by every reserve and release so the repair can tell a counter was touched
+# even when its load came back to the same value.
+
+async def reserve_agent_slot(db, agent_id: str, capacity: int = None) -> bool:
+    """
+    Take one unit of an agent's capacity.
+
+    Returns:
+        bool: False if the agent already carries `capacity` active orders
+    """
+    capacity = capacity if capacity is not None else settings.DISPATCH_AGENT_CAPACITY
+    try:
+        await db.agent_load_counters.update_one(
+            {"_id": agent_id, "load": {"$lt": capacity}},
+            {"$inc": {"load": 1, "v": 1}},
+            upsert=True
+        )
+        return True
+    except DuplicateKeyError:
+        # The counter exists and is at capacity, so the upsert tried to insert it
+        return False
+
+async def release_agent_slot(db, agent_id: str) -> None:
+    await db.agent_load_counters.update_one({"_id": agent_id, "load": {"$gt": 0}}, {"$inc": {"load": -1, "v": 1}})
+
+async def claim_order(
+    db,
+    agent_id: str,
+    query: Dict[str, Any],
+    changes: Dict[str, Any],
+    return_document=ReturnDocument.AFTER,
+    capacity: int = None,
+) -> Tuple[Optional[Dict[str, Any]], bool]:
+    """
+    Assign an order to an agent with a conditional write, within the agent's capacity.
+
+    Args:
+        query: Filter that only matches the order while it is still claimable
+        changes: Fields to set on the order
+        return_document: ReturnDocument.BEFORE or AFTER
+        capacity: Active orders the agent may carry (defaults to DISPATCH_AGENT_CAPACITY)
+
+    Returns:
+        tuple: (order document or None, whether the agent was at capacity)
+    """
+    if not await reserve_agent_slot(db, agent_id, capacity):
+        return None, True
+    try:
+        order = await db.orders.find_one_and_update(
+            query, {"$set": changes}, projection={"_id": 0}, return_document=return_document
+        )
+    except BaseException:
+        await release_agent_slot(db, agent_id)
+        raise
+    if order is None:
+        await release_agent_slot(db, agent_id)
+        return None, False
+    agent_index.loads[agent_id] = agent_index.loads.get(agent_id, 0) + 1
+    return order, False
+
+async def reconcile_agent_load_counters(db) -> Dict[str, Any]:
+    """
+    Reset every agent's capacity counter to its number of active orders.
+
+    A counter is only overwritten if no reserve or release touched it while the
+    orders were counted (its version `v` is unchanged; comparing the load alone
+    would miss a claim and release that cancel out), so a concurrent claim or
+    release is not lost; it is checked again on the next run.
+    """
+    counters = {
+        doc['_id']: (doc.get('load', 0), doc.get('v'))
+        async for doc in db.agent_load_counters.find({}, {"load": 1, "v": 1})
+    }
+    actual = {
+        row['_id']: row['load']
+        for row in await db.orders.aggregate([
+            {"$match": {"status": {"$in": ACTIVE_STATUSES}, "delivery_agent_id": {"$ne": None}}},
+            {"$group": {"_id": "$delivery_agent_id", "load": {"$sum": 1}}}
+        ]).to_list(None)
+    }
+    fixed = 0
+    for agent_id in set(counters) | set(actual):
+        seen, load = counters.get(agent_id), actual.get(agent_id, 0)
+        if seen is None:
+            result = await db.agent_load_counters.update_one(
+                {"_id": agent_id}, {"$setOnInsert": {"load": load, "v": 0}}, upsert=True
+            )
+            fixed += 1 if result.upserted_id is not None else 0
+            continue
+        seen_load, version = seen
+        if seen_load == load:
+            continue
+        # A missing `v` (counter written before versions) matches {"v": None}
+        result = await db.agent_load_counters.update_one(
+            {"_id": agent_id, "v": version}, {"$set": {"load": load}, "$inc": {"v": 1}}
+        )
+        fixed += result.modified_count
+    if fixed:
+        logger.info(f"Agent load counters corrected: {fixed}")
+    return {"agents": len(actual), "corrected": fixed}
+
+async def refresh_agent_index(db) -> None:
+    """
+    Sync the index with MongoDB: fresh positions flushed by every worker,
+    zone membership and loads. Positions older than LOCATION_STALE_SECONDS are dropped.
+    """
+    if not zone_index.loaded:
+        await zone_index.refresh(db)
+    cutoff = datetime.utcnow() - timedelta(seconds=settings.LOCATION_STALE_SECONDS)
+    async for doc in db.agent_locations.find(
+        {"recorded_at": {"$gte": cutoff}},
+        {"_id": 0, "agent_id": 1, "latitude": 1, "longitude": 1, "recorded_at": 1}
+    ):
+        agent_index.update(doc['agent_id'], doc['latitude'], doc['longitude'], doc['recorded_at'])
+    agent_index.prune(cutoff)
+
+    membership = await agent_zone_membership(db)
+    loads = await agent_loads(db, list(membership))
+    agent_index.zones = {agent_id: frozenset(zones) for agent_id, zones in membership.items()}
+    agent_index.loads = {row['_id']: row['load'] for row in loads}
+    agent_index.loaded_at = datetime.utcnow()
+
+async def suggest_agents(db, order: Dict[str, Any], k: int = None) -> List[Dict[str, Any]]:
+    """
+    Closest available agents for an order: serving its zone, under capacity,
+    with a fresh position, nearest to the drop first.
+    """
+    if agent_index.loaded_at is None:
+        await refresh_agent_index(db)
+    location = order.get('delivery_location')
+    if not location:
+        return []
+    now = datetime.utcnow()
+    matches = agent_index.nearest(location['latitude'], location['longitude'], k, zone_id=order.get('zone_id'), now=now)
+    return [agent_index.describe(distance, entry, now) for distance, entry in matches]
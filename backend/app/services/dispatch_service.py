@@ -0,0 +1,243 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.services import order_events, wave_service
+from app.services.agent_index import ACTIVE_STATUSES, agent_index, agent_loads, agent_zone_membership, claim_order
+from app.services.geo_math import haversine_matrix
+from app.services.zone_index import zone_index
+
+logger = logging.getLogger(__name__)
+
+# Each round only the cheapest orders per agent are ranked, instead of sorting
+# the whole orders x agents cost matrix
+CANDIDATES_PER_AGENT = 8
+
+Point = Tuple[float, float]  # (latitude, longitude)
+
+class AgentSlot:
+    """An agent's dispatch state for one cycle"""
+    __slots__ = ("id", "position", "load", "capacity")
+
+    def __init__(self, agent_id: str, position: Optional[Point], load: int, capacity: int):
+        self.id = agent_id
+        self.position = position
+        self.load = load
+        self.capacity = capacity
+
+    @property
+    def free(self) -> int:
+        return self.capacity - self.load
+
+def plan_zone(
+    orders: List[Dict[str, Any]],
+    agents: List[AgentSlot],
+    now: datetime,
+    deadline: float,
+) -> List[Tuple[Dict[str, Any], AgentSlot, float]]:
+    """
+    Assign a zone's waiting orders to its agents.
+
+    Works in rounds: each round gives every agent with free capacity at most one
+    order, matching greedily on cost = distance to the order
+    + DISPATCH_LOAD_PENALTY_KM per order already carried
+    - DISPATCH_WAIT_KM_PER_MINUTE per minute the order has waited (capped at an hour).
+    An assigned agent's position moves to its new drop for the next round, so
+    agents pick up chains of nearby orders. Agents and orders are mutated in place.
+
+    Returns:
+        list: (order, agent, distance_km) assignments
+    """
+    assignments = []
+    points = np.array([(o['delivery_location']['latitude'], o['delivery_location']['longitude']) for o in orders], dtype=np.float64)
+    waited = np.array([min(60.0, (now - o['created_at']).total_seconds() / 60) for o in orders], dtype=np.float64)
+    open_orders = np.ones(len(orders), dtype=bool)
+
+    while time.perf_counter() < deadline:
+        available = [a for a in agents if a.free > 0]
+        candidates = np.flatnonzero(open_orders)
+        if not available or not len(candidates):
+            break
+
+        # Agents with no known position start from the first waiting order's drop
+        positions = [a.position or tuple(points[candidates[0]]) for a in available]
+        distance = haversine_matrix(points[candidates], positions)
+        cost = (
+            distance
+            + settings.DISPATCH_LOAD_PENALTY_KM * np.array([a.load for a in available], dtype=np.float64)[None, :]
+            - settings.DISPATCH_WAIT_KM_PER_MINUTE * waited[candidates][:, None]
+        )
+        cost[distance > settings.DISPATCH_MAX_DISTANCE_KM] = np.inf
+
+        k = min(CANDIDATES_PER_AGENT, len(candidates))
+        rows = np.argpartition(cost, k - 1, axis=0)[:k] if k < len(candidates) else np.indices(cost.shape)[0]
+        cols = np.broadcast_to(np.arange(len(available)), rows.shape)
+        pair_costs = cost[rows, cols]
+
+        taken_orders, taken_agents = set(), set()
+        limit = min(len(candidates), len(available))
+        for flat in np.argsort(pair_costs, axis=None, kind="stable"):
+            if not np.isfinite(pair_costs.flat[flat]):
+                break
+            row, col = int(rows.flat[flat]), int(cols.flat[flat])
+            if row in taken_orders or col in taken_agents:
+                continue
+            taken_orders.add(row)
+            taken_agents.add(col)
+            order_index = int(candidates[row])
+            agent = available[col]
+            open_orders[order_index] = False
+            agent.load += 1
+            agent.position = tuple(points[order_index])
+            assignments.append((orders[order_index], agent, float(distance[row, col])))
+            if len(taken_agents) == limit:
+                break
+
+        if not taken_agents:
+            break  # everything left is out of range
+    return assignments
+
+async def _load_agents(db, zone_ids: List[str]) -> Dict[str, List[AgentSlot]]:
+    """Agents per zone from DeliveryZone.assigned_agents and User.delivery_zone_id, with current load"""
+    membership = await agent_zone_membership(db)
+    members: Dict[str, set] = {zone_id: set() for zone_id in zone_ids}
+    for agent_id, zones in membership.items():
+        for zone_id in zones:
+            if zone_id in members:
+                members[zone_id].add(agent_id)
+
+    # Loads are read fresh so capacity holds; the most recent active drop stands in
+    # for the position of agents without a live one
+    state = {row['_id']: row for row in await agent_loads(db, list(membership))}
+    fresh_after = datetime.utcnow() - timedelta(seconds=settings.LOCATION_STALE_SECONDS)
+
+    # One slot per agent, shared by every zone the agent serves, so capacity is global
+    slots: Dict[str, AgentSlot] = {}
+    for agent_id in set().union(*members.values()):
+        row = state.get(agent_id) or {}
+        live = agent_index.entries.get(agent_id)
+        location = row.get('location')
+        if live is not None and live.recorded_at >= fresh_after:
+            position = (live.latitude, live.longitude)
+        else:
+            position = (location['latitude'], location['longitude']) if location else None
+        slots[agent_id] = AgentSlot(agent_id, position, row.get('load', 0), settings.DISPATCH_AGENT_CAPACITY)
+    return {zone_id: [slots[a] for a in sorted(ids)] for zone_id, ids in members.items()}
+
+_lock = asyncio.Lock()
+_last_run: Optional[Dict[str, Any]] = None
+_totals = {"runs": 0, "assigned": 0, "conflicts": 0, "at_capacity": 0}
+
+async def run_dispatch(db, dry_run: bool = False) -> Dict[str, Any]:
+    """
+    One dispatch cycle: assign confirmed, unassigned orders to agents zone by zone.
+    Orders held by an open wave (see wave_service.held_order_ids) are left to it.
+
+    Zones with the largest backlog are planned first; planning stops at
+    DISPATCH_BUDGET_MS and the remaining zones wait for the next cycle. Each
+    assignment is a conditional update, so an order an agent accepted in the
+    meantime is skipped rather than reassigned, and takes a slot of the agent's
+    capacity counter first, so an agent filled up by another planner since the
+    loads were read is skipped too.
+
+    Args:
+        db: Database connection
+        dry_run: Plan without writing
+
+    Returns:
+        dict: Cycle summary (and the planned assignments on a dry run)
+    """
+    global _last_run
+    if _lock.locked():
+        return {"skipped": True, "reason": "dispatch already running"}
+
+    async with _lock:
+        started = time.perf_counter()
+        deadline = started + settings.DISPATCH_BUDGET_MS / 1000
+        now = datetime.utcnow()
+        if not zone_index.loaded:
+            await zone_index.refresh(db)
+
+        orders = await db.orders.find(
+            {"status": "confirmed", "delivery_agent_id": None, "zone_id": {"$ne": None}, "delivery_location": {"$ne": None}},
+            {"_id": 0, "id": 1, "zone_id": 1, "delivery_location": 1, "created_at": 1}
+        ).sort("created_at", 1).to_list(settings.DISPATCH_MAX_ORDERS)
+        held = await wave_service.held_order_ids(db, now)
+        if held:
+            orders = [order for order in orders if order['id'] not in held]
+
+        by_zone: Dict[str, List[Dict[str, Any]]] = {}
+        for order in orders:
+            by_zone.setdefault(order['zone_id'], []).append(order)
+        agents = await _load_agents(db, list(by_zone))
+
+        plan = []
+        zones_planned = 0
+        for zone_id, zone_orders in sorted(by_zone.items(), key=lambda item: -len(item[1])):
+            if time.perf_counter() >= deadline:
+                break
+            zones_planned += 1
+            if agents.get(zone_id):
+                plan.extend(plan_zone(zone_orders, agents[zone_id], now, deadline))
+        planning_ms = (time.perf_counter() - started) * 1000
+
+        assigned = conflicts = at_capacity = 0
+        if not dry_run:
+            full = set()
+            for order, agent, _ in plan:
+                if agent.id in full:
+                    at_capacity += 1
+                    continue
+                accepted_at = datetime.utcnow()
+                changes = {"delivery_agent_id": agent.id, "status": "preparing", "accepted_at": accepted_at, "updated_at": accepted_at}
+                updated, full_now = await claim_order(
+                    db, agent.id, {"id": order['id'], "status": "confirmed", "delivery_agent_id": None}, changes
+                )
+                if full_now:
+                    # Filled up by another planner since the loads were read
+                    full.add(agent.id)
+                    at_capacity += 1
+                    continue
+                if updated is None:
+                    conflicts += 1
+                    continue
+                assigned += 1
+                await order_events.order_status_changed(db, updated, "confirmed", "preparing")
+
+        summary = {
+            "dry_run": dry_run,
+            "started_at": now,
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 2),
+            "planning_ms": round(planning_ms, 2),
+            "orders_waiting": len(orders),
+            "orders_held_in_waves": len(held),
+            "zones_waiting": len(by_zone),
+            "zones_planned": zones_planned,
+            "budget_exhausted": zones_planned < len(by_zone),
+            "planned": len(plan),
+            "assigned": assigned,
+            "conflicts": conflicts,
+            "at_capacity": at_capacity,
+        }
+        if dry_run:
+            summary["assignments"] = [
+                {"order_id": order['id'], "agent_id": agent.id, "distance_km": round(distance, 3)}
+                for order, agent, distance in plan
+            ]
+        else:
+            _totals["runs"] += 1
+            _totals["assigned"] += assigned
+            _totals["conflicts"] += conflicts
+            _totals["at_capacity"] += at_capacity
+            _last_run = summary
+        if plan and not dry_run:
+            logger.info(f"Dispatch: assigned={assigned}, conflicts={conflicts}, waiting={len(orders)}, time={summary['elapsed_ms']}ms")
+        return summary
+
+def dispatch_stats() -> Dict[str, Any]:
+    return {**_totals, "last_run": _last_run, "running": _lock.locked()}
@@ -0,0 +1,307 @@
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from pymongo import ReplaceOne
+
+from app.core.config import settings
+from app.services.geo_math import AVERAGE_DELIVERY_SPEED, format_delivery_minutes, haversine_km
+from app.services.zone_index import zone_index, zone_rings
+
+logger = logging.getLogger(__name__)
+
+ALL = "*"  # zone key for statistics pooled across zones
+# Observations outside these bounds (minutes) are data errors, not deliveries
+MAX_TRAVEL_MINUTES = 240
+MAX_WAIT_MINUTES = 240
+# Learned factors are clamped so a few odd deliveries cannot produce absurd ETAs
+MIN_FACTOR, MAX_FACTOR = 0.5, 4.0
+
+Point = Tuple[float, float]  # (latitude, longitude)
+
+def _ring_centroid(ring: List[List[float]]) -> Tuple[float, float, float]:
+    """Area-weighted centroid (x, y) and absolute area of a ring"""
+    area = cx = cy = 0.0
+    for (x1, y1), (x2, y2) in zip(ring, ring[1:] + ring[:1]):
+        cross = x1 * y2 - x2 * y1
+        area += cross
+        cx += (x1 + x2) * cross
+        cy += (y1 + y2) * cross
+    if area == 0:
+        xs, ys = [p[0] for p in ring], [p[1] for p in ring]
+        return sum(xs) / len(xs), sum(ys) / len(ys), 0.0
+    return cx / (3 * area), cy / (3 * area), abs(area / 2)
+
+def zone_origin(geometry: Dict[str, Any]) -> Optional[Point]:
+    """
+    Where a zone's deliveries are assumed to start: the centroid of its largest
+    ring. Stands in for the store/agent position until live positions exist.
+    """
+    rings = [[(float(p[0]), float(p[1])) for p in ring] for ring in zone_rings(geometry) if len(ring) >= 3]
+    if not rings:
+        return None
+    x, y, _ = max((_ring_centroid(ring) for ring in rings), key=lambda c: c[2])
+    return y, x
+
+def _default_entry() -> Dict[str, Any]:
+    return {
+        "factor": 1.0,
+        "wait_minutes": settings.ETA_DEFAULT_WAIT_MINUTES,
+        "travel_minutes": settings.ETA_DEFAULT_TRAVEL_MINUTES,
+        "samples": 0,
+        "level": "default",
+    }
+
+class EtaModel:
+    """
+    Delivery ETA = expected wait for an agent + travel time.
+
+    Travel time is the straight-line baseline at AVERAGE_DELIVERY_SPEED (or an
+    OSRM duration when the caller has one) scaled by a speed factor learned per
+    zone and hour of day from delivered orders: factor = sum of observed travel
+    minutes (accepted -> delivered) / sum of baseline minutes. Wait is the mean
+    created -> accepted time for the same cell. Zones without a usable origin
+    fall back to the mean observed travel time for the hour of day.
+
+    Sufficient statistics live in the `eta_stats` collection and are updated
+    with $inc on every delivery. Estimates are served from an in-memory lookup
+    table with the fallback already resolved ((zone, hour) -> (zone, any hour)
+    -> (all zones, hour) -> defaults), so checkout does one dict lookup and no I/O.
+    """
+
+    def __init__(self):
+        self.table: Dict[Tuple[str, int], Dict[str, Any]] = {}
+        self.zone_factors: Dict[str, float] = {}
+        self.origins: Dict[str, Point] = {}
+        self.origins_etag: Optional[str] = None
+        self.cells = 0
+        self.samples = 0
+        self.loaded_at: Optional[datetime] = None
+
+    # Zone origins follow the zone index; recomputed when its version changes
+    def origin(self, zone_id: Optional[str]) -> Optional[Point]:
+        snapshot = zone_index.snapshot
+        if self.origins_etag != snapshot.etag:
+            origins = {}
+            for entry in snapshot.zones:
+                point = zone_origin(entry.geometry)
+                if point:
+                    origins[entry.zone.get('id')] = point
+            self.origins, self.origins_etag = origins, snapshot.etag
+        return self.origins.get(zone_id)
+
+    def build(self, rows: List[Dict[str, Any]]) -> None:
+        """Resolve the lookup table from eta_stats rows ({zone_id, hour, count, travel_minutes, baseline_minutes, wait_minutes})"""
+        sums: Dict[Tuple[str, Any], List[float]] = {}
+
+        def add(key, row):
+            cell = sums.setdefault(key, [0, 0.0, 0.0, 0.0])
+            cell[0] += row.get('count', 0)
+            cell[1] += row.get('travel_minutes', 0.0)
+            cell[2] += row.get('baseline_minutes', 0.0)
+            cell[3] += row.get('wait_minutes', 0.0)
+
+        for row in rows:
+            zone_id, hour = row['zone_id'], row['hour']
+            add((zone_id, hour), row)
+            add((zone_id, None), row)
+            add((ALL, hour), row)
+            add((ALL, None), row)
+
+        def resolve(*keys) -> Dict[str, Any]:
+            for key in keys:
+                cell = sums.get(key)
+                if cell and cell[0] >= settings.ETA_MIN_SAMPLES and cell[2] > 0:
+                    return {
+                        "factor": min(MAX_FACTOR, max(MIN_FACTOR, cell[1] / cell[2])),
+                        "wait_minutes": cell[3] / cell[0],
+                        "travel_minutes": cell[1] / cell[0],
+                        "samples": cell[0],
+                        "level": "zone_hour" if key[0] != ALL and key[1] is not None
+                        else "zone" if key[0] != ALL else "hour" if key[1] is not None else "global",
+                    }
+            return _default_entry()
+
+        zones = {zone_id for zone_id, _ in sums if zone_id != ALL}
+        table = {(ALL, hour): resolve((ALL, hour), (ALL, None)) for hour in range(24)}
+        for zone_id in zones:
+            for hour in range(24):
+                table[(zone_id, hour)] = resolve((zone_id, hour), (zone_id, None), (ALL, hour), (ALL, None))
+        zone_factors = {zone_id: resolve((zone_id, None), (ALL, None))["factor"] for zone_id in zones}
+        zone_factors[ALL] = resolve((ALL, None))["factor"]
+
+        self.table, self.zone_factors = table, zone_factors
+        self.cells = len(rows)
+        self.samples = int(sums.get((ALL, None), [0])[0])
+        self.loaded_at = datetime.utcnow()
+
+    def lookup(self, zone_id: Optional[str], hour: int) -> Dict[str, Any]:
+        entry = self.table.get((zone_id, hour)) or self.table.get((ALL, hour))
+        if entry is None:
+            return _default_entry()
+        return entry
+
+    def travel_minutes(
+        self,
+        zone_id: Optional[str],
+        distance_km: float,
+        at: Optional[datetime] = None,
+        osrm_duration_s: Optional[float] = None
+    ) -> float:
+        """
+        Expected travel time for one leg.
+
+        With an OSRM duration only the hour-of-day shape of the learned factor is
+        applied (factor for this hour / the zone's all-day factor), since OSRM
+        already accounts for the road network.
+        """
+        entry = self.lookup(zone_id, (at or datetime.utcnow()).hour)
+        if osrm_duration_s is not None:
+            zone_factor = self.zone_factors.get(zone_id) or self.zone_factors.get(ALL) or 1.0
+            return osrm_duration_s / 60 * entry["factor"] / zone_factor
+        return distance_km / AVERAGE_DELIVERY_SPEED * 60 * entry["factor"]
+
+    def estimate(self, zone_id: Optional[str], destination: Point, at: Optional[datetime] = None) -> dict:
+        """
+        ETA for a new order: wait for an agent plus travel from the zone origin.
+
+        A zone without a computable origin has no distance to scale, so it gets
+        the mean observed travel time of all zones for the hour (or the global
+        mean, or ETA_DEFAULT_TRAVEL_MINUTES).
+
+        Returns:
+            dict: {minutes, formatted, model}
+        """
+        at = at or datetime.utcnow()
+        origin = self.origin(zone_id)
+        if origin is None:
+            entry = self.lookup(ALL, at.hour)
+            return {**format_delivery_minutes(entry["wait_minutes"] + entry["travel_minutes"]), "model": entry["level"]}
+        entry = self.lookup(zone_id, at.hour)
+        distance_km = haversine_km(origin[0], origin[1], destination[0], destination[1])
+        minutes = entry["wait_minutes"] + self.travel_minutes(zone_id, distance_km, at)
+        return {**format_delivery_minutes(minutes), "model": entry["level"]}
+
+    def observation(self, order: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Training sample from a delivered order, or None if it cannot be used"""
+        created, accepted, delivered = order.get('created_at'), order.get('accepted_at'), order.get('delivered_at')
+        location, zone_id = order.get('delivery_location'), order.get('zone_id')
+        if not (created and accepted and delivered and location and zone_id):
+            return None
+        origin = self.origin(zone_id)
+        if origin is None:
+            return None
+        travel = (delivered - accepted).total_seconds() / 60
+        wait = (accepted - created).total_seconds() / 60
+        if not (0 < travel <= MAX_TRAVEL_MINUTES and 0 <= wait <= MAX_WAIT_MINUTES):
+            return None
+        distance_km = haversine_km(origin[0], origin[1], location['latitude'], location['longitude'])
+        return {
+            "zone_id": zone_id,
+            "hour": accepted.hour,
+            "travel_minutes": travel,
+            "baseline_minutes": max(distance_km / AVERAGE_DELIVERY_SPEED * 60, 1.0),
+            "wait_minutes": wait,
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        levels: Dict[str, int] = {}
+        for entry in self.table.values():
+            levels[entry["level"]] = levels.get(entry["level"], 0) + 1
+        return {
+            "cells": self.cells,
+            "samples": self.samples,
+            "table_entries": len(self.table),
+            "entries_by_level": levels,
+            "global_factor": self.zone_factors.get(ALL),
+            "zone_factors": self.zone_factors,
+            "loaded_at": self.loaded_at,
+        }
+
+eta_model = EtaModel()
+
+async def _ensure_zones(db) -> None:
+    if not zone_index.loaded:
+        await zone_index.refresh(db)
+
+async def refresh_eta_model(db) -> None:
+    """Reload the lookup table from eta_stats (picks up deliveries recorded by every worker)"""
+    await _ensure_zones(db)
+    rows = await db.eta_stats.find({}, {"_id": 0}).to_list(None)
+    eta_model.build(rows)
+
+async def record_delivery(db, order: Dict[str, Any]) -> None:
+    """Fold a delivered order into the statistics; the table picks it up on the next refresh"""
+    await _ensure_zones(db)
+    sample = eta_model.observation(order)
+    if sample is None:
+        return
+    await db.eta_stats.update_one(
+        {"_id": f"{sample['zone_id']}:{sample['hour']}"},
+        {
+            "$inc": {
+                "count": 1,
+                "travel_minutes": sample["travel_minutes"],
+                "baseline_minutes": sample["baseline_minutes"],
+                "wait_minutes": sample["wait_minutes"],
+            },
+            "$setOnInsert": {"zone_id": sample["zone_id"], "hour": sample["hour"]},
+        },
+        upsert=True
+    )
+
+async def retrain_eta_model(db, days: int = None) -> Dict[str, Any]:
+    """
+    Rebuild eta_stats from delivered orders of the last `days` days
+    (defaults to ETA_TRAINING_DAYS) and reload the table.
+
+    Cells are replaced in place and stamped with this run; cells the run did not
+    write are deleted afterwards. The collection is never empty or missing a
+    cell, so concurrent record_delivery upserts cannot race an insert.
+    Deliveries recorded while the retrain runs may be overwritten by the
+    rebuilt cell; they are in the training window and return on the next retrain.
+    """
+    started = time.perf_counter()
+    run_at = datetime.utcnow()
+    await _ensure_zones(db)
+    since = datetime.utcnow() - timedelta(days=days or settings.ETA_TRAINING_DAYS)
+    cursor = db.orders.find(
+        {"status": "delivered", "delivered_at": {"$gte": since}, "accepted_at": {"$ne": None}},
+        {"_id": 0, "zone_id": 1, "delivery_location": 1, "created_at": 1, "accepted_at": 1, "delivered_at": 1}
+    )
+
+    cells: Dict[str, Dict[str, Any]] = {}
+    orders = used = 0
+    async for order in cursor:
+        orders += 1
+        sample = eta_model.observation(order)
+        if sample is None:
+            continue
+        used += 1
+        key = f"{sample['zone_id']}:{sample['hour']}"
+        cell = cells.setdefault(key, {
+            "_id": key, "zone_id": sample["zone_id"], "hour": sample["hour"],
+            "count": 0, "travel_minutes": 0.0, "baseline_minutes": 0.0, "wait_minutes": 0.0
+        })
+        cell["count"] += 1
+        for field in ("travel_minutes", "baseline_minutes", "wait_minutes"):
+            cell[field] += sample[field]
+
+    if cells:
+        await db.eta_stats.bulk_write(
+            [ReplaceOne({"_id": key}, {**cell, "retrained_at": run_at}, upsert=True) for key, cell in cells.items()],
+            ordered=False
+        )
+    removed = await db.eta_stats.delete_many({"retrained_at": {"$ne": run_at}})
+    eta_model.build([{k: v for k, v in cell.items() if k != "_id"} for cell in cells.values()])
+
+    summary = {
+        "orders": orders,
+        "samples": used,
+        "cells": len(cells),
+        "stale_cells_removed": removed.deleted_count,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 2),
+    }
+    logger.info(f"ETA model retrained: {summary}")
+    return summary
@@ -0,0 +1,220 @@
+import asyncio
+import csv
+import logging
+import re
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict, deque
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+Coordinates = Tuple[float, float]  # (latitude, longitude)
+
+# Negative results are cached briefly so a typo does not hit the provider on every retry
+NEGATIVE_TTL_SECONDS = 300
+# Longest locality name (in words) the gazetteer tries to match inside an address
+MAX_PLACE_TOKENS = 6
+
+def normalize_address(address: str) -> str:
+    """Canonical cache key: lowercase, no 'lat,lng:' suffix, punctuation and extra whitespace removed"""
+    address = address.split("lat,lng:")[0].lower()
+    address = re.sub(r"[^\w\s]", " ", address)
+    return " ".join(address.split())
+
+class GeocodingProvider(ABC):
+    """Resolves a normalized address to coordinates"""
+    name: str = "provider"
+
+    @abstractmethod
+    async def geocode(self, address: str) -> Optional[Coordinates]:
+        ...
+
+class GazetteerGeocoder(GeocodingProvider):
+    """
+    Offline provider backed by a CSV gazetteer (name,latitude,longitude).
+
+    An address matches an entry if the whole normalized address, or any run of up
+    to MAX_PLACE_TOKENS consecutive words in it, equals an entry name. The most
+    specific (longest) match wins.
+    """
+    name = "gazetteer"
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.places: Optional[Dict[str, Coordinates]] = None
+
+    def _load(self) -> Dict[str, Coordinates]:
+        places: Dict[str, Coordinates] = {}
+        if not self.path.exists():
+            logger.warning(f"Gazetteer file not found: {self.path}")
+            return places
+        with self.path.open(newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                try:
+                    places[normalize_address(row["name"])] = (float(row["latitude"]), float(row["longitude"]))
+                except (KeyError, TypeError, ValueError):
+                    continue
+        logger.info(f"Gazetteer loaded: {len(places)} places from {self.path}")
+        return places
+
+    async def geocode(self, address: str) -> Optional[Coordinates]:
+        if self.places is None:
+            self.places = self._load()
+        if address in self.places:
+            return self.places[address]
+        tokens = address.split()
+        for size in range(min(MAX_PLACE_TOKENS, len(tokens)), 0, -1):
+            for start in range(len(tokens) - size + 1):
+                match = self.places.get(" ".join(tokens[start:start + size]))
+                if match:
+                    return match
+        return None
+
+PROVIDERS = {
+    "gazetteer": lambda: GazetteerGeocoder(settings.GEOCODER_GAZETTEER_PATH),
+}
+
+class GeocodingService:
+    """
+    Multi-tier geocoder: in-memory LRU -> Mongo `geocode_cache` (TTL index) -> provider.
+
+    Concurrent lookups of the same normalized address share one provider call,
+    and callers wait at most their latency budget; a lookup that overruns keeps
+    running in the background and still populates the caches.
+    """
+
+    def __init__(self, provider: GeocodingProvider, cache_size: int = None):
+        self.provider = provider
+        self.cache_size = cache_size or settings.GEOCODER_CACHE_SIZE
+        self.memory: "OrderedDict[str, Tuple[Optional[Coordinates], float]]" = OrderedDict()
+        self.in_flight: Dict[str, asyncio.Task] = {}
+        self.counters = {
+            "requests": 0, "memory_hits": 0, "mongo_hits": 0, "provider_calls": 0,
+            "provider_misses": 0, "provider_errors": 0, "coalesced": 0, "budget_timeouts": 0,
+        }
+        self.provider_latencies_ms: deque = deque(maxlen=1000)
+
+    def _remember(self, key: str, coordinates: Optional[Coordinates]) -> None:
+        ttl = settings.GEOCODER_CACHE_TTL_SECONDS if coordinates else NEGATIVE_TTL_SECONDS
+        self.memory[key] = (coordinates, time.monotonic() + ttl)
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.cache_size:
+            self.memory.popitem(last=False)
+
+    async def _resolve(self, db, key: str) -> Optional[Coordinates]:
+        cached = await db.geocode_cache.find_one({"_id": key})
+        if cached:
+            self.counters["mongo_hits"] += 1
+            coordinates = (cached["latitude"], cached["longitude"])
+            self._remember(key, coordinates)
+            return coordinates
+
+        self.counters["provider_calls"] += 1
+        started = time.perf_counter()
+        try:
+            coordinates = await self.provider.geocode(key)
+        except Exception as e:
+            self.counters["provider_errors"] += 1
+            logger.error(f"Geocoding provider '{self.provider.name}' failed: {e}")
+            return None
+        finally:
+            self.provider_latencies_ms.append((time.perf_counter() - started) * 1000)
+
+        self._remember(key, coordinates)
+        if coordinates is None:
+            self.counters["provider_misses"] += 1
+            return None
+        await db.geocode_cache.update_one(
+            {"_id": key},
+            {"$set": {
+                "latitude": coordinates[0],
+                "longitude": coordinates[1],
+                "provider": self.provider.name,
+                "created_at": datetime.utcnow()
+            }},
+            upsert=True
+        )
+        return coordinates
+
+    async def _resolve_shared(self, db, key: str) -> Optional[Coordinates]:
+        try:
+            return await self._resolve(db, key)
+        finally:
+            self.in_flight.pop(key, None)
+
+    async def geocode(self, db, address: str, budget_ms: float = None) -> Optional[Coordinates]:
+        """
+        Resolve an address to (latitude, longitude).
+
+        Args:
+            db: Database connection
+            address: Free-form delivery address
+            budget_ms: Maximum time to wait (defaults to GEOCODER_BUDGET_MS)
+
+        Returns:
+            tuple: (latitude, longitude), or None if unknown or over budget
+        """
+        self.counters["requests"] += 1
+        key = normalize_address(address)
+        if not key:
+            return None
+
+        entry = self.memory.get(key)
+        if entry and entry[1] > time.monotonic():
+            self.counters["memory_hits"] += 1
+            self.memory.move_to_end(key)
+            return entry[0]
+
+        task = self.in_flight.get(key)
+        if task:
+            self.counters["coalesced"] += 1
+        else:
+            task = asyncio.create_task(self._resolve_shared(db, key))
+            self.in_flight[key] = task
+
+        budget = (budget_ms if budget_ms is not None else settings.GEOCODER_BUDGET_MS) / 1000
+        try:
+            # Shielded so one caller's timeout does not cancel the shared lookup
+            return await asyncio.wait_for(asyncio.shield(task), timeout=budget)
+        except asyncio.TimeoutError:
+            self.counters["budget_timeouts"] += 1
+            logger.warning(f"Geocoding exceeded {budget * 1000:.0f}ms budget for '{key}'")
+            return None
+        except Exception as e:
+            logger.error(f"Error geocoding '{key}': {e}")
+            return None
+
+    def stats(self) -> Dict[str, Any]:
+        requests = self.counters["requests"] or 1
+        latencies = sorted(self.provider_latencies_ms)
+
+        def percentile(p: float) -> Optional[float]:
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))], 3)
+
+        return {
+            "provider": self.provider.name,
+            **self.counters,
+            "memory_hit_rate": round(self.counters["memory_hits"] / requests, 4),
+            "mongo_hit_rate": round(self.counters["mongo_hits"] / requests, 4),
+            "memory_entries": len(self.memory),
+            "in_flight": len(self.in_flight),
+            "provider_latency_ms": {"p50": percentile(0.5), "p95": percentile(0.95), "max": percentile(1.0)},
+        }
+
+_geocoder: Optional[GeocodingService] = None
+
+def get_geocoder() -> GeocodingService:
+    global _geocoder
+    if _geocoder is None:
+        factory = PROVIDERS.get(settings.GEOCODER_PROVIDER)
+        if factory is None:
+            raise ValueError(f"Unknown geocoding provider: {settings.GEOCODER_PROVIDER}")
+        _geocoder = GeocodingService(factory())
+    return _geocoder
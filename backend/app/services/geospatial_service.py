@@ -1,6 +1,8 @@
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Sequence, Tuple
 import math
 
+from app.services.zone_index import zone_index
+
 def is_point_in_polygon(point: tuple, polygon: list) -> bool:
     """
     Check if a point is inside a polygon using the ray casting algorithm.
@@ -37,6 +39,9 @@ async def get_zone_for_location(db, longitude: float, latitude: float) -> Option
     """
     Find which delivery zone contains a specific location.
     
+    Lookups are answered from the in-process zone index, which handles holes,
+    MultiPolygons and legacy zones; it is loaded on first use if startup could not.
+    
     Args:
         db: Database connection
         longitude: Longitude coordinate
@@ -45,38 +50,32 @@ async def get_zone_for_location(db, longitude: float, latitude: float) -> Option
     Returns:
         dict: Delivery zone document if found, None otherwise
     """
-    # Use MongoDB's geospatial query if available
-    try:
-        # Try to use MongoDB's native geospatial query
-        point = {
-            "type": "Point",
-            "coordinates": [longitude, latitude]  # GeoJSON format [lng, lat]
-        }
-        
-        zone = await db.delivery_zones.find_one({
-            "geometry": {
-                "$geoIntersects": {
-                    "$geometry": point
-                }
-            }
-        })
-        
-        return zone
-    except Exception:
-        # Fallback to manual polygon checking
-        zones = await db.delivery_zones.find().to_list(1000)
-        
-        for zone in zones:
-            if 'geometry' in zone and zone['geometry'].get('type') == 'Polygon':
-                if is_point_in_polygon((longitude, latitude), zone['geometry']['coordinates']):
-                    return zone
-        
-        return None
+    if not zone_index.loaded:
+        await zone_index.refresh(db)
+    return zone_index.locate(longitude, latitude)
+
+async def get_zones_for_locations(db, points: Sequence[Tuple[float, float]]) -> List[Optional[Dict[str, Any]]]:
+    """
+    Find the delivery zone for many locations at once.
+    
+    Args:
+        db: Database connection
+        points: Sequence of (latitude, longitude) pairs
+    
+    Returns:
+        list: Zone document or None for each point, in input order
+    """
+    if not zone_index.loaded:
+        await zone_index.refresh(db)
+    if not points:
+        return []
+    latitudes, longitudes = zip(*points)
+    return zone_index.locate_many(longitudes, latitudes)
 
 def extract_coordinates_from_address(address: str) -> Optional[tuple]:
     """
     Extract coordinates from an address string.
-    This is a simplified implementation - in a real system, you would use a geocoding service.
+    Only handles an explicit coordinate suffix; see geocoding_service for free-form addresses.
     
     Args:
         address: Address string that may contain coordinates
@@ -93,7 +92,4 @@ def extract_coordinates_from_address(address: str) -> Optional[tuple]:
         except:
             pass
     
-    # In a real implementation, you would call a geocoding service here
-    # For example: Google Maps Geocoding API, OpenStreetMap Nominatim, etc.
-    
     return None
\ No newline at end of file
@@ -0,0 +1,307 @@
+import logging
+import time
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from app.core.config import settings
+from app.services.agent_index import agent_index
+
+logger = logging.getLogger(__name__)
+
+EPOCH = datetime(1970, 1, 1)
+# Device clocks ahead of the server by more than this are ignored in favour of the receipt time
+MAX_CLOCK_SKEW = timedelta(seconds=60)
+
+# (agent_id, recorded_at, latitude, longitude, accuracy_m, speed_mps, heading)
+Ping = Tuple[str, datetime, float, float, Optional[float], Optional[float], Optional[float]]
+
+class AgentPosition:
+    """Latest reported position of one agent"""
+    __slots__ = ("agent_id", "latitude", "longitude", "accuracy_m", "speed_mps", "heading", "recorded_at", "received_at")
+
+    def __init__(self, agent_id, latitude, longitude, accuracy_m, speed_mps, heading, recorded_at, received_at):
+        self.agent_id = agent_id
+        self.latitude = latitude
+        self.longitude = longitude
+        self.accuracy_m = accuracy_m
+        self.speed_mps = speed_mps
+        self.heading = heading
+        self.recorded_at = recorded_at
+        self.received_at = received_at
+
+    @classmethod
+    def from_document(cls, doc: Dict[str, Any]) -> "AgentPosition":
+        return cls(*(doc.get(field) for field in cls.__slots__))
+
+    def document(self) -> Dict[str, Any]:
+        return {field: getattr(self, field) for field in self.__slots__}
+
+    def describe(self, now: Optional[datetime] = None) -> Dict[str, Any]:
+        """Document plus its age, for API responses"""
+        age = ((now or datetime.utcnow()) - self.recorded_at).total_seconds()
+        return {**self.document(), "age_seconds": round(max(age, 0.0), 1), "stale": age > settings.LOCATION_STALE_SECONDS}
+
+def _normalize_time(recorded_at: Optional[datetime], now: datetime) -> datetime:
+    if recorded_at is None:
+        return now
+    if recorded_at.tzinfo is not None:
+        recorded_at = recorded_at.astimezone(timezone.utc).replace(tzinfo=None)
+    return now if recorded_at > now + MAX_CLOCK_SKEW else recorded_at
+
+def history_groups(pings: List[Ping], bucket_seconds: int) -> Dict[Tuple[str, int], List[Ping]]:
+    """Pings keyed by (agent, bucket start in epoch seconds), each group in arrival order"""
+    groups: Dict[Tuple[str, int], List[Ping]] = {}
+    for ping in pings:
+        start = int((ping[1] - EPOCH).total_seconds() // bucket_seconds) * bucket_seconds
+        groups.setdefault((ping[0], start), []).append(ping)
+    return groups
+
+def history_update(agent_id: str, start: int, pings: List[Ping]) -> UpdateOne:
+    """
+    The upsert adding one group of pings to its (agent, time bucket) document.
+
+    A bucket document holds every point an agent reported in one bucket:
+    {_id: "<agent_id>:<bucket epoch>", agent_id, bucket_start, count, first_at,
+    last_at, points: [{t, lat, lng, acc?, spd?, hdg?}]}, with points kept in
+    time order. Short point keys keep the documents small.
+    """
+    points = []
+    for _, recorded_at, latitude, longitude, accuracy_m, speed_mps, heading in pings:
+        point = {"t": recorded_at, "lat": latitude, "lng": longitude}
+        if accuracy_m is not None:
+            point["acc"] = accuracy_m
+        if speed_mps is not None:
+            point["spd"] = speed_mps
+        if heading is not None:
+            point["hdg"] = heading
+        points.append(point)
+    times = [p["t"] for p in points]
+    return UpdateOne(
+        {"_id": f"{agent_id}:{start}"},
+        {
+            "$push": {"points": {"$each": points, "$sort": {"t": 1}}},
+            "$inc": {"count": len(points)},
+            "$min": {"first_at": min(times)},
+            "$max": {"last_at": max(times)},
+            "$setOnInsert": {"agent_id": agent_id, "bucket_start": EPOCH + timedelta(seconds=start)},
+        },
+        upsert=True
+    )
+
+def history_updates(pings: List[Ping], bucket_seconds: int) -> List[UpdateOne]:
+    """One upsert per (agent, time bucket), see history_update"""
+    return [
+        history_update(agent_id, start, group)
+        for (agent_id, start), group in history_groups(pings, bucket_seconds).items()
+    ]
+
+def _failed_indexes(error: BulkWriteError, ignore_code: Optional[int] = None) -> set:
+    return {
+        failure["index"] for failure in error.details.get("writeErrors", [])
+        if ignore_code is None or failure.get("code") != ignore_code
+    }
+
+class LocationStore:
+    """
+    Per-worker agent positions.
+
+    Every ping updates the agent's entry in `latest` (unless it is older than
+    what we already have) and is appended to a bounded buffer. A periodic
+    flush writes the buffer to `agent_location_history` as time-bucketed
+    documents and the agents' latest positions to `agent_locations`, both as
+    unordered bulk writes, so ingestion itself never waits on MongoDB. If the
+    buffer fills faster than it is flushed the oldest pings are dropped.
+
+    `agent_locations` is what other workers read, since an agent's pings all
+    land on whichever worker holds its connection.
+    """
+
+    def __init__(self, max_pending: int = None):
+        self.latest: Dict[str, AgentPosition] = {}
+        self.pending: Deque[Ping] = deque(maxlen=max_pending or settings.LOCATION_BUFFER_MAX_PINGS)
+        self.dirty: set = set()
+        self.received = 0
+        self.out_of_order = 0
+        self.dropped = 0
+        self.flushed = 0
+        self.flush_errors = 0
+        self.last_flush: Optional[Dict[str, Any]] = None
+
+    def ingest(
+        self,
+        agent_id: str,
+        latitude: float,
+        longitude: float,
+        accuracy_m: Optional[float] = None,
+        speed_mps: Optional[float] = None,
+        heading: Optional[float] = None,
+        recorded_at: Optional[datetime] = None,
+        now: Optional[datetime] = None,
+    ) -> bool:
+        """
+        Record one ping.
+
+        Returns:
+            bool: True if it became the agent's latest position
+        """
+        now = now or datetime.utcnow()
+        recorded_at = _normalize_time(recorded_at, now)
+        self.received += 1
+        if len(self.pending) == self.pending.maxlen:
+            self.dropped += 1
+        self.pending.append((agent_id, recorded_at, latitude, longitude, accuracy_m, speed_mps, heading))
+
+        current = self.latest.get(agent_id)
+        if current is not None and recorded_at < current.recorded_at:
+            self.out_of_order += 1
+            return False
+        self.latest[agent_id] = AgentPosition(agent_id, latitude, longitude, accuracy_m, speed_mps, heading, recorded_at, now)
+        self.dirty.add(agent_id)
+        agent_index.update(agent_id, latitude, longitude, recorded_at)
+        return True
+
+    def position(self, agent_id: str) -> Optional[AgentPosition]:
+        return self.latest.get(agent_id)
+
+    def _requeue(self, pings: List[Ping]) -> None:
+        """
+        Put pings that were not written back at the front of the buffer. They are
+        the oldest ones, so when the buffer has no room for all of them the oldest
+        of them are dropped (and counted) rather than newer pings being evicted.
+        """
+        room = self.pending.maxlen - len(self.pending)
+        if len(pings) > room:
+            self.dropped += len(pings) - room
+            pings = pings[len(pings) - room:] if room > 0 else []
+        self.pending.extendleft(reversed(pings))
+
+    async def flush(self, db) -> Optional[Dict[str, Any]]:
+        """
+        Write buffered history and changed latest positions.
+
+        Only what was not written is retried on the next flush: after a partial
+        failure of a bulk write, the pings of the failed bucket upserts and the
+        agents of the failed position upserts (re-pushing a bucket that was
+        written would duplicate its points). When the outcome is unknown (e.g. a
+        network error) everything is retried.
+        """
+        if not self.pending and not self.dirty:
+            return None
+        started = time.perf_counter()
+        pings = list(self.pending)
+        self.pending.clear()
+        dirty, self.dirty = self.dirty, set()
+
+        groups = history_groups(pings, settings.LOCATION_BUCKET_SECONDS)
+        keys = list(groups)
+        history = [history_update(agent_id, start, groups[(agent_id, start)]) for agent_id, start in keys]
+        agents = [agent_id for agent_id in dirty if agent_id in self.latest]
+        # Only replaces an older stored position: if another worker already wrote a
+        # newer one the filter misses, the upsert collides on _id and the position
+        # is left as it is
+        latest = [
+            UpdateOne(
+                {"_id": agent_id, "recorded_at": {"$lt": self.latest[agent_id].recorded_at}},
+                {"$set": self.latest[agent_id].document()},
+                upsert=True
+            )
+            for agent_id in agents
+        ]
+
+        partial: Optional[BulkWriteError] = None
+        try:
+            # Latest positions first: re-running them after a failure is harmless, re-pushing history is not
+            if latest:
+                await db.agent_locations.bulk_write(latest, ordered=False)
+        except BulkWriteError as e:
+            # Duplicate keys are positions already superseded in MongoDB, not failures
+            failed = _failed_indexes(e, ignore_code=11000)
+            if failed:
+                partial = e
+                self.dirty |= {agents[i] for i in failed}
+        except Exception:
+            self.flush_errors += 1
+            self._requeue(pings)
+            self.dirty |= dirty
+            raise
+
+        retried: List[Ping] = []
+        try:
+            if history:
+                await db.agent_location_history.bulk_write(history, ordered=False)
+        except BulkWriteError as e:
+            partial = e
+            failed = {keys[i] for i in _failed_indexes(e)}
+            retried = [ping for key in keys if key in failed for ping in groups[key]]
+            self._requeue(retried)
+        except Exception:
+            self.flush_errors += 1
+            self._requeue(pings)
+            raise
+
+        self.flushed += len(pings) - len(retried)
+        self.last_flush = {
+            "at": datetime.utcnow(),
+            "pings": len(pings) - len(retried),
+            "buckets": len(history),
+            "agents": len(latest),
+            "retried_pings": len(retried),
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 2),
+        }
+        if partial is not None:
+            self.flush_errors += 1
+            raise partial
+        return self.last_flush
+
+    def stats(self) -> Dict[str, Any]:
+        now = datetime.utcnow()
+        live = sum(1 for p in self.latest.values() if (now - p.recorded_at).total_seconds() <= settings.LOCATION_STALE_SECONDS)
+        return {
+            "agents_tracked": len(self.latest),
+            "agents_live": live,
+            "received": self.received,
+            "out_of_order": self.out_of_order,
+            "pending": len(self.pending),
+            "dropped": self.dropped,
+            "flushed": self.flushed,
+            "flush_errors": self.flush_errors,
+            "last_flush": self.last_flush,
+        }
+
+location_store = LocationStore()
+
+async def flush_locations(db) -> None:
+    await location_store.flush(db)
+
+async def get_agent_position(db, agent_id: str) -> Optional[AgentPosition]:
+    """
+    Latest position of an agent.
+
+    Served from memory while this worker is receiving the agent's pings;
+    otherwise (pings going to another worker, or none since a restart) the
+    newer of the local entry and the flushed `agent_locations` document.
+    """
+    local = location_store.position(agent_id)
+    if local is not None and (datetime.utcnow() - local.received_at).total_seconds() <= 2 * settings.LOCATION_FLUSH_INTERVAL_SECONDS:
+        return local
+    doc = await db.agent_locations.find_one({"_id": agent_id}, {"_id": 0})
+    if doc is None:
+        return local
+    stored = AgentPosition.from_document(doc)
+    if local is not None and local.recorded_at >= stored.recorded_at:
+        return local
+    return stored
+
+async def get_agent_history(db, agent_id: str, since: datetime, until: Optional[datetime] = None) -> List[Dict[str, Any]]:
+    """Points reported by an agent between `since` and `until`, oldest first"""
+    until = until or datetime.utcnow()
+    bucket = timedelta(seconds=settings.LOCATION_BUCKET_SECONDS)
+    buckets = await db.agent_location_history.find(
+        {"agent_id": agent_id, "bucket_start": {"$gt": since - bucket, "$lte": until}},
+        {"_id": 0, "points": 1}
+    ).sort("bucket_start", 1).to_list(None)
+    return [p for b in buckets for p in b['points'] if since <= p['t'] <= until]
@@ -0,0 +1,40 @@
+import logging
+from typing import Any, Dict
+
+from app.core.config import settings
+from app.core.tasks import spawn_task
+from app.services import dispatch_service, eta_service, rollup_service, stats_service, velocity_service
+from app.services.agent_index import ACTIVE_STATUSES, release_agent_slot
+
+logger = logging.getLogger(__name__)
+
+# Order lifecycle hooks. Every handler is isolated so a failing side effect
+# (counters, rollups, ...) never fails the request that produced the event;
+# the periodic reconcile jobs repair anything that was missed.
+
+DISPATCH_TRIGGER_STATUSES = {"confirmed", "delivered", "cancelled"}
+
+async def order_created(db, order: Dict[str, Any]) -> None:
+    await _run("order_created", stats_service.record_order_created(db, order))
+    await _run("order_created", rollup_service.record_order_created(db, order))
+    await _run("order_created", velocity_service.record_order_sales(db, order))
+
+async def order_status_changed(db, order: Dict[str, Any], old_status: str, new_status: str) -> None:
+    """`order` is the document with the update applied; statuses are passed explicitly"""
+    await _run("order_status_changed", stats_service.record_order_status_changed(db, order, old_status, new_status))
+    await _run("order_status_changed", rollup_service.record_order_status_changed(db, order, old_status, new_status))
+    if new_status == "delivered" and old_status != "delivered":
+        await _run("order_status_changed", eta_service.record_delivery(db, order))
+    # Claims take their capacity slot themselves; finishing or cancelling gives it back
+    if order.get('delivery_agent_id') and old_status in ACTIVE_STATUSES and new_status not in ACTIVE_STATUSES:
+        await _run("order_status_changed", release_agent_slot(db, order['delivery_agent_id']))
+    # A newly confirmed order or freed agent capacity is worth dispatching now
+    # rather than waiting for the next periodic cycle
+    if settings.DISPATCH_ON_EVENTS and new_status in DISPATCH_TRIGGER_STATUSES:
+        spawn_task("dispatch-event", dispatch_service.run_dispatch)
+
+async def _run(event: str, handler) -> None:
+    try:
+        await handler
+    except Exception as e:
+        logger.error(f"Error handling {event} event: {e}")
@@ -0,0 +1,275 @@
+import asyncio
+import importlib.util
+import logging
+import random
+import time
+from collections import deque
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+import httpx
+
+from app.core.config import settings
+from app.core.metrics import osrm_circuit_rejections, osrm_request_duration
+
+logger = logging.getLogger(__name__)
+
+# Upstream statuses worth retrying; other 4xx responses are the caller's fault
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+class CircuitOpenError(Exception):
+    """Raised without calling upstream while the circuit breaker is open"""
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+
+    After `failure_threshold` failures in a row the circuit opens and calls fail
+    fast for `reset_timeout` seconds; then a single trial call is let through
+    (half-open) and its outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.trial_in_progress = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def before_call(self) -> bool:
+        """
+        Raises CircuitOpenError while open. Returns True if this call is the
+        half-open trial; its caller must end it with record_success,
+        record_failure or release_trial.
+        """
+        state = self.state
+        if state == "open" or (state == "half_open" and self.trial_in_progress):
+            raise CircuitOpenError("Routing service circuit is open")
+        if state == "half_open":
+            self.trial_in_progress = True
+            return True
+        return False
+
+    def release_trial(self) -> None:
+        # The trial ended without telling us anything about upstream (e.g. it was cancelled)
+        self.trial_in_progress = False
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_progress = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self.trial_in_progress = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            if self.opened_at is None:
+                logger.warning(f"Routing circuit opened after {self.failures} consecutive failures")
+            self.opened_at = time.monotonic()
+
+class UpstreamStats:
+    """Call counts and a rolling latency window for one upstream service"""
+
+    def __init__(self, window: int = 1000):
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.rejected = 0
+        self.latencies_ms: deque = deque(maxlen=window)
+
+    def snapshot(self) -> Dict[str, Any]:
+        latencies = sorted(self.latencies_ms)
+
+        def percentile(p: float) -> Optional[float]:
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))], 2)
+
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "retries": self.retries,
+            "rejected_by_circuit": self.rejected,
+            "latency_ms": {"p50": percentile(0.5), "p95": percentile(0.95), "p99": percentile(0.99), "max": percentile(1.0)},
+        }
+
+class OSRMClient:
+    """
+    Shared OSRM HTTP client.
+
+    One pooled httpx.AsyncClient is opened at startup and reused for every
+    request (keep-alive, HTTP/2 when the `h2` package is installed), with
+    per-call timeouts, bounded retries with full-jitter backoff and a circuit
+    breaker so a dead upstream fails fast instead of tying up requests.
+    """
+
+    def __init__(
+        self,
+        base_url: str = None,
+        profile: str = None,
+        timeout: float = None,
+        max_retries: int = None,
+        backoff_base: float = None,
+    ):
+        self.base_url = (base_url or settings.OSRM_BASE_URL).rstrip("/")
+        self.profile = profile or settings.OSRM_PROFILE
+        self.timeout = timeout or settings.OSRM_TIMEOUT_SECONDS
+        self.max_retries = max_retries if max_retries is not None else settings.OSRM_MAX_RETRIES
+        self.backoff_base = backoff_base if backoff_base is not None else settings.OSRM_BACKOFF_BASE_SECONDS
+        self.breaker = CircuitBreaker(settings.OSRM_CIRCUIT_FAILURE_THRESHOLD, settings.OSRM_CIRCUIT_RESET_SECONDS)
+        self.stats: Dict[str, UpstreamStats] = {}
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def http2(self) -> bool:
+        return settings.OSRM_HTTP2 and importlib.util.find_spec("h2") is not None
+
+    async def start(self) -> None:
+        if self._client is not None:
+            return
+        self._client = httpx.AsyncClient(
+            base_url=self.base_url,
+            http2=self.http2,
+            timeout=httpx.Timeout(self.timeout),
+            limits=httpx.Limits(
+                max_connections=settings.OSRM_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.OSRM_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=30,
+            ),
+            headers={"User-Agent": f"{settings.PROJECT_NAME}/{settings.VERSION}"},
+        )
+        logger.info(f"OSRM client started: base_url={self.base_url}, http2={self.http2}")
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _get(self, service: str, path: str, params: Dict[str, str], timeout: float = None) -> Dict[str, Any]:
+        """
+        GET an OSRM service with retries and circuit breaking.
+
+        Raises:
+            CircuitOpenError: If the circuit is open
+            httpx.HTTPStatusError: On a non-retryable or final error status
+            httpx.RequestError: On a final transport error or timeout
+        """
+        if self._client is None:
+            await self.start()
+        stats = self.stats.setdefault(service, UpstreamStats())
+
+        try:
+            trial = self.breaker.before_call()
+        except CircuitOpenError:
+            stats.rejected += 1
+            osrm_circuit_rejections.inc(service)
+            raise
+
+        try:
+            return await self._attempts(service, path, params, timeout, stats)
+        except (httpx.RequestError, httpx.HTTPStatusError):
+            raise  # already recorded by _attempts
+        except asyncio.CancelledError:
+            # Cancelled by the caller (client disconnect, wait_for): no verdict on upstream
+            if trial:
+                self.breaker.release_trial()
+            raise
+        except Exception:
+            # e.g. a 200 whose body is not JSON
+            self.breaker.record_failure()
+            raise
+
+    async def _attempts(self, service: str, path: str, params: Dict[str, str], timeout: Optional[float], stats: UpstreamStats) -> Dict[str, Any]:
+        for attempt in range(self.max_retries + 1):
+            started = time.perf_counter()
+            stats.calls += 1
+            try:
+                response = await self._client.get(path, params=params, timeout=timeout or self.timeout)
+                elapsed = time.perf_counter() - started
+                stats.latencies_ms.append(elapsed * 1000)
+                osrm_request_duration.observe(elapsed, service, str(response.status_code))
+                if response.status_code in RETRYABLE_STATUS and attempt < self.max_retries:
+                    raise httpx.HTTPStatusError("Retryable upstream status", request=response.request, response=response)
+                response.raise_for_status()
+                self.breaker.record_success()
+                return response.json()
+            except (httpx.RequestError, httpx.HTTPStatusError) as e:
+                stats.errors += 1
+                if isinstance(e, httpx.RequestError):
+                    osrm_request_duration.observe(time.perf_counter() - started, service, "error")
+                status = e.response.status_code if isinstance(e, httpx.HTTPStatusError) else None
+                retryable = status is None or status in RETRYABLE_STATUS
+                if not retryable:
+                    # The request itself is bad; upstream is healthy
+                    self.breaker.record_success()
+                    raise
+                if attempt >= self.max_retries:
+                    self.breaker.record_failure()
+                    raise
+                stats.retries += 1
+                delay = random.uniform(0, self.backoff_base * (2 ** attempt))
+                logger.warning(f"OSRM {service} attempt {attempt + 1} failed ({e}); retrying in {delay * 1000:.0f}ms")
+                await asyncio.sleep(delay)
+
+    async def route(
+        self,
+        coordinates: Sequence[Tuple[float, float]],
+        steps: bool = False,
+        overview: str = "full",
+        timeout: float = None
+    ) -> Dict[str, Any]:
+        """
+        Call the OSRM route service.
+
+        Args:
+            coordinates: (longitude, latitude) pairs in visiting order
+            steps: Include turn-by-turn steps
+            overview: Geometry detail (full, simplified, false)
+            timeout: Per-call timeout override in seconds
+        """
+        path = f"/route/v1/{self.profile}/" + ";".join(f"{lng},{lat}" for lng, lat in coordinates)
+        params = {"geometries": "geojson", "overview": overview}
+        if steps:
+            params["steps"] = "true"
+        return await self._get("route", path, params, timeout)
+
+    async def table(
+        self,
+        coordinates: Sequence[Tuple[float, float]],
+        annotations: str = "duration",
+        timeout: float = None
+    ) -> Dict[str, Any]:
+        """
+        Call the OSRM table service for an all-pairs matrix.
+
+        Args:
+            coordinates: (longitude, latitude) pairs
+            annotations: Matrices to return (duration, distance or duration,distance)
+            timeout: Per-call timeout override in seconds
+        """
+        path = f"/table/v1/{self.profile}/" + ";".join(f"{lng},{lat}" for lng, lat in coordinates)
+        return await self._get("table", path, {"annotations": annotations}, timeout)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "base_url": self.base_url,
+            "http2": self.http2,
+            "circuit": self.breaker.state,
+            "consecutive_failures": self.breaker.failures,
+            "services": {name: stats.snapshot() for name, stats in self.stats.items()},
+        }
+
+osrm_client = OSRMClient()
+
+async def start_osrm_client() -> None:
+    await osrm_client.start()
+
+async def close_osrm_client() -> None:
+    await osrm_client.close()
@@ -4,10 +4,21 @@ from typing import List, Optional, Dict, Any
 from motor.motor_asyncio import AsyncIOMotorDatabase
 
 from ..models.product import Product, ProductCreate, PaginatedProductsResponse
-from ..models.search import ProductSearchRequest, ProductSearchResponse, SearchSort, SearchFilters
+from ..models.search import ProductSearchRequest, ProductSearchResponse, SearchSort, SearchFilters, TopSellerMetric
+from .stats_service import record_product_created, record_product_deleted
+from .velocity_service import velocity_summary
 
 logger = logging.getLogger(__name__)
 
+# Precomputed sales velocity fields (see velocity_service) used for ranking
+TOP_SELLER_FIELDS = {
+    TopSellerMetric.DECAYED_UNITS: "sales.score_units",
+    TopSellerMetric.DECAYED_REVENUE: "sales.score_revenue",
+    TopSellerMetric.UNITS_WINDOW: "sales.units_window",
+    TopSellerMetric.REVENUE_WINDOW: "sales.revenue_window",
+    TopSellerMetric.UNITS_TOTAL: "sales.units_total",
+}
+
 class ProductService:
     """Enterprise-level product service with advanced search capabilities"""
     
@@ -115,6 +126,7 @@ class ProductService:
             SearchSort.PRICE_DESC: [("price", -1)],
             SearchSort.CREATED_ASC: [("created_at", 1)],
             SearchSort.CREATED_DESC: [("created_at", -1)],
+            SearchSort.POPULARITY: [("sales.score_units", -1), ("created_at", -1)],
             SearchSort.RELEVANCE: [("created_at", -1)]  # Default to newest first
         }
         return sort_map.get(sort_by, [("created_at", -1)])
@@ -150,6 +162,39 @@ class ProductService:
             logger.error(f"Error getting available filters: {str(e)}")
             return SearchFilters()
     
+    async def get_top_sellers(
+        self,
+        limit: int = 10,
+        metric: TopSellerMetric = TopSellerMetric.DECAYED_UNITS,
+        category: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Best sellers ranked by a precomputed velocity metric
+        
+        Args:
+            limit: Number of products to return
+            metric: Velocity field to rank by
+            category: Optional category filter
+            
+        Returns:
+            List of products, each with a `velocity` summary
+        """
+        field = TOP_SELLER_FIELDS[metric]
+        query: Dict[str, Any] = {field: {"$gt": 0}}
+        if category:
+            query["category"] = category
+        
+        try:
+            cursor = self.collection.find(query).sort([(field, -1)]).limit(limit)
+            products = await cursor.to_list(length=limit)
+            return [
+                {**Product(**product).dict(), "velocity": velocity_summary(product)}
+                for product in products
+            ]
+        except Exception as e:
+            logger.error(f"Error getting top sellers: {str(e)}")
+            raise
+    
     async def get_product_by_id(self, product_id: str) -> Optional[Product]:
         """Get a single product by ID"""
         try:
@@ -164,6 +209,7 @@ class ProductService:
         try:
             product = Product(**product_data.dict())
             await self.collection.insert_one(product.dict())
+            await record_product_created(self.db)
             logger.info(f"Product created: {product.id}")
             return product
         except Exception as e:
@@ -193,6 +239,7 @@ class ProductService:
             result = await self.collection.delete_one({"id": product_id})
             success = result.deleted_count > 0
             if success:
+                await record_product_deleted(self.db)
                 logger.info(f"Product deleted: {product_id}")
             return success
         except Exception as e:
@@ -0,0 +1,238 @@
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from pymongo import ReplaceOne, UpdateOne
+
+logger = logging.getLogger(__name__)
+
+# Time-bucketed order metrics in `order_rollups`. One document per
+# (granularity, dimension, key, bucket); averages are derived at read time
+# from the summed fields so every update is a plain $inc.
+GRANULARITIES = {
+    "hour": timedelta(hours=1),
+    "day": timedelta(days=1),
+}
+
+DIMENSION_ALL = "all"
+DIMENSION_ZONE = "zone"
+DIMENSION_CATEGORY = "category"
+DIMENSIONS = (DIMENSION_ALL, DIMENSION_ZONE, DIMENSION_CATEGORY)
+
+METRIC_FIELDS = ("order_count", "revenue", "units", "delivered_count", "delivery_minutes_total", "cancelled_count")
+
+MAX_SERIES_BUCKETS = 2000
+BULK_BATCH_SIZE = 1000
+
+def bucket_start(ts: datetime, granularity: str) -> datetime:
+    """Truncate a timestamp to the start of its bucket"""
+    if granularity == "hour":
+        return ts.replace(minute=0, second=0, microsecond=0)
+    if granularity == "day":
+        return ts.replace(hour=0, minute=0, second=0, microsecond=0)
+    raise ValueError(f"Unknown granularity: {granularity}")
+
+def rollup_id(granularity: str, dimension: str, key: str, bucket: datetime) -> str:
+    return f"{granularity}:{dimension}:{key}:{bucket.isoformat()}"
+
+def _order_dimensions(order: Dict[str, Any], categories: Optional[Dict[str, str]] = None) -> List[Tuple[str, str, Dict[str, float]]]:
+    """
+    Split an order into the (dimension, key, metrics) rows it contributes to.
+
+    Args:
+        order: Order document
+        categories: Optional product_id -> category map for items saved without a category
+
+    Returns:
+        list: One row for the overall series, one for the zone and one per category
+    """
+    units = sum(item.get('quantity', 0) for item in order.get('items', []))
+    rows = [(DIMENSION_ALL, DIMENSION_ALL, {
+        "order_count": 1,
+        "revenue": order.get('total_amount', 0) or 0,
+        "units": units,
+    })]
+
+    if order.get('zone_id'):
+        rows.append((DIMENSION_ZONE, order['zone_id'], dict(rows[0][2])))
+
+    per_category: Dict[str, Dict[str, float]] = {}
+    for item in order.get('items', []):
+        category = item.get('category') or (categories or {}).get(item.get('product_id'))
+        if not category:
+            continue
+        metrics = per_category.setdefault(category, {"order_count": 1, "revenue": 0, "units": 0})
+        metrics["revenue"] += item.get('price', 0) * item.get('quantity', 0)
+        metrics["units"] += item.get('quantity', 0)
+    rows.extend((DIMENSION_CATEGORY, category, metrics) for category, metrics in per_category.items())
+    return rows
+
+def _status_metrics(order: Dict[str, Any], status: str, changed_at: datetime) -> Dict[str, float]:
+    """Metrics a status contributes to the order's buckets"""
+    if status == "delivered":
+        created_at = order.get('created_at') or changed_at
+        delivered_at = order.get('delivered_at') or changed_at
+        minutes = max((delivered_at - created_at).total_seconds() / 60, 0)
+        return {"delivered_count": 1, "delivery_minutes_total": minutes}
+    if status == "cancelled":
+        return {"cancelled_count": 1}
+    return {}
+
+def _updates_for(order: Dict[str, Any], rows, sign: int = 1) -> Iterable[UpdateOne]:
+    created_at = order.get('created_at') or datetime.utcnow()
+    for granularity in GRANULARITIES:
+        bucket = bucket_start(created_at, granularity)
+        for dimension, key, metrics in rows:
+            inc = {field: value * sign for field, value in metrics.items() if value}
+            if not inc:
+                continue
+            yield UpdateOne(
+                {"_id": rollup_id(granularity, dimension, key, bucket)},
+                {
+                    "$inc": inc,
+                    "$setOnInsert": {"granularity": granularity, "dimension": dimension, "key": key, "bucket": bucket}
+                },
+                upsert=True
+            )
+
+async def record_order_created(db, order: Dict[str, Any]) -> None:
+    """Add a new order to every hourly and daily bucket it belongs to"""
+    updates = list(_updates_for(order, _order_dimensions(order)))
+    if updates:
+        await db.order_rollups.bulk_write(updates, ordered=False)
+
+async def record_order_status_changed(db, order: Dict[str, Any], old_status: str, new_status: str) -> None:
+    """
+    Move delivered/cancelled counts and delivery time between statuses.
+    Metrics are attributed to the bucket the order was created in.
+    """
+    if old_status == new_status:
+        return
+    now = datetime.utcnow()
+    keys = [(dimension, key) for dimension, key, _ in _order_dimensions(order)]
+    updates = []
+    for status, sign in ((old_status, -1), (new_status, 1)):
+        metrics = _status_metrics(order, status, now)
+        if metrics:
+            updates.extend(_updates_for(order, [(d, k, metrics) for d, k in keys], sign))
+    if updates:
+        await db.order_rollups.bulk_write(updates, ordered=False)
+
+async def backfill_rollups(db, since: Optional[datetime] = None) -> Dict[str, Any]:
+    """
+    Rebuild rollups from the orders collection.
+
+    Buckets from the start of the day containing `since` (or all buckets) up to
+    the start of the current day are recomputed, so the job is idempotent and
+    can be re-run at any time. Today's buckets are left to the live counters:
+    orders keep arriving in them while the scan runs, and replacing them would
+    drop or double count those. Each recomputed bucket replaces the stored one
+    in place (live $inc upserts never collide with a missing document), then
+    buckets in the range that the scan did not produce are deleted.
+
+    Returns:
+        dict: Number of orders scanned, buckets written and stale buckets removed
+    """
+    started = datetime.utcnow()
+    cutoff = bucket_start(started, "day")
+    order_filter: Dict[str, Any] = {"created_at": {"$lt": cutoff}}
+    rollup_filter: Dict[str, Any] = {"bucket": {"$lt": cutoff}}
+    if since:
+        start = bucket_start(since, "day")
+        order_filter["created_at"]["$gte"] = start
+        rollup_filter["bucket"]["$gte"] = start
+
+    categories = {
+        p['id']: p.get('category')
+        async for p in db.products.find({}, {"id": 1, "category": 1, "_id": 0})
+    }
+
+    buckets: Dict[str, Dict[str, Any]] = defaultdict(lambda: defaultdict(float))
+    scanned = 0
+    projection = {"_id": 0, "items": 1, "total_amount": 1, "zone_id": 1, "status": 1, "created_at": 1, "delivered_at": 1, "updated_at": 1}
+    async for order in db.orders.find(order_filter, projection):
+        scanned += 1
+        rows = _order_dimensions(order, categories)
+        if order.get('status') == "delivered" and not order.get('delivered_at'):
+            # Orders delivered before delivered_at was recorded: last update is the best estimate
+            order['delivered_at'] = order.get('updated_at')
+        status_metrics = _status_metrics(order, order.get('status'), order['created_at'])
+        if status_metrics:
+            rows = [(d, k, {**m, **status_metrics}) for d, k, m in rows]
+        for granularity in GRANULARITIES:
+            bucket = bucket_start(order['created_at'], granularity)
+            for dimension, key, metrics in rows:
+                doc = buckets[rollup_id(granularity, dimension, key, bucket)]
+                doc.update({"granularity": granularity, "dimension": dimension, "key": key, "bucket": bucket})
+                for field, value in metrics.items():
+                    doc[field] = doc.get(field, 0) + value
+
+    replacements = [
+        ReplaceOne({"_id": _id}, {**doc, "backfilled_at": started}, upsert=True)
+        for _id, doc in buckets.items()
+    ]
+    for i in range(0, len(replacements), BULK_BATCH_SIZE):
+        await db.order_rollups.bulk_write(replacements[i:i + BULK_BATCH_SIZE], ordered=False)
+    stale = await db.order_rollups.delete_many({**rollup_filter, "backfilled_at": {"$ne": started}})
+
+    elapsed = (datetime.utcnow() - started).total_seconds()
+    logger.info(f"Rollup backfill finished: orders={scanned}, buckets={len(replacements)}, stale={stale.deleted_count}, time={elapsed:.1f}s")
+    return {
+        "orders_scanned": scanned,
+        "buckets_written": len(replacements),
+        "stale_buckets_removed": stale.deleted_count,
+        "rebuilt_before": cutoff,
+        "elapsed_seconds": elapsed,
+    }
+
+async def get_timeseries(
+    db,
+    granularity: str,
+    start: datetime,
+    end: datetime,
+    dimension: str = DIMENSION_ALL,
+    key: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """
+    Read a contiguous series of buckets in [start, end), filling empty buckets with zeros.
+
+    Raises:
+        ValueError: On an unknown granularity/dimension or a range that is too long
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"granularity must be one of {list(GRANULARITIES)}")
+    if dimension not in DIMENSIONS:
+        raise ValueError(f"dimension must be one of {list(DIMENSIONS)}")
+    if dimension != DIMENSION_ALL and not key:
+        raise ValueError(f"key is required for the '{dimension}' dimension")
+
+    step = GRANULARITIES[granularity]
+    first = bucket_start(start, granularity)
+    if (end - first) / step > MAX_SERIES_BUCKETS:
+        raise ValueError(f"Range too large: at most {MAX_SERIES_BUCKETS} {granularity} buckets")
+
+    key = key or DIMENSION_ALL
+    cursor = db.order_rollups.find({
+        "granularity": granularity,
+        "dimension": dimension,
+        "key": key,
+        "bucket": {"$gte": first, "$lt": end}
+    })
+    stored = {doc['bucket']: doc async for doc in cursor}
+
+    series = []
+    bucket = first
+    while bucket < end:
+        doc = stored.get(bucket, {})
+        metrics = {field: doc.get(field, 0) for field in METRIC_FIELDS}
+        order_count = metrics["order_count"]
+        delivered = metrics["delivered_count"]
+        series.append({
+            "bucket": bucket,
+            **metrics,
+            "average_basket": round(metrics["revenue"] / order_count, 2) if order_count else 0,
+            "average_delivery_minutes": round(metrics["delivery_minutes_total"] / delivered, 1) if delivered else None,
+        })
+        bucket += step
+    return series
@@ -0,0 +1,247 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Sequence, Set, Tuple
+
+import httpx
+
+from app.core.config import settings
+from app.services.geo_math import AVERAGE_DELIVERY_SPEED, path_distances
+from app.services.osrm_client import RETRYABLE_STATUS, CircuitOpenError, osrm_client
+
+logger = logging.getLogger(__name__)
+
+Coordinates = Sequence[Tuple[float, float]]  # (longitude, latitude) pairs
+
+class RouteCache:
+    """
+    TTL + LRU cache of upstream route responses with single-flight fetching.
+
+    Keys are the waypoints rounded to `precision` decimal places (4 places is
+    about 11 m) plus the request variant, so an agent refreshing the map after
+    moving a few metres reuses the previous route. Concurrent misses for the same
+    key share one upstream call; failures are not cached.
+
+    Straight-line fallback routes served while OSRM is down are cached for
+    ROUTE_FALLBACK_TTL_SECONDS and their keys kept in `degraded`, so
+    upgrade_fallback_routes can replace them with real routes once OSRM recovers.
+    """
+
+    def __init__(self, max_entries: int = None, ttl_seconds: float = None, precision: int = None):
+        self.max_entries = max_entries or settings.ROUTE_CACHE_MAX_ENTRIES
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else settings.ROUTE_CACHE_TTL_SECONDS
+        self.precision = precision if precision is not None else settings.ROUTE_CACHE_PRECISION
+        self.entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self.in_flight: Dict[Hashable, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.degraded: Set[Hashable] = set()
+        self.fallbacks = 0
+        self.upgrades = 0
+
+    def quantize(self, coordinates: Coordinates) -> Tuple[Tuple[float, float], ...]:
+        return tuple((round(lng, self.precision), round(lat, self.precision)) for lng, lat in coordinates)
+
+    def _get_fresh(self, key: Hashable) -> Optional[Any]:
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return value
+
+    def _store(self, key: Hashable, value: Any, ttl_seconds: float = None) -> None:
+        self.entries[key] = (time.monotonic() + (ttl_seconds if ttl_seconds is not None else self.ttl_seconds), value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            evicted, _ = self.entries.popitem(last=False)
+            self.degraded.discard(evicted)
+            self.evictions += 1
+
+    def store_fallback(self, key: Hashable, value: Any) -> None:
+        self._store(key, value, settings.ROUTE_FALLBACK_TTL_SECONDS)
+        self.degraded.add(key)
+
+    def store_upgrade(self, key: Hashable, value: Any) -> None:
+        self._store(key, value)
+        self.degraded.discard(key)
+
+    async def get_or_fetch(self, key: Hashable, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Cached value for `key`, or the result of `fetch()` shared by every
+        concurrent caller. The fetch runs as its own task and callers await it
+        through a shield, so a caller that is cancelled (a client disconnect, a
+        timeout) neither cancels the upstream call nor hands its cancellation
+        to the others; the result is still cached when it arrives.
+        """
+        value = self._get_fresh(key)
+        if value is not None:
+            self.hits += 1
+            return value
+
+        pending = self.in_flight.get(key)
+        if pending is not None:
+            self.coalesced += 1
+            return await asyncio.shield(pending)
+
+        self.misses += 1
+        task = asyncio.ensure_future(fetch())
+        self.in_flight[key] = task
+        task.add_done_callback(lambda done: self._fetched(key, done))
+        return await asyncio.shield(task)
+
+    def _fetched(self, key: Hashable, task: asyncio.Future) -> None:
+        if self.in_flight.get(key) is task:
+            del self.in_flight[key]
+        if task.cancelled():
+            return
+        # Retrieved here so a failure nobody is waiting for any more is not logged as never retrieved
+        if task.exception() is None:
+            self._store(key, task.result())
+            self.degraded.discard(key)
+
+    def clear(self) -> None:
+        self.entries.clear()
+        self.degraded.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "entries": len(self.entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "precision": self.precision,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "hit_rate": round((self.hits + self.coalesced) / lookups, 4) if lookups else None,
+            "in_flight": len(self.in_flight),
+            "fallbacks_served": self.fallbacks,
+            "degraded_entries": len(self.degraded),
+            "upgrades": self.upgrades,
+        }
+
+route_cache = RouteCache()
+
+def fallback_route(coordinates: Coordinates, reason: str) -> Dict[str, Any]:
+    """
+    Local stand-in for an OSRM route response: straight segments between the
+    waypoints, haversine distances and the AVERAGE_DELIVERY_SPEED speed model.
+
+    Same shape as OSRM's (routes[0].geometry/distance/duration/legs) so callers
+    need no special casing, plus `source` and `fallback_reason`.
+    """
+    leg_km = path_distances([(lat, lng) for lng, lat in coordinates]).tolist()
+    legs = [{
+        "distance": km * 1000,
+        "duration": km / AVERAGE_DELIVERY_SPEED * 3600,
+        "steps": [],
+        "summary": "",
+    } for km in leg_km]
+    return {
+        "code": "Ok",
+        "source": "fallback",
+        "fallback_reason": reason,
+        "routes": [{
+            "geometry": {"type": "LineString", "coordinates": [[lng, lat] for lng, lat in coordinates]},
+            "distance": sum(leg["distance"] for leg in legs),
+            "duration": sum(leg["duration"] for leg in legs),
+            "legs": legs,
+        }],
+    }
+
+def route_source(data: Dict[str, Any]) -> str:
+    """"osrm" or "fallback" for a get_route result"""
+    return data.get("source", "osrm")
+
+def _fallback_reason(error: BaseException) -> Optional[str]:
+    # Upstream trouble worth degrading for; None means the request itself was bad
+    if isinstance(error, CircuitOpenError):
+        return "circuit_open"
+    if isinstance(error, httpx.HTTPStatusError):
+        return "upstream_error" if error.response.status_code in RETRYABLE_STATUS else None
+    if isinstance(error, httpx.RequestError):
+        return "unavailable"
+    return None
+
+def _after_late_fetch(key: Hashable, quantized, task: asyncio.Future) -> None:
+    # The request was already answered with a fallback; a late OSRM success is
+    # cached by get_or_fetch, a late failure leaves a fallback to upgrade later
+    if task.cancelled():
+        return
+    error = task.exception()
+    if error is not None:
+        reason = _fallback_reason(error)
+        if reason:
+            route_cache.store_fallback(key, fallback_route(quantized, reason))
+
+async def get_route(coordinates: Coordinates, steps: bool = False, budget_ms: float = None) -> Dict[str, Any]:
+    """
+    Fetch an OSRM route through the route cache, degrading to a local route.
+
+    The quantized waypoints are what is sent upstream, so every request that
+    maps to a cache key gets exactly the route stored under it. OSRM gets
+    `budget_ms` (defaults to ROUTE_BUDGET_MS) to answer; past that, or if it
+    fails, the caller gets fallback_route() instead and the upstream call
+    carries on in the background to fill the cache. Errors caused by the
+    request itself (4xx) are raised as before.
+    """
+    quantized = route_cache.quantize(coordinates)
+    variant = "steps" if steps else "overview"
+    key = (variant, quantized)
+    fetch = asyncio.ensure_future(route_cache.get_or_fetch(
+        key,
+        lambda: osrm_client.route(quantized, steps=steps)
+    ))
+    if not settings.ROUTE_FALLBACK_ENABLED:
+        return await fetch
+
+    budget = (budget_ms if budget_ms is not None else settings.ROUTE_BUDGET_MS) / 1000
+    try:
+        data = await (asyncio.wait_for(asyncio.shield(fetch), budget) if budget > 0 else fetch)
+    except asyncio.TimeoutError:
+        fetch.add_done_callback(lambda task: _after_late_fetch(key, quantized, task))
+        data = fallback_route(quantized, "timeout")
+        logger.warning(f"OSRM over the {budget * 1000:.0f}ms budget; serving a fallback route")
+    except (CircuitOpenError, httpx.HTTPError) as e:
+        reason = _fallback_reason(e)
+        if reason is None:
+            raise
+        data = fallback_route(quantized, reason)
+        route_cache.store_fallback(key, data)
+        logger.warning(f"OSRM failed ({reason}); serving a fallback route")
+
+    if route_source(data) == "fallback":
+        route_cache.fallbacks += 1
+    return data
+
+async def upgrade_fallback_routes(db=None) -> None:
+    """
+    Replace cached fallback routes with OSRM routes once the upstream answers
+    again. Stops at the first failure; the remaining keys wait for the next run.
+    """
+    if not route_cache.degraded or osrm_client.breaker.state == "open":
+        return
+    upgraded = 0
+    for key in list(route_cache.degraded)[:settings.ROUTE_UPGRADE_BATCH]:
+        if key not in route_cache.entries:
+            route_cache.degraded.discard(key)
+            continue
+        variant, quantized = key
+        try:
+            data = await osrm_client.route(quantized, steps=variant == "steps")
+        except Exception as e:
+            logger.info(f"Fallback route upgrade stopped: {e}")
+            break
+        route_cache.store_upgrade(key, data)
+        upgraded += 1
+    route_cache.upgrades += upgraded
+    if upgraded:
+        logger.info(f"Upgraded {upgraded} fallback routes ({len(route_cache.degraded)} left)")
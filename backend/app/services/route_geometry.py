@@ -0,0 +1,137 @@
+import math
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.services.zone_geometry import METERS_PER_DEGREE
+
+# Web Mercator ground resolution at the equator, zoom 0 (metres per pixel)
+METERS_PER_PIXEL_Z0 = 156_543.03392
+# Simplification tolerance in screen pixels; below this a vertex is invisible
+SIMPLIFY_PIXELS = 1.0
+# Spans shorter than this are scanned in plain Python; NumPy call overhead dominates below it
+VECTOR_SPAN = 48
+
+Point = Tuple[float, float]  # (latitude, longitude)
+
+def encode_polyline(points: Sequence[Point], precision: int = 5) -> str:
+    """Encode (latitude, longitude) points with the Google encoded polyline algorithm"""
+    if not len(points):
+        return ""
+    scaled = np.round(np.asarray(points, dtype=np.float64).reshape(-1, 2) * 10 ** precision).astype(np.int64)
+    deltas = np.diff(scaled, axis=0, prepend=np.zeros((1, 2), dtype=np.int64)).ravel()
+    values = np.where(deltas < 0, ~(deltas << 1), deltas << 1)
+    chunks = []
+    for value in values.tolist():
+        while value >= 0x20:
+            chunks.append(chr((0x20 | (value & 0x1F)) + 63))
+            value >>= 5
+        chunks.append(chr(value + 63))
+    return "".join(chunks)
+
+def decode_polyline(encoded: str, precision: int = 5) -> List[Point]:
+    """Inverse of encode_polyline"""
+    values, value, shift = [], 0, 0
+    for char in encoded:
+        byte = ord(char) - 63
+        value |= (byte & 0x1F) << shift
+        shift += 5
+        if byte < 0x20:
+            values.append(~(value >> 1) if value & 1 else value >> 1)
+            value, shift = 0, 0
+    coords = np.cumsum(np.asarray(values, dtype=np.int64).reshape(-1, 2), axis=0) / 10 ** precision
+    return [tuple(p) for p in coords.tolist()]
+
+def zoom_tolerance_m(latitude: float, zoom: int) -> float:
+    """Ground distance covered by SIMPLIFY_PIXELS at a Web Mercator zoom level"""
+    return METERS_PER_PIXEL_Z0 * math.cos(math.radians(latitude)) / (2 ** zoom) * SIMPLIFY_PIXELS
+
+def douglas_peucker_mask(xy: np.ndarray, tolerance: float) -> np.ndarray:
+    """
+    Douglas-Peucker over an (n, 2) polyline; returns a mask of kept vertices.
+
+    Same result as zone_geometry.douglas_peucker, but long spans compute their
+    distances in one vectorized step, which matters for routes with thousands
+    of vertices.
+    """
+    keep = np.zeros(len(xy), dtype=bool)
+    keep[0] = keep[-1] = True
+    xs, ys = xy[:, 0].tolist(), xy[:, 1].tolist()
+    stack = [(0, len(xy) - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        ax, ay, bx, by = xs[start], ys[start], xs[end], ys[end]
+        dx, dy = bx - ax, by - ay
+        length = math.hypot(dx, dy)
+        if end - start >= VECTOR_SPAN:
+            inner = xy[start + 1:end]
+            if length == 0:
+                distances = np.hypot(inner[:, 0] - ax, inner[:, 1] - ay)
+            else:
+                distances = np.abs(dy * inner[:, 0] - dx * inner[:, 1] + bx * ay - by * ax) / length
+            index = int(np.argmax(distances))
+            max_distance = float(distances[index])
+        else:
+            max_distance, index = 0.0, 0
+            for i in range(start + 1, end):
+                if length == 0:
+                    distance = math.hypot(xs[i] - ax, ys[i] - ay)
+                else:
+                    distance = abs(dy * xs[i] - dx * ys[i] + bx * ay - by * ax) / length
+                if distance > max_distance:
+                    max_distance, index = distance, i - start - 1
+        if max_distance > tolerance:
+            index += start + 1
+            keep[index] = True
+            stack.append((start, index))
+            stack.append((index, end))
+    return keep
+
+def simplify_for_zoom(points: Sequence[Point], zoom: int) -> List[Point]:
+    """
+    Drop vertices that would be closer than a pixel to the simplified line at `zoom`.
+    Longitudes are scaled by cos(latitude) so the tolerance is isotropic.
+    """
+    if len(points) < 3:
+        return list(points)
+    coords = np.asarray(points, dtype=np.float64)
+    mean_lat = float(coords[:, 0].mean())
+    scale = math.cos(math.radians(mean_lat)) or 1e-9
+    projected = np.column_stack((coords[:, 1] * scale, coords[:, 0]))
+    tolerance = zoom_tolerance_m(mean_lat, zoom) / METERS_PER_DEGREE
+    return [tuple(p) for p in coords[douglas_peucker_mask(projected, tolerance)].tolist()]
+
+def format_route_geometry(coordinates: List[List[float]], geometry_format: str = "objects", zoom: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Convert OSRM GeoJSON coordinates ([longitude, latitude]) for the response.
+
+    Args:
+        coordinates: OSRM route geometry
+        geometry_format: "objects" ([{latitude, longitude}], the original format),
+            "polyline" (encoded polyline, precision 5) or "flat" ([lat, lng, lat, lng, ...])
+        zoom: Simplify for this map zoom level (None keeps every vertex)
+
+    Returns:
+        dict: route, route_format and point counts before/after simplification
+    """
+    points = [(lat, lng) for lng, lat in coordinates]
+    original = len(points)
+    if zoom is not None:
+        points = simplify_for_zoom(points, zoom)
+
+    if geometry_format == "polyline":
+        route: Any = encode_polyline(points)
+    elif geometry_format == "flat":
+        route = np.asarray(points, dtype=np.float64).ravel().tolist()
+    else:
+        # OSRM returns [longitude, latitude], convert to [latitude, longitude]
+        route = [{"latitude": lat, "longitude": lng} for lat, lng in points]
+
+    return {
+        "route": route,
+        "route_format": geometry_format,
+        "route_points": len(points),
+        "route_points_original": original,
+    }
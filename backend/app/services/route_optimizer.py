@@ -0,0 +1,220 @@
+import asyncio
+import logging
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.services.geo_math import haversine_matrix
+from app.services.osrm_client import osrm_client
+
+logger = logging.getLogger(__name__)
+
+# Longest segment Or-opt moves as a block
+OR_OPT_MAX_SEGMENT = 3
+# Ignore float noise when comparing move deltas
+EPSILON = 1e-9
+
+def _discard_late_table(task: asyncio.Future) -> None:
+    # The optimizer already used the haversine matrix; just retrieve the outcome
+    if not task.cancelled() and task.exception() is not None:
+        logger.info(f"Late OSRM table call failed: {task.exception()!r}")
+
+async def build_matrix(points: Sequence[Tuple[float, float]], source: str = None) -> Tuple[np.ndarray, str, str]:
+    """
+    Cost matrix for a set of (latitude, longitude) stops.
+
+    Args:
+        points: Stops in request order
+        source: "osrm" for road durations from the OSRM table service, or
+            "haversine" for straight-line distances (defaults to ROUTE_OPTIMIZE_MATRIX)
+
+    Returns:
+        tuple: (matrix, source actually used, unit). Falls back to haversine if
+        the OSRM table call fails or returns unreachable pairs.
+    """
+    source = source or settings.ROUTE_OPTIMIZE_MATRIX
+    if source == "osrm":
+        try:
+            table = asyncio.ensure_future(osrm_client.table([(lng, lat) for lat, lng in points]))
+            # Same latency budget as routes; past it the haversine matrix is good enough.
+            # The call is shielded so it finishes in the background instead of being
+            # cancelled mid-flight (which could strand the circuit breaker's trial call)
+            budget = settings.ROUTE_BUDGET_MS / 1000 if settings.ROUTE_FALLBACK_ENABLED else 0
+            try:
+                data = await (asyncio.wait_for(asyncio.shield(table), budget) if budget > 0 else table)
+            except asyncio.TimeoutError:
+                table.add_done_callback(_discard_late_table)
+                raise
+            durations = data.get("durations")
+            if durations and all(value is not None for row in durations for value in row):
+                return np.asarray(durations, dtype=np.float64), "osrm", "seconds"
+            logger.warning("OSRM table has unreachable pairs; using haversine matrix")
+        except Exception as e:
+            logger.warning(f"OSRM table failed ({e!r}); using haversine matrix")
+    return haversine_matrix(points), "haversine", "km"
+
+def path_cost(path: Sequence[int], matrix: Sequence[Sequence[float]]) -> float:
+    return sum(matrix[a][b] for a, b in zip(path, path[1:]))
+
+def nearest_neighbour(matrix: Sequence[Sequence[float]], start: Optional[int] = None, end: Optional[int] = None) -> List[int]:
+    """
+    Greedy construction: repeatedly visit the closest unvisited stop.
+    Without a fixed start the path begins at stop 0; 2-opt can still reverse
+    the head of an open path, which changes where it starts.
+    """
+    first = start if start is not None else (0 if end != 0 else 1)
+    remaining = set(range(len(matrix))) - {first}
+    if end is not None:
+        remaining.discard(end)
+    path = [first]
+    while remaining:
+        row = matrix[path[-1]]
+        nxt = min(remaining, key=row.__getitem__)
+        path.append(nxt)
+        remaining.remove(nxt)
+    if end is not None and end != first:
+        path.append(end)
+    return path
+
+def _link(matrix, a: Optional[int], b: Optional[int]) -> float:
+    # An open path end (None) costs nothing to connect to
+    return 0.0 if a is None or b is None else matrix[a][b]
+
+def two_opt(path: List[int], matrix, lo: int, hi: int, deadline: float) -> int:
+    """
+    Reverse path[i..j] whenever that shortens the path. Positions outside
+    lo..hi (fixed start/end) never move. Assumes a symmetric matrix.
+
+    Returns:
+        int: Number of improving moves applied
+    """
+    n = len(path)
+    moves = 0
+    improved = True
+    while improved and time.perf_counter() < deadline:
+        improved = False
+        for i in range(lo, hi):
+            a = path[i - 1] if i > 0 else None
+            for j in range(i + 1, hi + 1):
+                b, c = path[i], path[j]
+                e = path[j + 1] if j + 1 < n else None
+                delta = _link(matrix, a, c) + _link(matrix, b, e) - _link(matrix, a, b) - _link(matrix, c, e)
+                if delta < -EPSILON:
+                    path[i:j + 1] = path[i:j + 1][::-1]
+                    moves += 1
+                    improved = True
+                    break
+            if time.perf_counter() >= deadline:
+                break
+    return moves
+
+def or_opt(path: List[int], matrix, lo: int, hi: int, deadline: float) -> int:
+    """
+    Move runs of 1..OR_OPT_MAX_SEGMENT consecutive stops (optionally reversed)
+    to the cheapest other position in the path.
+
+    Returns:
+        int: Number of improving moves applied
+    """
+    moves = 0
+    improved = True
+    while improved and time.perf_counter() < deadline:
+        improved = False
+        for length in range(1, OR_OPT_MAX_SEGMENT + 1):
+            i = lo
+            while i + length - 1 <= hi and time.perf_counter() < deadline:
+                n = len(path)
+                segment = path[i:i + length]
+                prev = path[i - 1] if i > 0 else None
+                nxt = path[i + length] if i + length < n else None
+                removal_gain = _link(matrix, prev, segment[0]) + _link(matrix, segment[-1], nxt) - _link(matrix, prev, nxt)
+
+                rest = path[:i] + path[i + length:]
+                # Insert between rest[k - 1] and rest[k]; never before a fixed start or after a fixed end
+                first_slot = lo
+                last_slot = hi - length + 1
+                best = (-EPSILON, None, None)
+                for k in range(first_slot, last_slot + 1):
+                    if k == i:
+                        continue
+                    left = rest[k - 1] if k > 0 else None
+                    right = rest[k] if k < len(rest) else None
+                    base = _link(matrix, left, right)
+                    forward = _link(matrix, left, segment[0]) + _link(matrix, segment[-1], right) - base
+                    backward = _link(matrix, left, segment[-1]) + _link(matrix, segment[0], right) - base
+                    for cost, reverse in ((forward, False), (backward, True)):
+                        delta = cost - removal_gain
+                        if delta < best[0]:
+                            best = (delta, k, reverse)
+
+                if best[1] is not None:
+                    k, reverse = best[1], best[2]
+                    path[:] = rest[:k] + (segment[::-1] if reverse else segment) + rest[k:]
+                    moves += 1
+                    improved = True
+                i += 1
+    return moves
+
+def optimize_order(
+    matrix: np.ndarray,
+    fix_start: bool = True,
+    fix_end: bool = False,
+    budget_ms: float = None
+) -> Dict[str, Any]:
+    """
+    Heuristic open-path TSP over a cost matrix.
+
+    Nearest-neighbour construction followed by alternating 2-opt and Or-opt
+    passes until neither improves or the time budget runs out. Asymmetric
+    matrices (OSRM durations) are searched on their symmetrized average; the
+    reported costs always use the original matrix, and the request order is
+    kept if the heuristic cannot beat it.
+
+    Args:
+        matrix: n x n cost matrix in request order
+        fix_start: Keep stop 0 first (e.g. the agent's current position)
+        fix_end: Keep stop n-1 last
+        budget_ms: Improvement time budget (defaults to ROUTE_OPTIMIZE_BUDGET_MS)
+
+    Returns:
+        dict: order (indexes into the request), cost_before, cost_after, gain,
+        gain_pct, moves and elapsed_ms
+    """
+    started = time.perf_counter()
+    budget_ms = budget_ms if budget_ms is not None else settings.ROUTE_OPTIMIZE_BUDGET_MS
+    deadline = started + budget_ms / 1000
+    n = len(matrix)
+    original = matrix.tolist()
+    identity = list(range(n))
+    cost_before = path_cost(identity, original)
+
+    if n <= 2 or (n == 3 and fix_start and fix_end):
+        order, moves = identity, 0
+    else:
+        search = ((matrix + matrix.T) / 2).tolist()
+        start = 0 if fix_start else None
+        end = n - 1 if fix_end else None
+        order = nearest_neighbour(search, start, end)
+        lo = 1 if fix_start else 0
+        hi = n - 2 if fix_end else n - 1
+        moves = 0
+        while time.perf_counter() < deadline:
+            applied = two_opt(order, search, lo, hi, deadline) + or_opt(order, search, lo, hi, deadline)
+            moves += applied
+            if not applied:
+                break
+        if path_cost(order, original) >= cost_before:
+            order = identity
+
+    cost_after = path_cost(order, original)
+    return {
+        "order": order,
+        "cost_before": cost_before,
+        "cost_after": cost_after,
+        "gain": cost_before - cost_after,
+        "gain_pct": round((cost_before - cost_after) / cost_before * 100, 2) if cost_before else 0.0,
+        "moves": moves,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 2),
+    }
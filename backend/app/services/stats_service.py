@@ -0,0 +1,107 @@
+import asyncio
+import logging
+from datetime import datetime
+from typing import Any, Dict
+
+from app.models.user import UserRole
+
+logger = logging.getLogger(__name__)
+
+# Single document in `admin_stats` holding the dashboard counters
+STATS_DOC_ID = "dashboard"
+
+COUNTER_FIELDS = ("total_products", "total_orders", "total_customers", "total_agents", "total_revenue")
+
+ROLE_COUNTERS = {
+    UserRole.CUSTOMER: "total_customers",
+    UserRole.DELIVERY_AGENT: "total_agents",
+}
+
+async def increment_stats(db, **deltas: float) -> None:
+    """
+    Atomically apply counter deltas to the dashboard document.
+
+    Failures are logged rather than raised so a counter never fails the write
+    that triggered it. Writes racing with a reconcile run can be lost or double
+    counted; the periodic reconcile job corrects any such drift.
+    """
+    inc = {field: delta for field, delta in deltas.items() if delta}
+    if not inc:
+        return
+    try:
+        await db.admin_stats.update_one(
+            {"_id": STATS_DOC_ID},
+            {"$inc": inc, "$set": {"updated_at": datetime.utcnow()}},
+            upsert=True
+        )
+    except Exception as e:
+        logger.error(f"Error updating admin stats counters {inc}: {e}")
+
+async def record_user_created(db, role: str) -> None:
+    field = ROLE_COUNTERS.get(role)
+    if field:
+        await increment_stats(db, **{field: 1})
+
+async def record_product_created(db) -> None:
+    await increment_stats(db, total_products=1)
+
+async def record_product_deleted(db) -> None:
+    await increment_stats(db, total_products=-1)
+
+async def record_order_created(db, order: Dict[str, Any]) -> None:
+    await increment_stats(db, total_orders=1)
+
+async def record_order_status_changed(db, order: Dict[str, Any], old_status: str, new_status: str) -> None:
+    """Revenue counts delivered orders only, so move the amount in or out on transitions"""
+    if old_status == new_status:
+        return
+    amount = order.get('total_amount', 0) or 0
+    if new_status == "delivered":
+        await increment_stats(db, total_revenue=amount)
+    elif old_status == "delivered":
+        await increment_stats(db, total_revenue=-amount)
+
+async def reconcile_stats(db) -> Dict[str, Any]:
+    """
+    Recompute every counter from the source collections and overwrite the stored values.
+    All queries run concurrently; revenue is summed server-side.
+
+    Returns:
+        dict: The reconciled counters
+    """
+    revenue_pipeline = [
+        {"$match": {"status": "delivered"}},
+        {"$group": {"_id": None, "total": {"$sum": "$total_amount"}}}
+    ]
+    total_products, total_orders, total_customers, total_agents, revenue = await asyncio.gather(
+        db.products.count_documents({}),
+        db.orders.count_documents({}),
+        db.users.count_documents({"role": UserRole.CUSTOMER}),
+        db.users.count_documents({"role": UserRole.DELIVERY_AGENT}),
+        db.orders.aggregate(revenue_pipeline).to_list(1)
+    )
+
+    now = datetime.utcnow()
+    stats = {
+        "total_products": total_products,
+        "total_orders": total_orders,
+        "total_customers": total_customers,
+        "total_agents": total_agents,
+        "total_revenue": revenue[0]["total"] if revenue else 0,
+    }
+    await db.admin_stats.update_one(
+        {"_id": STATS_DOC_ID},
+        {"$set": {**stats, "updated_at": now, "reconciled_at": now}},
+        upsert=True
+    )
+    logger.info(f"Admin stats reconciled: {stats}")
+    return stats
+
+async def get_stats(db) -> Dict[str, Any]:
+    """
+    Read the dashboard counters, reconciling first if they have never been computed.
+    """
+    doc = await db.admin_stats.find_one({"_id": STATS_DOC_ID})
+    if not doc or "reconciled_at" not in doc:
+        return await reconcile_stats(db)
+    return {field: doc.get(field, 0) for field in COUNTER_FIELDS}
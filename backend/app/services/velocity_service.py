@@ -0,0 +1,179 @@
+import logging
+import math
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from pymongo import UpdateOne
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Per-product sales velocity kept on the product document under `sales`:
+#   units_total / revenue_total   lifetime sums, $inc on every order
+#   score_units / score_revenue   exponentially decayed sums as of `score_epoch` (see below)
+#   units_window / revenue_window sums over the last SALES_VELOCITY_WINDOW_DAYS,
+#                                 refreshed from `product_sales_daily`
+#
+# Decayed scores are stored as their value at the product's `score_epoch`. A sale
+# decays the stored score forward to max(score_epoch, sold_at) and adds
+# qty * exp(-lambda * (epoch - sold_at)), server-side in one update, so every
+# exponent is <= 0 and nothing overflows however long the app runs. The velocity
+# refresh rebases every product to the same epoch, which keeps the stored values
+# comparable for the sort index; products sold since the last rebase sit slightly
+# ahead of it (understated by at most one refresh interval of decay). Because the
+# epoch is recent, changing the half-life only affects decay from then on.
+# The value at `now` is score * exp(-lambda * (now - score_epoch)).
+LEGACY_VELOCITY_EPOCH = datetime(2025, 1, 1)  # scale of scores written before score_epoch existed
+
+def _decay_rate() -> float:
+    return math.log(2) / (settings.SALES_VELOCITY_HALF_LIFE_DAYS * 86400)
+
+def _decay(since: Any, until: Any) -> Dict[str, Any]:
+    """Aggregation expression: exp(-lambda * (until - since)), both dates"""
+    return {"$exp": {"$multiply": [-_decay_rate() / 1000, {"$subtract": [until, since]}]}}
+
+def current_score(stored_score: float, epoch: Optional[datetime], now: datetime = None) -> float:
+    """Decay a stored score from its epoch to `now`"""
+    if not stored_score or epoch is None:
+        return 0.0
+    now = now or datetime.utcnow()
+    return stored_score * math.exp(-_decay_rate() * (now - epoch).total_seconds())
+
+def _score_update(quantity: int, revenue: float, sold_at: datetime) -> List[Dict[str, Any]]:
+    """Update pipeline folding one sale into a product's sales sub-document"""
+    epoch = {"$ifNull": ["$sales.score_epoch", sold_at]}
+    new_epoch = {"$max": [epoch, sold_at]}
+    carried = _decay(epoch, new_epoch)
+    weight = _decay(sold_at, new_epoch)
+    return [
+        {"$set": {
+            "sales.units_total": {"$add": [{"$ifNull": ["$sales.units_total", 0]}, quantity]},
+            "sales.revenue_total": {"$add": [{"$ifNull": ["$sales.revenue_total", 0]}, revenue]},
+            "sales.score_units": {"$add": [
+                {"$multiply": [{"$ifNull": ["$sales.score_units", 0]}, carried]}, {"$multiply": [quantity, weight]}
+            ]},
+            "sales.score_revenue": {"$add": [
+                {"$multiply": [{"$ifNull": ["$sales.score_revenue", 0]}, carried]}, {"$multiply": [revenue, weight]}
+            ]},
+            "sales.last_sold_at": {"$max": ["$sales.last_sold_at", sold_at]},
+        }},
+        # Separate stage: the one above must still see the old epoch
+        {"$set": {"sales.score_epoch": new_epoch}},
+    ]
+
+async def record_order_sales(db, order: Dict[str, Any]) -> None:
+    """Fold an order's items into product velocity and the daily sales buckets"""
+    sold_at = order.get('created_at') or datetime.utcnow()
+    day = sold_at.replace(hour=0, minute=0, second=0, microsecond=0)
+
+    product_updates: List[UpdateOne] = []
+    daily_updates: List[UpdateOne] = []
+    for item in order.get('items', []):
+        quantity = item.get('quantity', 0)
+        revenue = item.get('price', 0) * quantity
+        if quantity <= 0:
+            continue
+        product_updates.append(UpdateOne({"id": item['product_id']}, _score_update(quantity, revenue, sold_at)))
+        daily_updates.append(UpdateOne(
+            {"_id": f"{item['product_id']}:{day.date().isoformat()}"},
+            {
+                "$inc": {"units": quantity, "revenue": revenue},
+                "$setOnInsert": {"product_id": item['product_id'], "day": day}
+            },
+            upsert=True
+        ))
+
+    if product_updates:
+        await db.products.bulk_write(product_updates, ordered=False)
+        await db.product_sales_daily.bulk_write(daily_updates, ordered=False)
+
+async def rebase_velocity_scores(db, now: datetime = None) -> int:
+    """
+    Decay every product's scores to `now` and make it their epoch. Each product is
+    one atomic update, so sales recorded meanwhile are folded in correctly either way.
+
+    Returns:
+        int: Products rebased
+    """
+    now = now or datetime.utcnow()
+    result = await db.products.update_many(
+        {"sales.score_epoch": {"$lt": now}},
+        [{"$set": {
+            "sales.score_units": {"$multiply": ["$sales.score_units", _decay("$sales.score_epoch", now)]},
+            "sales.score_revenue": {"$multiply": ["$sales.score_revenue", _decay("$sales.score_epoch", now)]},
+            "sales.score_epoch": now,
+        }}]
+    )
+    return result.modified_count
+
+async def migrate_legacy_velocity_scores(db) -> Dict[str, Any]:
+    """Convert scores stored on the fixed 2025-01-01 scale to the per-product epoch"""
+    now = datetime.utcnow()
+    result = await db.products.update_many(
+        {"sales.score_units": {"$exists": True}, "sales.score_epoch": {"$exists": False}},
+        [{"$set": {
+            # value at now = stored / exp(lambda * (now - legacy epoch))
+            "sales.score_units": {"$multiply": ["$sales.score_units", _decay(LEGACY_VELOCITY_EPOCH, now)]},
+            "sales.score_revenue": {"$multiply": [{"$ifNull": ["$sales.score_revenue", 0]}, _decay(LEGACY_VELOCITY_EPOCH, now)]},
+            "sales.score_epoch": now,
+        }}]
+    )
+    return {"converted": result.modified_count}
+
+async def refresh_windowed_sales(db) -> Dict[str, Any]:
+    """
+    Recompute units/revenue over the trailing window from the daily buckets,
+    prune buckets that have aged out of it and rebase the decayed scores.
+    """
+    window_days = settings.SALES_VELOCITY_WINDOW_DAYS
+    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    window_start = today - timedelta(days=window_days - 1)
+
+    pipeline = [
+        {"$match": {"day": {"$gte": window_start}}},
+        {"$group": {"_id": "$product_id", "units": {"$sum": "$units"}, "revenue": {"$sum": "$revenue"}}}
+    ]
+    totals = await db.product_sales_daily.aggregate(pipeline).to_list(None)
+
+    now = datetime.utcnow()
+    updates = [
+        UpdateOne(
+            {"id": row['_id']},
+            {"$set": {
+                "sales.units_window": row['units'],
+                "sales.revenue_window": row['revenue'],
+                "sales.window_days": window_days,
+                "sales.refreshed_at": now
+            }}
+        )
+        for row in totals
+    ]
+    if updates:
+        await db.products.bulk_write(updates, ordered=False)
+
+    # Products that sold before but not within the window
+    active_ids = [row['_id'] for row in totals]
+    await db.products.update_many(
+        {"sales.units_window": {"$gt": 0}, "id": {"$nin": active_ids}},
+        {"$set": {"sales.units_window": 0, "sales.revenue_window": 0, "sales.refreshed_at": now}}
+    )
+    await db.product_sales_daily.delete_many({"day": {"$lt": window_start}})
+    rebased = await rebase_velocity_scores(db, now)
+
+    logger.info(f"Product velocity refreshed: products_with_sales={len(totals)}, window_days={window_days}, rebased={rebased}")
+    return {"products_with_sales": len(totals), "window_days": window_days, "scores_rebased": rebased}
+
+def velocity_summary(product: Dict[str, Any], now: datetime = None) -> Dict[str, Any]:
+    """Public view of a product's `sales` sub-document"""
+    sales = product.get('sales') or {}
+    return {
+        "units_total": sales.get('units_total', 0),
+        "revenue_total": sales.get('revenue_total', 0),
+        "units_window": sales.get('units_window', 0),
+        "revenue_window": sales.get('revenue_window', 0),
+        "window_days": sales.get('window_days', settings.SALES_VELOCITY_WINDOW_DAYS),
+        "decayed_units": round(current_score(sales.get('score_units', 0), sales.get('score_epoch'), now), 3),
+        "decayed_revenue": round(current_score(sales.get('score_revenue', 0), sales.get('score_epoch'), now), 2),
+        "last_sold_at": sales.get('last_sold_at'),
+    }
@@ -0,0 +1,291 @@
+import logging
+import math
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError
+
+from app.core.config import settings
+from app.models.wave import DeliveryWave, WaveStop
+from app.services import order_events
+from app.services.agent_index import claim_order
+from app.services.geo_math import haversine_matrix, path_distances
+from app.services.route_optimizer import optimize_order
+
+logger = logging.getLogger(__name__)
+
+METERS_PER_DEGREE = 111_320.0
+# Fields a rebuild refreshes on an open wave; the rest are set when it is first stored
+WAVE_REBUILT_FIELDS = ("zone_id", "order_ids", "stops", "distance_km", "held_since")
+# Time budget for sequencing the stops of one wave
+SEQUENCE_BUDGET_MS = 20
+
+def cluster_orders(
+    orders: List[Dict[str, Any]],
+    radius_m: float = None,
+    window_minutes: float = None,
+    max_orders: int = None,
+    min_orders: int = None,
+) -> List[List[Dict[str, Any]]]:
+    """
+    Grid-accelerated DBSCAN over delivery locations and creation times.
+
+    Two orders are neighbours if their drops are within `radius_m` and they
+    were created within `window_minutes` of each other. Points are bucketed
+    into radius-sized grid cells on a local equirectangular projection, so a
+    neighbour search only scans the 3x3 surrounding cells. Clusters grow from
+    the oldest core point outward and stop at `max_orders`; the whole cluster
+    must also fit inside the time window. Orders left alone are not returned.
+
+    Args:
+        orders: Order documents with delivery_location and created_at
+        radius_m: Neighbourhood radius in metres (defaults to WAVE_RADIUS_M)
+        window_minutes: Time window (defaults to WAVE_WINDOW_MINUTES)
+        max_orders: Cap on orders per cluster (defaults to WAVE_MAX_ORDERS)
+        min_orders: Neighbours (including itself) that make a core point (defaults to WAVE_MIN_ORDERS)
+
+    Returns:
+        list: Clusters of orders, oldest cluster first
+    """
+    radius_m = radius_m or settings.WAVE_RADIUS_M
+    window = (window_minutes or settings.WAVE_WINDOW_MINUTES) * 60
+    max_orders = max_orders or settings.WAVE_MAX_ORDERS
+    min_orders = min_orders or settings.WAVE_MIN_ORDERS
+    if len(orders) < min_orders:
+        return []
+
+    orders = sorted(orders, key=lambda o: o['created_at'])
+    mean_lat = sum(o['delivery_location']['latitude'] for o in orders) / len(orders)
+    x_scale = METERS_PER_DEGREE * math.cos(math.radians(mean_lat))
+    xs = [o['delivery_location']['longitude'] * x_scale for o in orders]
+    ys = [o['delivery_location']['latitude'] * METERS_PER_DEGREE for o in orders]
+    ts = [o['created_at'].timestamp() for o in orders]
+
+    grid: Dict[Tuple[int, int], List[int]] = {}
+    cells = []
+    for i in range(len(orders)):
+        cell = (math.floor(xs[i] / radius_m), math.floor(ys[i] / radius_m))
+        cells.append(cell)
+        grid.setdefault(cell, []).append(i)
+
+    radius_sq = radius_m * radius_m
+    neighbour_cache: Dict[int, List[int]] = {}
+
+    def neighbours(i: int) -> List[int]:
+        found = neighbour_cache.get(i)
+        if found is None:
+            cx, cy = cells[i]
+            found = [
+                j
+                for dx in (-1, 0, 1) for dy in (-1, 0, 1)
+                for j in grid.get((cx + dx, cy + dy), ())
+                if (xs[j] - xs[i]) ** 2 + (ys[j] - ys[i]) ** 2 <= radius_sq and abs(ts[j] - ts[i]) <= window
+            ]
+            neighbour_cache[i] = found
+        return found
+
+    labels = [-1] * len(orders)
+    clusters: List[List[int]] = []
+    for seed in range(len(orders)):
+        if labels[seed] != -1 or len(neighbours(seed)) < min_orders:
+            continue
+        cluster_id = len(clusters)
+        members = [seed]
+        labels[seed] = cluster_id
+        t_min = t_max = ts[seed]
+        frontier = deque([seed])
+        while frontier and len(members) < max_orders:
+            point = frontier.popleft()
+            for j in neighbours(point):
+                if len(members) >= max_orders:
+                    break
+                if labels[j] != -1 or max(t_max, ts[j]) - min(t_min, ts[j]) > window:
+                    continue
+                labels[j] = cluster_id
+                members.append(j)
+                t_min, t_max = min(t_min, ts[j]), max(t_max, ts[j])
+                if len(neighbours(j)) >= min_orders:
+                    frontier.append(j)
+        if len(members) >= min_orders:
+            clusters.append(members)
+        else:
+            # Its neighbours were claimed by earlier clusters; release the points
+            for i in members:
+                labels[i] = -1
+
+    return [[orders[i] for i in members] for members in clusters]
+
+def sequence_stops(orders: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], float]:
+    """
+    Order a wave's drops into a short open path.
+
+    Returns:
+        tuple: (orders in visiting order, straight-line path length in km)
+    """
+    points = [(o['delivery_location']['latitude'], o['delivery_location']['longitude']) for o in orders]
+    result = optimize_order(haversine_matrix(points), fix_start=False, budget_ms=SEQUENCE_BUDGET_MS)
+    ordered = [orders[i] for i in result["order"]]
+    return ordered, float(result["cost_after"])
+
+def make_wave(zone_id: str, orders: List[Dict[str, Any]]) -> DeliveryWave:
+    ordered, distance_km = sequence_stops(orders)
+    return DeliveryWave(
+        # Derived from the orders so a wave survives rebuilds under the same id
+        id=str(uuid.uuid5(uuid.NAMESPACE_URL, "wave:" + ",".join(sorted(o['id'] for o in orders)))),
+        zone_id=zone_id,
+        order_ids=[o['id'] for o in ordered],
+        stops=[WaveStop(
+            order_id=o['id'],
+            latitude=o['delivery_location']['latitude'],
+            longitude=o['delivery_location']['longitude']
+        ) for o in ordered],
+        distance_km=round(distance_km, 3),
+        held_since=min(o['created_at'] for o in orders)
+    )
+
+async def held_order_ids(db, now: datetime = None) -> set:
+    """
+    Orders in open waves whose oldest order is younger than WAVE_HOLD_MINUTES.
+    Dispatch leaves them to the waves; once the oldest order of a wave has
+    waited that long without an agent accepting it, its orders go back to
+    single-order dispatch.
+
+    The hold runs from the orders rather than the wave: a wave's id changes
+    whenever its membership does, so its created_at would restart the hold
+    on every change and could keep orders back indefinitely.
+    """
+    now = now or datetime.utcnow()
+    held = set()
+    async for wave in db.delivery_waves.find(
+        {"status": "open", "held_since": {"$gte": now - timedelta(minutes=settings.WAVE_HOLD_MINUTES)}},
+        {"_id": 0, "order_ids": 1}
+    ):
+        held.update(wave['order_ids'])
+    return held
+
+async def build_waves(db) -> Dict[str, Any]:
+    """
+    Rebuild the open waves from confirmed, unassigned orders, zone by zone.
+
+    Each wave is upserted under its id (derived from its orders) only while it
+    is still open, so a wave keeps its creation time across rebuilds and one
+    accepted in the meantime is left alone; open waves that no longer come out
+    of the clustering are then removed.
+    """
+    started = time.perf_counter()
+    orders = await db.orders.find(
+        {"status": "confirmed", "delivery_agent_id": None, "zone_id": {"$ne": None}, "delivery_location": {"$ne": None}},
+        {"_id": 0, "id": 1, "zone_id": 1, "delivery_location": 1, "created_at": 1}
+    ).sort("created_at", 1).to_list(settings.DISPATCH_MAX_ORDERS)
+
+    by_zone: Dict[str, List[Dict[str, Any]]] = {}
+    for order in orders:
+        by_zone.setdefault(order['zone_id'], []).append(order)
+
+    waves = [
+        make_wave(zone_id, cluster)
+        for zone_id, zone_orders in by_zone.items()
+        for cluster in cluster_orders(zone_orders)
+    ]
+    clustering_ms = (time.perf_counter() - started) * 1000
+
+    taken = 0
+    if waves:
+        operations = []
+        for wave in waves:
+            document = wave.dict()
+            operations.append(UpdateOne(
+                {"id": wave.id, "status": "open"},
+                {
+                    "$set": {key: document[key] for key in WAVE_REBUILT_FIELDS},
+                    "$setOnInsert": {key: value for key, value in document.items() if key not in WAVE_REBUILT_FIELDS},
+                },
+                upsert=True
+            ))
+        try:
+            await db.delivery_waves.bulk_write(operations, ordered=False)
+        except BulkWriteError as e:
+            # A duplicate id means the wave was accepted since the orders were read
+            errors = e.details.get("writeErrors", [])
+            if any(error.get("code") != 11000 for error in errors):
+                raise
+            taken = len(errors)
+    await db.delivery_waves.delete_many({"status": "open", "id": {"$nin": [wave.id for wave in waves]}})
+
+    summary = {
+        "orders_waiting": len(orders),
+        "waves": len(waves) - taken,
+        "waves_taken": taken,
+        "orders_in_waves": sum(len(wave.order_ids) for wave in waves),
+        "clustering_ms": round(clustering_ms, 2),
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 2),
+    }
+    if waves:
+        logger.info(f"Waves rebuilt: {summary}")
+    return summary
+
+async def accept_wave(db, wave_id: str, agent_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Claim an open wave and assign its orders to the agent.
+
+    The wave is claimed with one conditional write; each order is then claimed
+    the same way, within the agent's capacity. Orders someone else took in the
+    meantime, and those past the agent's capacity, are dropped from the wave.
+    The stop sequence of the remaining orders is kept.
+
+    Returns:
+        dict: The accepted wave, or None if it is no longer open
+    """
+    now = datetime.utcnow()
+    wave = await db.delivery_waves.find_one_and_update(
+        {"id": wave_id, "status": "open"},
+        {"$set": {"status": "accepted", "agent_id": agent_id, "accepted_at": now}},
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER
+    )
+    if not wave:
+        return None
+
+    # A wave is carried as a unit, so it may fill an agent up to a full wave
+    capacity = max(settings.DISPATCH_AGENT_CAPACITY, settings.WAVE_MAX_ORDERS)
+    accepted, skipped = [], []
+    full = False
+    for order_id in wave['order_ids']:
+        if full:
+            skipped.append(order_id)
+            continue
+        changes = {"delivery_agent_id": agent_id, "status": "preparing", "wave_id": wave_id, "accepted_at": now, "updated_at": now}
+        order, full = await claim_order(
+            db, agent_id, {"id": order_id, "status": "confirmed", "delivery_agent_id": None}, changes, capacity=capacity
+        )
+        if order is None:
+            skipped.append(order_id)
+            continue
+        accepted.append(order_id)
+        await order_events.order_status_changed(db, order, "confirmed", "preparing")
+
+    if skipped:
+        stops = [stop for stop in wave['stops'] if stop['order_id'] in accepted]
+        points = [(stop['latitude'], stop['longitude']) for stop in stops]
+        wave.update({
+            "order_ids": accepted,
+            "stops": stops,
+            "skipped_order_ids": skipped,
+            "distance_km": round(float(path_distances(points).sum()), 3) if len(points) > 1 else 0.0,
+            "status": "accepted" if accepted else "expired",
+        })
+        await db.delivery_waves.update_one(
+            {"id": wave_id},
+            {"$set": {key: wave[key] for key in ("order_ids", "stops", "skipped_order_ids", "distance_km", "status")}}
+        )
+    return wave
+
+async def list_open_waves(db, zone_ids: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    query: Dict[str, Any] = {"status": "open"}
+    if zone_ids is not None:
+        query["zone_id"] = {"$in": zone_ids}
+    return await db.delivery_waves.find(query, {"_id": 0}).sort("created_at", 1).to_list(1000)
@@ -0,0 +1,148 @@
+import logging
+import math
+import sys
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+Cell = Tuple[int, int]
+
+def _segment_cells(x1: float, y1: float, x2: float, y2: float, size: float) -> Iterator[Cell]:
+    """Every grid cell a segment passes through (column-wise supercover)"""
+    lo_x, hi_x = min(x1, x2), max(x1, x2)
+    for cx in range(math.floor(lo_x / size), math.floor(hi_x / size) + 1):
+        if x1 == x2:
+            ya, yb = y1, y2
+        else:
+            xa = max(lo_x, cx * size)
+            xb = min(hi_x, (cx + 1) * size)
+            slope = (y2 - y1) / (x2 - x1)
+            ya = y1 + (xa - x1) * slope
+            yb = y1 + (xb - x1) * slope
+        for cy in range(math.floor(min(ya, yb) / size), math.floor(max(ya, yb) / size) + 1):
+            yield cx, cy
+
+class CellTable:
+    """
+    Precomputed lookup table over a fixed lng/lat grid.
+
+    Each cell touched by a zone maps either to the zone itself (the cell lies
+    fully inside it) or to a tuple of candidate zones (a zone boundary crosses
+    the cell) that still need an exact polygon test. Cells absent from the
+    table are outside every zone. Most lookups are therefore a single dict probe.
+    """
+
+    def __init__(self, cell_size_deg: float):
+        self.cell_size = cell_size_deg
+        self.cells: Dict[Cell, Any] = {}
+        self.inside_cells = 0
+        self.boundary_cells = 0
+        self.build_time_ms = 0.0
+        self.reset_counters()
+
+    def reset_counters(self) -> None:
+        self.lookups = 0
+        self.inside_hits = 0
+        self.outside_hits = 0
+        self.boundary_lookups = 0
+
+    @classmethod
+    def build(cls, zones: List[Any], cell_size_deg: float, max_cells: int) -> Optional["CellTable"]:
+        """
+        Classify every cell in each zone's bounding box.
+
+        Returns:
+            CellTable, or None if the zones would need more than `max_cells` cells
+        """
+        started = time.perf_counter()
+        table = cls(cell_size_deg)
+        size = cell_size_deg
+
+        total = 0
+        for entry in zones:
+            min_x, min_y, max_x, max_y = entry.bbox
+            total += (math.floor(max_x / size) - math.floor(min_x / size) + 1) * (math.floor(max_y / size) - math.floor(min_y / size) + 1)
+        if total > max_cells:
+            logger.warning(f"Zone cell table disabled: {total} cells exceeds limit of {max_cells}")
+            return None
+
+        # Ordered (zone, is_inside) per cell, preserving zone order for overlaps
+        classified: Dict[Cell, List[Tuple[Any, bool]]] = {}
+        for entry in zones:
+            boundary = set()
+            for x1, y1, x2, y2 in entry.segments():
+                boundary.update(_segment_cells(x1, y1, x2, y2, size))
+
+            min_cx, min_cy = math.floor(entry.bbox[0] / size), math.floor(entry.bbox[1] / size)
+            max_cx, max_cy = math.floor(entry.bbox[2] / size), math.floor(entry.bbox[3] / size)
+            cxs, cys = np.meshgrid(np.arange(min_cx, max_cx + 1), np.arange(min_cy, max_cy + 1))
+            cxs, cys = cxs.ravel(), cys.ravel()
+            # A cell no edge passes through is entirely inside or outside: its centre decides
+            inside = entry.contains_many((cxs + 0.5) * size, (cys + 0.5) * size)
+
+            for cx, cy, is_inside in zip(cxs.tolist(), cys.tolist(), inside.tolist()):
+                cell = (cx, cy)
+                if cell in boundary:
+                    classified.setdefault(cell, []).append((entry, False))
+                elif is_inside:
+                    classified.setdefault(cell, []).append((entry, True))
+
+        for cell, entries in classified.items():
+            first, first_inside = entries[0]
+            if first_inside:
+                table.cells[cell] = first
+                table.inside_cells += 1
+                continue
+            # Candidates up to and including the first zone that fully covers the cell
+            candidates = []
+            for entry, is_inside in entries:
+                candidates.append(entry)
+                if is_inside:
+                    break
+            table.cells[cell] = tuple(candidates)
+            table.boundary_cells += 1
+
+        table.build_time_ms = (time.perf_counter() - started) * 1000
+        return table
+
+    def locate(self, x: float, y: float) -> Optional[Dict[str, Any]]:
+        self.lookups += 1
+        value = self.cells.get((math.floor(x / self.cell_size), math.floor(y / self.cell_size)))
+        if value is None:
+            self.outside_hits += 1
+            return None
+        if not isinstance(value, tuple):
+            self.inside_hits += 1
+            return value.zone
+        self.boundary_lookups += 1
+        for entry in value:
+            if entry.contains(x, y):
+                return entry.zone
+        return None
+
+    def memory_bytes(self) -> int:
+        """Approximate footprint of the table (dict, keys and candidate tuples; zones are shared)"""
+        total = sys.getsizeof(self.cells)
+        for cell, value in self.cells.items():
+            total += sys.getsizeof(cell) + 2 * sys.getsizeof(cell[0])
+            if isinstance(value, tuple):
+                total += sys.getsizeof(value)
+        return total
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.lookups or 1
+        return {
+            "cell_size_deg": self.cell_size,
+            "cells": len(self.cells),
+            "inside_cells": self.inside_cells,
+            "boundary_cells": self.boundary_cells,
+            "memory_bytes": self.memory_bytes(),
+            "build_time_ms": round(self.build_time_ms, 2),
+            "lookups": self.lookups,
+            "inside_hit_rate": round(self.inside_hits / lookups, 4),
+            "outside_hit_rate": round(self.outside_hits / lookups, 4),
+            "boundary_rate": round(self.boundary_lookups / lookups, 4),
+        }
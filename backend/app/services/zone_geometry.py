@@ -0,0 +1,321 @@
+import math
+import random
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.services.zone_index import CompiledZone, compile_ring, zone_rings
+
+# Metres per degree of latitude (and of longitude at the equator)
+METERS_PER_DEGREE = 111_320.0
+
+Point = Tuple[float, float]
+
+def extract_zone_features(data: Dict[str, Any]) -> List[Tuple[Optional[str], Dict[str, Any]]]:
+    """
+    Pull (name, geometry) pairs out of a FeatureCollection, a Feature or a bare geometry.
+
+    Raises:
+        ValueError: If the payload contains no Polygon or MultiPolygon
+    """
+    kind = data.get('type')
+    if kind == 'FeatureCollection':
+        features = data.get('features') or []
+    elif kind == 'Feature':
+        features = [data]
+    elif kind in ('Polygon', 'MultiPolygon'):
+        features = [{'geometry': data, 'properties': {}}]
+    else:
+        raise ValueError("Expected a GeoJSON FeatureCollection, Feature, Polygon or MultiPolygon")
+
+    result = []
+    for i, feature in enumerate(features):
+        geometry = feature.get('geometry') or {}
+        if geometry.get('type') not in ('Polygon', 'MultiPolygon'):
+            raise ValueError(f"Feature {i}: geometry must be a Polygon or MultiPolygon, got {geometry.get('type')}")
+        result.append(((feature.get('properties') or {}).get('name'), geometry))
+    if not result:
+        raise ValueError("FeatureCollection must contain at least one feature")
+    return result
+
+def merge_geometries(geometries: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Combine several Polygon/MultiPolygon geometries into one (Multi)Polygon"""
+    polygons = []
+    for geometry in geometries:
+        if geometry['type'] == 'Polygon':
+            polygons.append(geometry['coordinates'])
+        else:
+            polygons.extend(geometry['coordinates'])
+    if len(polygons) == 1:
+        return {'type': 'Polygon', 'coordinates': polygons[0]}
+    return {'type': 'MultiPolygon', 'coordinates': polygons}
+
+def _signed_area(ring: List[Point]) -> float:
+    """Shoelace area of a closed ring; positive when counter-clockwise"""
+    return sum(x1 * y2 - x2 * y1 for (x1, y1), (x2, y2) in zip(ring, ring[1:])) / 2
+
+def _orientation(a: Point, b: Point, c: Point) -> float:
+    return (b[0] - a[0]) * (c[1] - a[1]) - (b[1] - a[1]) * (c[0] - a[0])
+
+def _on_segment(a: Point, b: Point, p: Point) -> bool:
+    return min(a[0], b[0]) <= p[0] <= max(a[0], b[0]) and min(a[1], b[1]) <= p[1] <= max(a[1], b[1])
+
+def _segments_intersect(a: Point, b: Point, c: Point, d: Point) -> bool:
+    o1, o2 = _orientation(a, b, c), _orientation(a, b, d)
+    o3, o4 = _orientation(c, d, a), _orientation(c, d, b)
+    if ((o1 > 0) != (o2 > 0)) and o1 != 0 and o2 != 0 and ((o3 > 0) != (o4 > 0)) and o3 != 0 and o4 != 0:
+        return True
+    return (
+        (o1 == 0 and _on_segment(a, b, c)) or (o2 == 0 and _on_segment(a, b, d)) or
+        (o3 == 0 and _on_segment(c, d, a)) or (o4 == 0 and _on_segment(c, d, b))
+    )
+
+def find_self_intersection(ring: List[Point]) -> Optional[Tuple[int, int]]:
+    """
+    Return the indexes of two non-adjacent crossing segments of a closed ring, or None.
+    Segments are swept in order of their left end so only x-overlapping pairs are tested.
+    """
+    n = len(ring) - 1
+    segments = sorted(range(n), key=lambda i: min(ring[i][0], ring[i + 1][0]))
+    active: List[int] = []
+    for i in segments:
+        left = min(ring[i][0], ring[i + 1][0])
+        active = [j for j in active if max(ring[j][0], ring[j + 1][0]) >= left]
+        for j in active:
+            if abs(i - j) in (1, n - 1):
+                continue  # neighbours share a vertex
+            if _segments_intersect(ring[i], ring[i + 1], ring[j], ring[j + 1]):
+                return min(i, j), max(i, j)
+        active.append(i)
+    return None
+
+def find_ring_crossing(rings: List[List[Point]]) -> Optional[Tuple[int, int]]:
+    """
+    Return the indexes of two closed rings whose boundaries cross or touch, or None.
+    Same sweep as find_self_intersection over the segments of every ring; pairs
+    within one ring are skipped (find_self_intersection covers those).
+    """
+    segments = [(r, ring[i], ring[i + 1]) for r, ring in enumerate(rings) for i in range(len(ring) - 1)]
+    segments.sort(key=lambda s: min(s[1][0], s[2][0]))
+    active: List[Tuple[int, Point, Point]] = []
+    for segment in segments:
+        r, a, b = segment
+        left = min(a[0], b[0])
+        active = [s for s in active if max(s[1][0], s[2][0]) >= left]
+        for other, c, d in active:
+            if other != r and _segments_intersect(a, b, c, d):
+                return min(r, other), max(r, other)
+        active.append(segment)
+    return None
+
+def _point_in_ring(point: Point, ring: List[Point]) -> bool:
+    """Even-odd test of a point against a closed ring"""
+    x, y = point
+    inside = False
+    for (x1, y1), (x2, y2) in zip(ring, ring[1:]):
+        if (y1 > y) != (y2 > y) and x < x1 + (y - y1) * (x2 - x1) / (y2 - y1):
+            inside = not inside
+    return inside
+
+def validate_polygon_rings(rings: List[List[Point]], label: str) -> None:
+    """
+    Check the rings of one polygon against each other: no two boundaries may
+    cross or touch, every hole must lie inside the exterior and no hole inside
+    another. Each ring must already be valid on its own (see repair_ring).
+
+    Raises:
+        ValueError: Naming the offending rings
+    """
+    crossing = find_ring_crossing(rings)
+    if crossing:
+        raise ValueError(f"{label}: rings {crossing[0]} and {crossing[1]} cross")
+    # Boundaries do not cross, so one vertex tells on which side a whole ring lies
+    exterior, holes = rings[0], rings[1:]
+    for h, hole in enumerate(holes, start=1):
+        if not _point_in_ring(hole[0], exterior):
+            raise ValueError(f"{label}: hole {h} lies outside the exterior ring")
+        for o, other in enumerate(holes, start=1):
+            if o != h and _point_in_ring(hole[0], other):
+                raise ValueError(f"{label}: hole {h} lies inside hole {o}")
+
+def repair_ring(coordinates: List[List[float]], exterior: bool, repairs: List[str], label: str) -> List[Point]:
+    """
+    Validate a ring and fix what can be fixed safely: closure, repeated
+    vertices and winding order (RFC 7946: exteriors CCW, holes CW).
+
+    Raises:
+        ValueError: On out-of-range coordinates, too few vertices, zero area or self-intersection
+    """
+    ring: List[Point] = []
+    for position in coordinates:
+        if len(position) < 2:
+            raise ValueError(f"{label}: positions need a longitude and a latitude")
+        x, y = float(position[0]), float(position[1])
+        if not (math.isfinite(x) and math.isfinite(y)) or not (-180 <= x <= 180 and -90 <= y <= 90):
+            raise ValueError(f"{label}: coordinate ({x}, {y}) out of range")
+        if ring and ring[-1] == (x, y):
+            repairs.append(f"{label}: removed repeated vertex")
+            continue
+        ring.append((x, y))
+
+    if len(ring) > 1 and ring[0] == ring[-1]:
+        ring.pop()
+    elif ring:
+        repairs.append(f"{label}: closed ring")
+    if len(ring) < 3:
+        raise ValueError(f"{label}: a ring needs at least 3 distinct vertices")
+    ring.append(ring[0])
+
+    area = _signed_area(ring)
+    if area == 0:
+        raise ValueError(f"{label}: ring has zero area")
+    if (area > 0) != exterior:
+        ring.reverse()
+        repairs.append(f"{label}: reversed winding order")
+
+    crossing = find_self_intersection(ring)
+    if crossing:
+        raise ValueError(f"{label}: ring self-intersects between segments {crossing[0]} and {crossing[1]}")
+    return ring
+
+def _perpendicular_distance(p: Point, a: Point, b: Point) -> float:
+    dx, dy = b[0] - a[0], b[1] - a[1]
+    if dx == 0 and dy == 0:
+        return math.hypot(p[0] - a[0], p[1] - a[1])
+    return abs(dy * p[0] - dx * p[1] + b[0] * a[1] - b[1] * a[0]) / math.hypot(dx, dy)
+
+def douglas_peucker(points: List[Point], tolerance: float) -> List[Point]:
+    """Iterative Douglas-Peucker simplification of an open polyline"""
+    if len(points) < 3:
+        return list(points)
+    keep = [False] * len(points)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        start, end = stack.pop()
+        max_distance, index = 0.0, 0
+        for i in range(start + 1, end):
+            distance = _perpendicular_distance(points[i], points[start], points[end])
+            if distance > max_distance:
+                max_distance, index = distance, i
+        if max_distance > tolerance:
+            keep[index] = True
+            stack.append((start, index))
+            stack.append((index, end))
+    return [p for p, kept in zip(points, keep) if kept]
+
+def simplify_ring(ring: List[Point], tolerance_m: float) -> List[Point]:
+    """
+    Simplify a closed ring with a tolerance in metres.
+
+    Longitudes are scaled by cos(latitude) so the tolerance is roughly isotropic.
+    The ring is split at its farthest vertex from the start so both halves keep
+    their anchors. The original ring is returned if the result would be
+    degenerate or self-intersecting.
+    """
+    if len(ring) <= 5:
+        return ring
+    mean_lat = sum(p[1] for p in ring) / len(ring)
+    scale = math.cos(math.radians(mean_lat)) or 1e-9
+    projected = [(x * scale, y) for x, y in ring]
+    tolerance = tolerance_m / METERS_PER_DEGREE
+
+    pivot = max(range(len(projected)), key=lambda i: math.dist(projected[0], projected[i]))
+    first = douglas_peucker(projected[:pivot + 1], tolerance)
+    second = douglas_peucker(projected[pivot:], tolerance)
+    simplified = [(x / scale, y) for x, y in first[:-1] + second]
+
+    if len(simplified) < 4 or _signed_area(simplified) == 0:
+        return ring
+    if (_signed_area(simplified) > 0) != (_signed_area(ring) > 0) or find_self_intersection(simplified):
+        return ring
+    return simplified
+
+def _vertex_count(geometry: Dict[str, Any]) -> int:
+    # Closed rings repeat their first vertex
+    return sum(len(ring) - (1 if ring and ring[0] == ring[-1] else 0) for ring in zone_rings(geometry))
+
+def _lookup_cost_us(geometry: Dict[str, Any], points: List[Point]) -> float:
+    rings = [r for r in (compile_ring(ring) for ring in zone_rings(geometry)) if r]
+    entry = CompiledZone({}, geometry, rings)
+    started = time.perf_counter()
+    for x, y in points:
+        entry.contains(x, y)
+    return (time.perf_counter() - started) / len(points) * 1e6
+
+def normalize_zone_geometry(geometry: Dict[str, Any], simplify_tolerance_m: Optional[float] = None) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """
+    Validate, repair and optionally simplify a Polygon or MultiPolygon.
+
+    Each ring is repaired on its own, then the rings of every polygon are
+    checked against each other (validate_polygon_rings). Simplified rings are
+    checked the same way and a polygon whose simplified rings would not pass
+    keeps its unsimplified rings.
+
+    Args:
+        geometry: GeoJSON Polygon or MultiPolygon
+        simplify_tolerance_m: Douglas-Peucker tolerance in metres (None or 0 disables)
+
+    Returns:
+        tuple: (clean geometry, report with repairs, vertex counts and lookup cost)
+
+    Raises:
+        ValueError: If the geometry is invalid and cannot be repaired
+    """
+    if geometry.get('type') == 'Polygon':
+        polygons = [geometry.get('coordinates') or []]
+    elif geometry.get('type') == 'MultiPolygon':
+        polygons = geometry.get('coordinates') or []
+    else:
+        raise ValueError("Geometry must be a Polygon or MultiPolygon")
+    if not polygons:
+        raise ValueError("Geometry has no polygons")
+
+    repairs: List[str] = []
+    cleaned = []
+    for p, polygon in enumerate(polygons):
+        if not polygon:
+            raise ValueError(f"polygon {p}: no rings")
+        rings = [
+            repair_ring(coordinates, r == 0, repairs, f"polygon {p} ring {r}")
+            for r, coordinates in enumerate(polygon)
+        ]
+        validate_polygon_rings(rings, f"polygon {p}")
+        if simplify_tolerance_m:
+            simplified = [simplify_ring(ring, simplify_tolerance_m) for ring in rings]
+            # Each ring is simplified on its own, which can make a hole cross its exterior
+            try:
+                validate_polygon_rings(simplified, f"polygon {p}")
+                rings = simplified
+            except ValueError as e:
+                repairs.append(f"{e}; kept the unsimplified rings")
+        cleaned.append([[[x, y] for x, y in ring] for ring in rings])
+
+    result = (
+        {'type': 'Polygon', 'coordinates': cleaned[0]} if len(cleaned) == 1
+        else {'type': 'MultiPolygon', 'coordinates': cleaned}
+    )
+
+    report: Dict[str, Any] = {
+        "polygons": len(cleaned),
+        "rings": sum(len(polygon) for polygon in cleaned),
+        "vertices_before": _vertex_count({'type': 'MultiPolygon', 'coordinates': polygons}),
+        "vertices_after": _vertex_count(result),
+        "repairs": repairs,
+    }
+
+    if simplify_tolerance_m:
+        # Lookup cost on random points in the zone's bounding box, before vs after
+        xs = [x for ring in zone_rings(result) for x, _ in ring]
+        ys = [y for ring in zone_rings(result) for _, y in ring]
+        rng = random.Random(0)
+        sample = [(rng.uniform(min(xs), max(xs)), rng.uniform(min(ys), max(ys))) for _ in range(500)]
+        original = {'type': 'MultiPolygon', 'coordinates': polygons}
+        before = _lookup_cost_us(original, sample)
+        after = _lookup_cost_us(result, sample)
+        report.update({
+            "simplify_tolerance_m": simplify_tolerance_m,
+            "lookup_us_before": round(before, 3),
+            "lookup_us_after": round(after, 3),
+            "lookup_speedup": round(before / after, 2) if after else None,
+        })
+    return result, report
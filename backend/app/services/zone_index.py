@@ -0,0 +1,317 @@
+import asyncio
+import hashlib
+import json
+import logging
+import math
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.services.zone_cells import CellTable
+
+logger = logging.getLogger(__name__)
+
+# An edge is (y1, y2, x1, dx/dy); horizontal edges never cross a horizontal ray and are dropped
+Edge = Tuple[float, float, float, float]
+BBox = Tuple[float, float, float, float]  # min_x, min_y, max_x, max_y
+
+def legacy_to_geojson(coordinates: List[dict]) -> Dict[str, Any]:
+    """Convert a legacy [{lat, lng}] polygon to a closed GeoJSON Polygon"""
+    coords = [[point['lng'], point['lat']] for point in coordinates]
+    # Close the polygon if not already closed
+    if coords and coords[0] != coords[-1]:
+        coords.append(coords[0])
+    return {
+        'type': 'Polygon',
+        'coordinates': [coords]
+    }
+
+def zone_rings(geometry: Dict[str, Any]) -> List[List[List[float]]]:
+    """
+    Flatten a Polygon or MultiPolygon into its rings (exteriors and holes alike).
+    Under the even-odd rule a point is inside iff it is inside an odd number of
+    rings, which handles holes and disjoint MultiPolygon parts in one pass.
+    """
+    if not geometry:
+        return []
+    if geometry.get('type') == 'Polygon':
+        return list(geometry.get('coordinates') or [])
+    if geometry.get('type') == 'MultiPolygon':
+        return [ring for polygon in geometry.get('coordinates') or [] for ring in polygon]
+    return []
+
+def compile_ring(ring: List[List[float]]) -> Optional[Tuple[BBox, Tuple[Edge, ...]]]:
+    """Precompute a ring's bounding box and crossing-test edges"""
+    points = [(float(p[0]), float(p[1])) for p in ring]
+    if len(points) >= 2 and points[0] == points[-1]:
+        points.pop()
+    if len(points) < 3:
+        return None
+    edges = []
+    for i, (x1, y1) in enumerate(points):
+        x2, y2 = points[(i + 1) % len(points)]
+        if y1 != y2:
+            edges.append((y1, y2, x1, (x2 - x1) / (y2 - y1)))
+    xs = [p[0] for p in points]
+    ys = [p[1] for p in points]
+    return (min(xs), min(ys), max(xs), max(ys)), tuple(edges)
+
+def _ring_contains(edges: Tuple[Edge, ...], x: float, y: float) -> bool:
+    inside = False
+    for y1, y2, x1, dxdy in edges:
+        if (y1 > y) != (y2 > y) and x < x1 + (y - y1) * dxdy:
+            inside = not inside
+    return inside
+
+# Upper bound on points x edges evaluated at once by the vectorized test (~32 MB of float64)
+VECTOR_CHUNK_ELEMENTS = 4_000_000
+
+class CompiledZone:
+    __slots__ = ("zone", "geometry", "bbox", "rings", "edge_arrays")
+
+    def __init__(self, zone: Dict[str, Any], geometry: Dict[str, Any], rings: List[Tuple[BBox, Tuple[Edge, ...]]]):
+        self.zone = zone
+        self.geometry = geometry
+        self.rings = rings
+        self.bbox = (
+            min(r[0][0] for r in rings), min(r[0][1] for r in rings),
+            max(r[0][2] for r in rings), max(r[0][3] for r in rings)
+        )
+        # All ring edges as columns (y1, y2, x1, dxdy) for the vectorized test
+        edges = [edge for _, ring_edges in rings for edge in ring_edges]
+        self.edge_arrays = np.array(edges, dtype=np.float64).reshape(-1, 4).T.copy()
+
+    def segments(self):
+        """Raw ring segments (x1, y1, x2, y2), including horizontal ones"""
+        for ring in zone_rings(self.geometry):
+            if ring and ring[0] != ring[-1]:
+                ring = list(ring) + [ring[0]]
+            for (x1, y1), (x2, y2) in zip(ring, ring[1:]):
+                yield float(x1), float(y1), float(x2), float(y2)
+
+    def contains(self, x: float, y: float) -> bool:
+        min_x, min_y, max_x, max_y = self.bbox
+        if x < min_x or x > max_x or y < min_y or y > max_y:
+            return False
+        inside = False
+        for (r_min_x, r_min_y, r_max_x, r_max_y), edges in self.rings:
+            if r_min_x <= x <= r_max_x and r_min_y <= y <= r_max_y and _ring_contains(edges, x, y):
+                inside = not inside
+        return inside
+
+    def contains_many(self, xs: np.ndarray, ys: np.ndarray) -> np.ndarray:
+        """Vectorized even-odd test of many points against every edge of the zone"""
+        y1, y2, x1, dxdy = self.edge_arrays
+        inside = np.zeros(len(xs), dtype=bool)
+        if not len(xs) or not len(y1):
+            return inside
+        chunk = max(1, VECTOR_CHUNK_ELEMENTS // len(y1))
+        for start in range(0, len(xs), chunk):
+            x = xs[start:start + chunk, None]
+            y = ys[start:start + chunk, None]
+            crossings = ((y1 > y) != (y2 > y)) & (x < x1 + (y - y1) * dxdy)
+            inside[start:start + chunk] = np.count_nonzero(crossings, axis=1) & 1
+        return inside
+
+class ZoneSnapshot:
+    """
+    One built version of the index. It is never modified after it is built; a
+    rebuild publishes a new snapshot with a single reference assignment, so a
+    reader that takes `zone_index.snapshot` once sees zones, grid and cell
+    table from the same build.
+
+    `documents` holds every zone document the snapshot was built from (legacy
+    zones converted to GeoJSON), including zones that could not be compiled,
+    so it always matches `etag`.
+    """
+    __slots__ = ("documents", "zones", "grid", "cell_table", "etag", "loaded_at", "build_time_ms")
+
+    def __init__(
+        self,
+        documents: List[Dict[str, Any]],
+        zones: List[CompiledZone],
+        grid: Dict[Tuple[int, int], List[CompiledZone]],
+        cell_table: Optional[CellTable],
+        etag: Optional[str],
+        loaded_at: Optional[datetime],
+        build_time_ms: float = 0.0,
+    ):
+        self.documents = documents
+        self.zones = zones
+        self.grid = grid
+        self.cell_table = cell_table
+        self.etag = etag
+        self.loaded_at = loaded_at
+        self.build_time_ms = build_time_ms
+
+EMPTY_SNAPSHOT = ZoneSnapshot([], [], {}, None, None, None)
+
+class ZoneIndex:
+    """
+    In-process point-in-zone index.
+
+    Lookups go through a fine-grained cell table (see zone_cells.CellTable), so
+    most are a single dict probe and only cells on a zone boundary run an exact
+    ray-casting test. If the table would be too large, zones are instead bucketed
+    by bounding box into a coarse grid and every candidate is tested exactly.
+    Each worker holds its own copy; it is rebuilt after local zone writes and
+    periodically to pick up writes made by other workers. A refresh that finds
+    the zone documents unchanged (same ETag) keeps the current index, and a
+    rebuild runs in the thread pool, since a large cell table takes long enough
+    to stall the event loop. The built state lives in one ZoneSnapshot that is
+    swapped whole, so concurrent lookups never mix two builds.
+    """
+
+    def __init__(self, cell_size_deg: float = None, table_cell_size_deg: float = None, max_table_cells: int = None):
+        self.cell_size = cell_size_deg or settings.ZONE_INDEX_CELL_DEG
+        self.table_cell_size = table_cell_size_deg if table_cell_size_deg is not None else settings.ZONE_CELL_TABLE_DEG
+        self.max_table_cells = max_table_cells or settings.ZONE_CELL_TABLE_MAX_CELLS
+        self.snapshot: ZoneSnapshot = EMPTY_SNAPSHOT
+        self.refreshes_skipped = 0
+        self._refresh_lock = asyncio.Lock()
+
+    # Read-only views of the current snapshot; a caller that needs more than
+    # one of them together should take `snapshot` once instead
+    @property
+    def zones(self) -> List[CompiledZone]:
+        return self.snapshot.zones
+
+    @property
+    def grid(self) -> Dict[Tuple[int, int], List[CompiledZone]]:
+        return self.snapshot.grid
+
+    @property
+    def cell_table(self) -> Optional[CellTable]:
+        return self.snapshot.cell_table
+
+    @property
+    def etag(self) -> Optional[str]:
+        return self.snapshot.etag
+
+    @property
+    def loaded_at(self) -> Optional[datetime]:
+        return self.snapshot.loaded_at
+
+    @property
+    def build_time_ms(self) -> float:
+        return self.snapshot.build_time_ms
+
+    @property
+    def loaded(self) -> bool:
+        return self.snapshot.loaded_at is not None
+
+    def _cell(self, x: float, y: float) -> Tuple[int, int]:
+        return math.floor(x / self.cell_size), math.floor(y / self.cell_size)
+
+    @staticmethod
+    def zones_etag(zones: List[Dict[str, Any]]) -> str:
+        """Changes whenever any zone document changes; used for conditional listing requests"""
+        return '"' + hashlib.sha1(json.dumps(zones, sort_keys=True, default=str).encode()).hexdigest() + '"'
+
+    def build(self, zones: List[Dict[str, Any]], etag: str = None) -> None:
+        """Compile zone documents and swap them in atomically"""
+        started = time.perf_counter()
+        documents: List[Dict[str, Any]] = []
+        compiled: List[CompiledZone] = []
+        grid: Dict[Tuple[int, int], List[CompiledZone]] = {}
+
+        for zone in zones:
+            geometry = zone.get('geometry')
+            if not geometry and zone.get('coordinates'):
+                geometry = legacy_to_geojson(zone['coordinates'])
+                documents.append({**{k: v for k, v in zone.items() if k != 'coordinates'}, 'geometry': geometry})
+            else:
+                documents.append(zone)
+            rings = [r for r in (compile_ring(ring) for ring in zone_rings(geometry)) if r]
+            if not rings:
+                logger.warning(f"Skipping delivery zone {zone.get('id')} with no usable geometry")
+                continue
+            entry = CompiledZone(zone, geometry, rings)
+            compiled.append(entry)
+
+            min_cx, min_cy = self._cell(entry.bbox[0], entry.bbox[1])
+            max_cx, max_cy = self._cell(entry.bbox[2], entry.bbox[3])
+            for cx in range(min_cx, max_cx + 1):
+                for cy in range(min_cy, max_cy + 1):
+                    grid.setdefault((cx, cy), []).append(entry)
+
+        cell_table = None
+        if self.table_cell_size > 0:
+            cell_table = CellTable.build(compiled, self.table_cell_size, self.max_table_cells)
+
+        self.snapshot = ZoneSnapshot(
+            documents, compiled, grid, cell_table, etag or self.zones_etag(zones),
+            datetime.utcnow(), (time.perf_counter() - started) * 1000
+        )
+
+    async def refresh(self, db) -> None:
+        """Reload zones from MongoDB and rebuild the index if any of them changed"""
+        # One refresh at a time, so an older build cannot finish last and win
+        async with self._refresh_lock:
+            zones = await db.delivery_zones.find({}, {"_id": 0}).to_list(None)
+            etag = self.zones_etag(zones)
+            if etag == self.etag:
+                self.refreshes_skipped += 1
+                return
+            await run_in_threadpool(self.build, zones, etag)
+            snapshot = self.snapshot
+        table_cells = len(snapshot.cell_table.cells) if snapshot.cell_table else 0
+        logger.info(f"Zone index rebuilt: zones={len(snapshot.zones)}, grid_cells={len(snapshot.grid)}, table_cells={table_cells}, time={snapshot.build_time_ms:.1f}ms")
+
+    def locate(self, longitude: float, latitude: float) -> Optional[Dict[str, Any]]:
+        """Return the first zone containing the point, or None"""
+        snapshot = self.snapshot
+        if snapshot.cell_table is not None:
+            return snapshot.cell_table.locate(longitude, latitude)
+        for entry in snapshot.grid.get(self._cell(longitude, latitude), ()):
+            if entry.contains(longitude, latitude):
+                return entry.zone
+        return None
+
+    def locate_many(self, longitudes: Sequence[float], latitudes: Sequence[float]) -> List[Optional[Dict[str, Any]]]:
+        """
+        Batch variant of `locate`: each zone is tested once against all points
+        inside its bounding box that are not yet matched.
+        """
+        xs = np.asarray(longitudes, dtype=np.float64)
+        ys = np.asarray(latitudes, dtype=np.float64)
+        match = np.full(len(xs), -1, dtype=np.int64)
+        zones = self.snapshot.zones
+        for i, entry in enumerate(zones):
+            min_x, min_y, max_x, max_y = entry.bbox
+            candidates = np.flatnonzero(
+                (match < 0) & (xs >= min_x) & (xs <= max_x) & (ys >= min_y) & (ys <= max_y)
+            )
+            if not len(candidates):
+                continue
+            hits = entry.contains_many(xs[candidates], ys[candidates])
+            match[candidates[hits]] = i
+        return [zones[i].zone if i >= 0 else None for i in match.tolist()]
+
+    def zone_documents(self) -> List[Dict[str, Any]]:
+        """Every loaded zone with its GeoJSON geometry (legacy zones converted), indexed or not"""
+        return self.snapshot.documents
+
+    def stats(self) -> Dict[str, Any]:
+        snapshot = self.snapshot
+        return {
+            "zones": len(snapshot.zones),
+            "rings": sum(len(z.rings) for z in snapshot.zones),
+            "edges": sum(len(edges) for z in snapshot.zones for _, edges in z.rings),
+            "grid_cells": len(snapshot.grid),
+            "cell_size_deg": self.cell_size,
+            "build_time_ms": round(snapshot.build_time_ms, 2),
+            "loaded_at": snapshot.loaded_at,
+            "refreshes_skipped": self.refreshes_skipped,
+            "etag": snapshot.etag,
+            "cell_table": snapshot.cell_table.stats() if snapshot.cell_table else None,
+        }
+
+zone_index = ZoneIndex()
+
+async def refresh_zone_index(db) -> None:
+    await zone_index.refresh(db)
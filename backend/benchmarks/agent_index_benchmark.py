@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Benchmark nearest-available-agent queries.
+
+Files random agents around a city into the grid index, then runs k-nearest
+queries from random drops (with and without a zone filter, some agents at
+capacity or stale) and compares them with a brute-force NumPy scan over every
+agent. Results are checked to be identical. Also reports the cost of moving
+an agent (one position update).
+
+Usage: python benchmarks/agent_index_benchmark.py [agents] [queries] [k]
+"""
+
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+# Add the backend directory to Python path
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from app.core.config import settings
+from app.services.agent_index import AgentIndex
+from app.services.geo_math import haversine_pairwise
+
+CENTER = (13.1056, 77.5951)  # lat, lng
+SPREAD = 0.15  # degrees, ~35 x 35 km
+ZONES = 12
+
+def percentile(values, q):
+    return sorted(values)[min(len(values) - 1, int(len(values) * q))]
+
+def main():
+    n_agents = int(sys.argv[1]) if len(sys.argv) > 1 else 3000
+    n_queries = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+    k = int(sys.argv[3]) if len(sys.argv) > 3 else 5
+    random.seed(11)
+    now = datetime.utcnow()
+    capacity = settings.DISPATCH_AGENT_CAPACITY
+
+    index = AgentIndex()
+    ids, lats, lngs, zones, loads, times = [], [], [], [], [], []
+    for i in range(n_agents):
+        agent_id = f"agent-{i}"
+        lat, lng = CENTER[0] + random.uniform(-SPREAD, SPREAD), CENTER[1] + random.uniform(-SPREAD, SPREAD)
+        recorded_at = now - timedelta(seconds=random.choice([5] * 9 + [settings.LOCATION_STALE_SECONDS * 2]))
+        zone = {f"zone-{random.randrange(ZONES)}", f"zone-{random.randrange(ZONES)}"}
+        load = random.choice([0, 0, 1, 2, capacity])
+        index.update(agent_id, lat, lng, recorded_at)
+        index.zones[agent_id] = frozenset(zone)
+        index.loads[agent_id] = load
+        ids.append(agent_id)
+        lats.append(lat)
+        lngs.append(lng)
+        zones.append(zone)
+        loads.append(load)
+        times.append(recorded_at)
+
+    agent_lats, agent_lngs = np.array(lats), np.array(lngs)
+    fresh_after = now - timedelta(seconds=settings.LOCATION_STALE_SECONDS)
+    available = np.array([t >= fresh_after and load < capacity for t, load in zip(times, loads)])
+
+    def brute(lat, lng, zone_id):
+        mask = available.copy()
+        if zone_id is not None:
+            mask &= np.array([zone_id in z for z in zones])
+        distance = haversine_pairwise(lat, lng, agent_lats, agent_lngs)
+        distance[~mask | (distance > settings.DISPATCH_MAX_DISTANCE_KM)] = np.inf
+        order = np.argsort(distance, kind="stable")[:k]
+        return [ids[i] for i in order if np.isfinite(distance[i])]
+
+    queries = [(
+        CENTER[0] + random.uniform(-SPREAD, SPREAD),
+        CENTER[1] + random.uniform(-SPREAD, SPREAD),
+        f"zone-{random.randrange(ZONES)}" if random.random() < 0.5 else None
+    ) for _ in range(n_queries)]
+
+    grid_times, brute_times, mismatches = [], [], 0
+    for lat, lng, zone_id in queries:
+        began = time.perf_counter()
+        found = index.nearest(lat, lng, k, zone_id=zone_id, now=now)
+        grid_times.append((time.perf_counter() - began) * 1e6)
+
+        began = time.perf_counter()
+        expected = brute(lat, lng, zone_id)
+        brute_times.append((time.perf_counter() - began) * 1e6)
+        if [entry.agent_id for _, entry in found] != expected:
+            mismatches += 1
+
+    moves = [(random.choice(ids), CENTER[0] + random.uniform(-SPREAD, SPREAD), CENTER[1] + random.uniform(-SPREAD, SPREAD)) for _ in range(100_000)]
+    began = time.perf_counter()
+    for agent_id, lat, lng in moves:
+        index.update(agent_id, lat, lng, now)
+    update_us = (time.perf_counter() - began) / len(moves) * 1e6
+
+    print(f"{n_agents} agents in {len(index.grid)} cells ({settings.AGENT_INDEX_CELL_DEG} deg), {n_queries} queries, k={k}")
+    print(f"  grid index:  mean {statistics.mean(grid_times):7.1f} us   p50 {percentile(grid_times, 0.5):7.1f} us   p99 {percentile(grid_times, 0.99):7.1f} us")
+    print(f"  brute force: mean {statistics.mean(brute_times):7.1f} us   p50 {percentile(brute_times, 0.5):7.1f} us   p99 {percentile(brute_times, 0.99):7.1f} us")
+    print(f"  mismatches:  {mismatches}")
+    print(f"  update:      {update_us:.2f} us per position")
+
+if __name__ == "__main__":
+    main()
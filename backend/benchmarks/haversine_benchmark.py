@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Benchmark haversine distance matrices.
+
+Compares the scalar per-pair loop (calculate_distance on dicts, as the
+routing and order endpoints used to do) with the NumPy matrix in
+geo_math.haversine_matrix at float64 and float32, and reports the float32
+error against float64.
+
+Usage: python benchmarks/haversine_benchmark.py [points]
+"""
+
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+# Add the backend directory to Python path
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from app.services.geo_math import calculate_distance, haversine_matrix
+
+CENTER = (13.1056, 77.5951)  # lat, lng
+
+def timed(label: str, func, pairs: int, repeat: int = 1):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    print(f"{label:<28} {best * 1000:10.1f} ms  {best / pairs * 1e9:8.1f} ns/pair")
+    return result, best
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    random.seed(42)
+    points = [(CENTER[0] + random.uniform(-0.5, 0.5), CENTER[1] + random.uniform(-0.5, 0.5)) for _ in range(n)]
+    dicts = [{"latitude": lat, "longitude": lng} for lat, lng in points]
+    pairs = n * n
+
+    print(f"{n} x {n} distance matrix ({pairs} pairs)")
+    scalar, scalar_time = timed("scalar loop", lambda: [[calculate_distance(a, b) for b in dicts] for a in dicts], pairs)
+    matrix64, time64 = timed("numpy float64", lambda: haversine_matrix(points), pairs, repeat=5)
+    matrix32, time32 = timed("numpy float32", lambda: haversine_matrix(points, dtype=np.float32), pairs, repeat=5)
+
+    error64 = np.abs(np.asarray(scalar) - matrix64).max()
+    error32 = np.abs(matrix64 - matrix32).max()
+    print(f"speedup float64: {scalar_time / time64:.0f}x, float32: {scalar_time / time32:.0f}x")
+    print(f"max error float64 vs scalar: {error64 * 1000:.6f} m, float32 vs float64: {error32 * 1000:.3f} m")
+
+if __name__ == "__main__":
+    main()
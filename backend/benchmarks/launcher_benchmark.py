@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Compare request throughput of the development launcher and serve.py.
+
+Starts the app under each launcher on a free port, then drives GET /health
+from `clients` load processes, each holding `connections` keep-alive HTTP/1.1
+connections for a fixed duration, and reports requests/s and latency
+percentiles. Launchers measured:
+
+  reload:  uvicorn.run("main:app", reload=True, log_level="info") — what
+           main.py and start_new_api.py used to run (one process, file
+           watcher, access log)
+  serve:   python serve.py with 1 worker, then with the auto-sized count
+
+Needs no MongoDB: the servers get an unreachable MONGO_URL with a short
+server selection timeout and background jobs disabled, and /health does not
+touch the database. The load generator is a minimal raw-socket client so it
+costs far less CPU than the server it measures; still, on a small machine it
+competes with the workers for cores, so compare launchers on the same host.
+
+Usage: python benchmarks/launcher_benchmark.py [seconds] [clients] [connections per client]
+"""
+
+import asyncio
+import multiprocessing
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+# Add the backend directory to Python path
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.append(BACKEND_DIR)
+
+from serve import available_cpus, event_loop_stack, worker_count
+
+SERVER_ENV = {
+    "MONGO_URL": "mongodb://127.0.0.1:1",
+    "MONGO_SERVER_SELECTION_TIMEOUT_MS": "300",
+    "RUN_MIGRATIONS_ON_STARTUP": "false",
+    **{name: "0" for name in (
+        "STATS_RECONCILE_INTERVAL_SECONDS", "SALES_VELOCITY_REFRESH_INTERVAL_SECONDS",
+        "ZONE_INDEX_REFRESH_INTERVAL_SECONDS", "DISPATCH_INTERVAL_SECONDS", "WAVE_BUILD_INTERVAL_SECONDS",
+        "ETA_REFRESH_INTERVAL_SECONDS", "LOCATION_FLUSH_INTERVAL_SECONDS", "AGENT_INDEX_REFRESH_INTERVAL_SECONDS",
+        "ROUTE_UPGRADE_INTERVAL_SECONDS",
+    )},
+}
+
+def percentile(values, q):
+    return sorted(values)[min(len(values) - 1, int(len(values) * q))] if values else float("nan")
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def launch(name: str, port: int, workers: int = 0) -> subprocess.Popen:
+    if name == "reload":
+        command = [sys.executable, "-c", (
+            "import uvicorn; uvicorn.run('main:app', host='127.0.0.1', "
+            f"port={port}, reload=True, log_level='info')"
+        )]
+    else:
+        command = [sys.executable, "serve.py", "--host", "127.0.0.1", "--port", str(port), "--workers", str(workers)]
+    return subprocess.Popen(
+        command, cwd=BACKEND_DIR, env={**os.environ, **SERVER_ENV},
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True
+    )
+
+def wait_ready(port: int, timeout: float = 60) -> None:
+    deadline = time.time() + timeout
+    request = b"GET /health HTTP/1.1\r\nHost: bench\r\nConnection: close\r\n\r\n"
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=1) as s:
+                s.sendall(request)
+                if s.recv(64).startswith(b"HTTP/1.1 200"):
+                    return
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"server on port {port} did not become ready")
+
+def stop(process: subprocess.Popen) -> None:
+    os.killpg(process.pid, signal.SIGTERM)
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        os.killpg(process.pid, signal.SIGKILL)
+        process.wait()
+
+async def _connection(port: int, deadline: float, latencies: list) -> None:
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    request = b"GET /health HTTP/1.1\r\nHost: bench\r\n\r\n"
+    while time.perf_counter() < deadline:
+        began = time.perf_counter()
+        writer.write(request)
+        headers = await reader.readuntil(b"\r\n\r\n")
+        length = 0
+        for line in headers.split(b"\r\n"):
+            if line.lower().startswith(b"content-length:"):
+                length = int(line.split(b":")[1])
+        await reader.readexactly(length)
+        latencies.append((time.perf_counter() - began) * 1000)
+    writer.close()
+
+def _client(port: int, connections: int, seconds: float, queue) -> None:
+    latencies = []
+
+    async def run():
+        deadline = time.perf_counter() + seconds
+        await asyncio.gather(*(_connection(port, deadline, latencies) for _ in range(connections)))
+
+    asyncio.run(run())
+    queue.put(latencies)
+
+def drive(port: int, clients: int, connections: int, seconds: float) -> dict:
+    queue = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=_client, args=(port, connections, seconds, queue)) for _ in range(clients)]
+    began = time.perf_counter()
+    for p in processes:
+        p.start()
+    latencies = [ms for _ in processes for ms in queue.get()]
+    for p in processes:
+        p.join()
+    elapsed = time.perf_counter() - began
+    return {"rps": len(latencies) / elapsed, "p50": percentile(latencies, 0.5), "p99": percentile(latencies, 0.99)}
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 10
+    clients = int(sys.argv[2]) if len(sys.argv) > 2 else 2
+    connections = int(sys.argv[3]) if len(sys.argv) > 3 else 32
+    auto = worker_count()
+
+    runs = [("reload", 1), ("serve", 1)]
+    if auto > 1:
+        runs.append(("serve", auto))
+
+    stack = event_loop_stack()
+    print(f"{available_cpus()} CPU(s), serve.py stack: loop={stack['loop']} http={stack['http']}; "
+          f"{clients} load processes x {connections} connections, {seconds:.0f}s per launcher")
+    print(f"{'launcher':<18} {'req/s':>10} {'p50 ms':>8} {'p99 ms':>8}")
+    for name, workers in runs:
+        port = free_port()
+        process = launch(name, port, workers)
+        try:
+            wait_ready(port)
+            drive(port, clients, connections, 1)  # warm up
+            r = drive(port, clients, connections, seconds)
+        finally:
+            stop(process)
+        label = name if name == "reload" else f"serve x{workers}"
+        print(f"{label:<18} {r['rps']:>10,.0f} {r['p50']:>8.2f} {r['p99']:>8.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Benchmark agent location ingestion on one worker.
+
+Measures, without MongoDB:
+- the in-memory store alone (LocationStore.ingest),
+- building the bucketed history writes for one flush,
+- POST /api/v1/agents/location (and /location/batch) through the full FastAPI stack in-process
+  (routing, validation, auth dependency stubbed out so no user lookup),
+- the WebSocket endpoint with one ping per message (round trip incl. ack).
+
+The HTTP and WebSocket numbers exclude network and HTTP parsing in the
+server, so they are upper bounds for a real worker.
+
+Usage: python benchmarks/location_ingest_benchmark.py [agents] [pings]
+"""
+
+import asyncio
+import logging
+import os
+import random
+import sys
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+
+# Add the backend directory to Python path
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+import httpx
+from fastapi.testclient import TestClient
+
+from main import app
+from app.api.v1.endpoints import agents as agents_endpoint
+from app.core.config import settings
+from app.core.security import get_current_user
+from app.models.user import UserResponse, UserRole
+from app.services.location_service import LocationStore, history_updates, location_store
+
+CENTER = (13.1056, 77.5951)  # lat, lng
+AGENT = UserResponse(id="agent-0", email="agent@example.com", name="Agent", role=UserRole.DELIVERY_AGENT)
+
+def random_ping():
+    return {
+        "latitude": CENTER[0] + random.uniform(-0.2, 0.2),
+        "longitude": CENTER[1] + random.uniform(-0.2, 0.2),
+        "accuracy_m": 8.0,
+        "speed_mps": random.uniform(0, 12),
+        "heading": random.uniform(0, 359),
+    }
+
+def bench_store(n_agents: int, n_pings: int):
+    store = LocationStore(max_pending=n_pings)
+    start = datetime.utcnow()
+    pings = [(f"agent-{i % n_agents}", start + timedelta(seconds=i // n_agents * 3), random_ping()) for i in range(n_pings)]
+    began = time.perf_counter()
+    for agent_id, recorded_at, p in pings:
+        store.ingest(agent_id, p["latitude"], p["longitude"], p["accuracy_m"], p["speed_mps"], p["heading"], recorded_at, now=recorded_at)
+    ingest_s = time.perf_counter() - began
+
+    began = time.perf_counter()
+    updates = history_updates(list(store.pending), settings.LOCATION_BUCKET_SECONDS)
+    flush_s = time.perf_counter() - began
+    return n_pings / ingest_s, flush_s * 1000, len(updates)
+
+async def bench_http(n_requests: int, batch: int = 1, concurrency: int = 50):
+    app.dependency_overrides[get_current_user] = lambda: AGENT
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def worker(count):
+            for _ in range(count):
+                if batch == 1:
+                    response = await client.post("/api/v1/agents/location", json=random_ping())
+                else:
+                    response = await client.post("/api/v1/agents/location/batch", json={"pings": [random_ping() for _ in range(batch)]})
+                assert response.status_code == 200, response.text
+
+        began = time.perf_counter()
+        await asyncio.gather(*(worker(n_requests // concurrency) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - began
+    app.dependency_overrides.clear()
+    return (n_requests // concurrency * concurrency) * batch / elapsed
+
+def bench_websocket(n_messages: int):
+    async def fake_user(token):
+        return AGENT
+    agents_endpoint.get_user_from_token = fake_user
+    with TestClient(app) as client:
+        with client.websocket_connect("/api/v1/agents/location/ws?token=bench") as ws:
+            began = time.perf_counter()
+            for _ in range(n_messages):
+                ws.send_json(random_ping())
+                ws.receive_json()
+            elapsed = time.perf_counter() - began
+    return n_messages / elapsed
+
+def main():
+    n_agents = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    n_pings = int(sys.argv[2]) if len(sys.argv) > 2 else 200_000
+    random.seed(7)
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    rate, flush_ms, buckets = bench_store(n_agents, n_pings)
+    print(f"{n_agents} agents, {n_pings} pings")
+    print(f"  store.ingest:        {rate:>10,.0f} pings/s")
+    print(f"  flush build:         {flush_ms:>10.1f} ms for {n_pings} pings -> {buckets} bucket upserts")
+
+    http_rate = asyncio.run(bench_http(5000))
+    print(f"  POST /location:      {http_rate:>10,.0f} pings/s (in-process, 50 concurrent clients)")
+    batch_rate = asyncio.run(bench_http(1000, batch=10))
+    print(f"  POST /location/batch:{batch_rate:>10,.0f} pings/s (10 pings per request)")
+
+    # Lifespan would connect to MongoDB and start background jobs; not needed here
+    app.router.lifespan_context = _no_lifespan
+    ws_rate = bench_websocket(5000)
+    print(f"  WebSocket:           {ws_rate:>10,.0f} pings/s (one connection, ack per ping)")
+
+    pings_per_agent = 1 / 3  # one ping every 3 s
+    print(f"  => one worker sustains ~{http_rate / pings_per_agent:,.0f} agents over HTTP at one ping per 3 s, "
+          f"~{ws_rate / pings_per_agent:,.0f} per WebSocket-connection-equivalent")
+    location_store.latest.clear()
+
+@asynccontextmanager
+async def _no_lifespan(app):
+    yield
+
+if __name__ == "__main__":
+    main()
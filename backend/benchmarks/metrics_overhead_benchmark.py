@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Benchmark the cost of request, MongoDB and OSRM instrumentation.
+
+Calls a small FastAPI app (one router mounted with a prefix, a path
+parameter, a JSON response) straight through ASGI, with and without
+MetricsMiddleware, and reports the added time per request. Also times a
+single histogram observation, one MongoDB command through the command
+listener (started + succeeded) and a /metrics render with many series.
+
+Usage: python benchmarks/metrics_overhead_benchmark.py [requests] [rounds]
+"""
+
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+import types
+
+# Add the backend directory to Python path
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from fastapi import APIRouter, FastAPI
+
+from app.core.metrics import MetricsMiddleware, http_request_duration, registry, render_metrics
+from app.db.mongodb import CommandMetricsListener
+
+def build_app(instrumented: bool) -> FastAPI:
+    router = APIRouter()
+
+    @router.get("/{item_id}")
+    async def get_item(item_id: str):
+        return {"id": item_id, "name": "Milk 1L", "price": 54.0, "in_stock": True}
+
+    app = FastAPI()
+    app.include_router(router, prefix="/api/v1/items")
+    if instrumented:
+        app.add_middleware(MetricsMiddleware)
+    return app
+
+async def drive(app: FastAPI, n: int) -> float:
+    """Seconds per request over n sequential ASGI calls"""
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    began = time.perf_counter()
+    for i in range(n):
+        path = f"/api/v1/items/item-{i % 500}"
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+            "scheme": "http", "path": path, "raw_path": path.encode(), "root_path": "", "query_string": b"",
+            "headers": [(b"host", b"bench")], "client": ("127.0.0.1", 1234), "server": ("bench", 80),
+        }
+        await app(scope, receive, send)
+    return (time.perf_counter() - began) / n
+
+def time_per_call(fn, n: int) -> float:
+    began = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - began) / n
+
+async def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    plain, instrumented = build_app(False), build_app(True)
+    await drive(plain, 1000)
+    await drive(instrumented, 1000)
+
+    # Alternate the two apps so drift in machine load hits both equally
+    bare, measured = [], []
+    for _ in range(rounds):
+        bare.append(await drive(plain, n) * 1e6)
+        measured.append(await drive(instrumented, n) * 1e6)
+    overhead = statistics.median(m - b for m, b in zip(measured, bare))
+
+    observe_us = time_per_call(lambda: http_request_duration.observe(0.0042, "GET", "/bench", "200"), 200_000) * 1e6
+
+    listener = CommandMetricsListener()
+    started = types.SimpleNamespace(connection_id=("db", 27017), request_id=1, command_name="find", command={"find": "products"})
+    succeeded = types.SimpleNamespace(connection_id=("db", 27017), request_id=1, command_name="find", duration_micros=850)
+
+    def command():
+        listener.started(started)
+        listener.succeeded(succeeded)
+
+    command_us = time_per_call(command, 200_000) * 1e6
+
+    # A busy registry: 150 routes x 4 statuses
+    for i in range(150):
+        for status in ("200", "201", "404", "500"):
+            http_request_duration.observe(random.random(), "GET", f"/api/v1/route-{i}", status)
+    series = sum(len(metric.values) for metric in registry.metrics.values())
+    render_ms = time_per_call(render_metrics, 50) * 1e3
+
+    print(f"{n} requests x {rounds} rounds through FastAPI (router prefix + path parameter)")
+    print(f"  without metrics: median {statistics.median(bare):7.1f} us/request")
+    print(f"  with metrics:    median {statistics.median(measured):7.1f} us/request")
+    print(f"  overhead:        {overhead:7.2f} us/request ({overhead / statistics.median(bare) * 100:.1f}%)")
+    print(f"  histogram observe:       {observe_us:.2f} us")
+    print(f"  Mongo command listener:  {command_us:.2f} us per command")
+    print(f"  /metrics render:         {render_ms:.2f} ms for {series} series")
+
+if __name__ == "__main__":
+    asyncio.run(main())
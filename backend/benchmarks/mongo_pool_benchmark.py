@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Benchmark MongoDB throughput under different connection pool sizes.
+
+Needs a running MongoDB (MONGO_URL). Seeds a scratch collection, then for
+each pool size runs `concurrency` coroutines issuing indexed find_one calls
+(the shape of most request-path reads) for a fixed duration through a client
+built with the app's own client options, and reports ops/s, latency
+percentiles and the pool counters from PoolStatsListener (peak connections
+in use, peak operations waiting, checkout wait). The scratch collection is
+dropped at the end.
+
+Usage: python benchmarks/mongo_pool_benchmark.py [concurrency] [seconds] [pool sizes, e.g. 1,5,10,25,50,100]
+"""
+
+import asyncio
+import os
+import random
+import sys
+import time
+
+# Add the backend directory to Python path
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from app.core.config import settings
+from app.db.mongodb import PoolStatsListener, client_options
+
+COLLECTION = "pool_benchmark"
+DOCS = 10_000
+
+def percentile(values, q):
+    return sorted(values)[min(len(values) - 1, int(len(values) * q))] if values else float("nan")
+
+async def seed(url: str) -> None:
+    client = AsyncIOMotorClient(url)
+    collection = client[settings.DB_NAME][COLLECTION]
+    await collection.drop()
+    await collection.insert_many([{"id": f"doc-{i}", "payload": "x" * 200, "n": i} for i in range(DOCS)])
+    await collection.create_index("id", unique=True)
+    client.close()
+
+async def run(url: str, pool_size: int, concurrency: int, seconds: float):
+    listener = PoolStatsListener(window=100_000)
+    options = {**client_options(), "maxPoolSize": pool_size, "minPoolSize": 0}
+    client = AsyncIOMotorClient(url, event_listeners=[listener], **options)
+    collection = client[settings.DB_NAME][COLLECTION]
+    await collection.find_one({"id": "doc-0"})  # connect before timing
+
+    latencies = []
+    deadline = time.perf_counter() + seconds
+
+    async def worker():
+        while time.perf_counter() < deadline:
+            began = time.perf_counter()
+            await collection.find_one({"id": f"doc-{random.randrange(DOCS)}"}, {"_id": 0})
+            latencies.append((time.perf_counter() - began) * 1000)
+
+    began = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - began
+    client.close()
+
+    servers = listener.snapshot()["servers"].values()
+    return {
+        "ops": len(latencies) / elapsed,
+        "p50": percentile(latencies, 0.5),
+        "p99": percentile(latencies, 0.99),
+        "in_use": max((s["max_checked_out"] for s in servers), default=0),
+        "waiting": max((s["max_waiting"] for s in servers), default=0),
+        "wait_p99": percentile(list(listener.checkout_ms), 0.99),
+    }
+
+async def main():
+    concurrency = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 5
+    sizes = [int(s) for s in sys.argv[3].split(",")] if len(sys.argv) > 3 else [1, 5, 10, 25, 50, 100]
+    url = settings.MONGO_URL or "mongodb://localhost:27017"
+
+    await seed(url)
+    print(f"{concurrency} concurrent find_one callers, {seconds:.0f}s per pool size, compressors={client_options().get('compressors', [])}")
+    print(f"{'pool':>6} {'ops/s':>10} {'p50 ms':>8} {'p99 ms':>8} {'in use':>7} {'waiting':>8} {'wait p99 ms':>12}")
+    for size in sizes:
+        r = await run(url, size, concurrency, seconds)
+        print(f"{size:>6} {r['ops']:>10,.0f} {r['p50']:>8.2f} {r['p99']:>8.2f} {r['in_use']:>7} {r['waiting']:>8} {r['wait_p99']:>12.2f}")
+
+    client = AsyncIOMotorClient(url)
+    await client[settings.DB_NAME][COLLECTION].drop()
+    client.close()
+
+if __name__ == "__main__":
+    asyncio.run(main())
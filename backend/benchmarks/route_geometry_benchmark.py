@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Benchmark route geometry encodings.
+
+Builds the route payload for a synthetic city route (a jittered random walk
+with OSRM-like vertex density) in the original list-of-dicts format, as an
+encoded polyline and as a flat array, with and without zoom-aware
+simplification, and reports build time and JSON payload size.
+
+Usage: python benchmarks/route_geometry_benchmark.py [points]
+"""
+
+import json
+import math
+import os
+import random
+import sys
+import time
+
+# Add the backend directory to Python path
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from app.services.route_geometry import decode_polyline, format_route_geometry
+
+START = (77.5951, 13.1056)  # lng, lat
+
+def make_route(n: int) -> list:
+    """[longitude, latitude] vertices every ~10-30 m with gentle turns"""
+    lng, lat = START
+    heading = random.uniform(0, 2 * math.pi)
+    coordinates = []
+    for _ in range(n):
+        heading += random.gauss(0, 0.15)
+        step = random.uniform(10, 30) / 111_320
+        lng += step * math.cos(heading) / math.cos(math.radians(lat))
+        lat += step * math.sin(heading)
+        coordinates.append([round(lng, 6), round(lat, 6)])
+    return coordinates
+
+def measure(label: str, coordinates: list, geometry_format: str, zoom=None, repeat: int = 20):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        payload = format_route_geometry(coordinates, geometry_format, zoom)
+        body = json.dumps(payload)
+        best = min(best, time.perf_counter() - start)
+    print(f"{label:<26} {payload['route_points']:>7} pts {len(body) / 1024:>9.1f} KiB {best * 1000:>8.2f} ms")
+    return payload
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    random.seed(42)
+    coordinates = make_route(n)
+
+    print(f"{n}-vertex route, build + JSON serialization (best of 20)")
+    measure("objects (current)", coordinates, "objects")
+    measure("flat", coordinates, "flat")
+    encoded = measure("polyline", coordinates, "polyline")
+    for zoom in (16, 14, 12):
+        measure(f"polyline, zoom {zoom}", coordinates, "polyline", zoom)
+        measure(f"objects, zoom {zoom}", coordinates, "objects", zoom)
+
+    decoded = decode_polyline(encoded["route"])
+    error = max(abs(a - b[1]) + abs(c - b[0]) for (a, c), b in zip(decoded, coordinates))
+    print(f"polyline round-trip max error: {error:.6f} deg")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Benchmark stop-order optimization.
+
+For random instances of 10 to 200 stops around Bengaluru, compares the path
+length of the request order, nearest-neighbour construction alone and the
+full optimizer (2-opt + Or-opt under the time budget), with the start fixed
+as it is for an agent's current position.
+
+Usage: python benchmarks/route_optimizer_benchmark.py [budget_ms] [instances]
+"""
+
+import os
+import random
+import sys
+import time
+
+# Add the backend directory to Python path
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from app.services.geo_math import haversine_matrix
+from app.services.route_optimizer import nearest_neighbour, optimize_order, path_cost
+
+CENTER = (13.1056, 77.5951)  # lat, lng
+SIZES = [10, 20, 50, 100, 200]
+
+def random_stops(n: int) -> list:
+    return [(CENTER[0] + random.uniform(-0.1, 0.1), CENTER[1] + random.uniform(-0.1, 0.1)) for _ in range(n)]
+
+def main():
+    budget_ms = float(sys.argv[1]) if len(sys.argv) > 1 else 200
+    instances = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    random.seed(42)
+
+    print(f"budget={budget_ms:.0f}ms, {instances} instances per size, start fixed")
+    print(f"{'stops':>6} {'given km':>10} {'NN km':>10} {'opt km':>10} {'gain %':>8} {'vs NN %':>8} {'time ms':>9}")
+    for n in SIZES:
+        given = greedy = optimized = elapsed = 0.0
+        for _ in range(instances):
+            matrix = haversine_matrix(random_stops(n))
+            rows = matrix.tolist()
+            given += path_cost(list(range(n)), rows)
+            greedy += path_cost(nearest_neighbour(rows, start=0), rows)
+            started = time.perf_counter()
+            result = optimize_order(matrix, fix_start=True, budget_ms=budget_ms)
+            elapsed += (time.perf_counter() - started) * 1000
+            optimized += result["cost_after"]
+        print(
+            f"{n:>6} {given / instances:>10.1f} {greedy / instances:>10.1f} {optimized / instances:>10.1f} "
+            f"{(given - optimized) / given * 100:>8.1f} {(greedy - optimized) / greedy * 100:>8.1f} {elapsed / instances:>9.1f}"
+        )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Benchmark wave building.
+
+Clusters synthetic confirmed orders (a mix of dense apartment blocks and
+scattered houses, created over the last hour) with wave_service's
+grid-accelerated DBSCAN and sequences the stops of each wave.
+
+Usage: python benchmarks/wave_benchmark.py [orders] [blocks]
+"""
+
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+# Add the backend directory to Python path
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from app.core.config import settings
+from app.services.wave_service import cluster_orders, make_wave
+
+CENTER = (13.1056, 77.5951)  # lat, lng
+
+def make_orders(n: int, blocks: int) -> list:
+    now = datetime.utcnow()
+    hotspots = [(CENTER[0] + random.uniform(-0.15, 0.15), CENTER[1] + random.uniform(-0.15, 0.15)) for _ in range(blocks)]
+    orders = []
+    for i in range(n):
+        if random.random() < 0.6:
+            lat, lng = random.choice(hotspots)
+            lat, lng = lat + random.gauss(0, 0.0008), lng + random.gauss(0, 0.0008)
+        else:
+            lat, lng = CENTER[0] + random.uniform(-0.15, 0.15), CENTER[1] + random.uniform(-0.15, 0.15)
+        orders.append({
+            "id": f"order-{i}",
+            "delivery_location": {"latitude": lat, "longitude": lng},
+            "created_at": now - timedelta(minutes=random.uniform(0, 60)),
+        })
+    return orders
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    blocks = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    random.seed(42)
+    orders = make_orders(n, blocks)
+
+    started = time.perf_counter()
+    clusters = cluster_orders(orders)
+    clustering = time.perf_counter() - started
+
+    started = time.perf_counter()
+    waves = [make_wave("zone", cluster) for cluster in clusters]
+    sequencing = time.perf_counter() - started
+
+    in_waves = sum(len(c) for c in clusters)
+    print(f"{n} orders, radius={settings.WAVE_RADIUS_M:.0f}m, window={settings.WAVE_WINDOW_MINUTES:.0f}min, cap={settings.WAVE_MAX_ORDERS}")
+    print(f"clustering:  {clustering * 1000:8.1f} ms ({clustering / n * 1e6:.1f} us/order)")
+    print(f"sequencing:  {sequencing * 1000:8.1f} ms for {len(waves)} waves")
+    print(f"waves:       {len(waves):8d} holding {in_waves} orders ({in_waves / n * 100:.1f}%), mean size {in_waves / max(1, len(waves)):.2f}")
+    print(f"trips saved: {in_waves - len(waves):8d}")
+
+if __name__ == "__main__":
+    main()
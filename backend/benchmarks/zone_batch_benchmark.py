@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Benchmark batch serviceability checks.
+
+Compares the per-point ray-casting loop in geospatial_service (one
+is_point_in_polygon call per zone per point) with the zone index's scalar
+`locate` (coarse grid only, and with the precomputed cell table) and its
+NumPy-vectorized `locate_many` on synthetic zones.
+
+Usage: python benchmarks/zone_batch_benchmark.py [points] [zones] [vertices]
+"""
+
+import math
+import os
+import random
+import sys
+import time
+
+# Add the backend directory to Python path
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from app.services.geospatial_service import is_point_in_polygon
+from app.services.zone_index import ZoneIndex
+
+CENTER = (77.5951, 13.1056)  # lng, lat
+
+def make_zone(i: int, vertices: int) -> dict:
+    """Irregular star-shaped polygon around a random centre"""
+    cx = CENTER[0] + random.uniform(-0.5, 0.5)
+    cy = CENTER[1] + random.uniform(-0.5, 0.5)
+    ring = []
+    for k in range(vertices):
+        angle = 2 * math.pi * k / vertices
+        radius = random.uniform(0.05, 0.12)
+        ring.append([cx + radius * math.cos(angle), cy + radius * math.sin(angle)])
+    ring.append(ring[0])
+    return {"id": f"zone-{i}", "name": f"Zone {i}", "geometry": {"type": "Polygon", "coordinates": [ring]}}
+
+def timed(label: str, func, n: int):
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<32} {elapsed * 1000:10.1f} ms  {elapsed / n * 1e6:8.2f} us/point")
+    return result
+
+def main():
+    n_points = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    n_zones = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    n_vertices = int(sys.argv[3]) if len(sys.argv) > 3 else 200
+    random.seed(42)
+
+    zones = [make_zone(i, n_vertices) for i in range(n_zones)]
+    points = [
+        (CENTER[1] + random.uniform(-0.7, 0.7), CENTER[0] + random.uniform(-0.7, 0.7))
+        for _ in range(n_points)
+    ]
+    grid_index = ZoneIndex(cell_size_deg=0.05, table_cell_size_deg=0)
+    grid_index.build(zones)
+    index = ZoneIndex(cell_size_deg=0.05, table_cell_size_deg=0.005)
+    index.build(zones)
+    print(f"{n_points} points, {n_zones} zones x {n_vertices} vertices\n")
+
+    def ray_casting_loop():
+        out = []
+        for lat, lng in points:
+            match = None
+            for zone in zones:
+                if is_point_in_polygon((lng, lat), zone['geometry']['coordinates']):
+                    match = zone
+                    break
+            out.append(match)
+        return out
+
+    baseline = timed("per-point ray casting", ray_casting_loop, n_points)
+    grid_scalar = timed("grid index locate()", lambda: [grid_index.locate(lng, lat) for lat, lng in points], n_points)
+    scalar = timed("cell table locate()", lambda: [index.locate(lng, lat) for lat, lng in points], n_points)
+    lats, lngs = zip(*points)
+    batch = timed("zone index locate_many()", lambda: index.locate_many(lngs, lats), n_points)
+
+    ids = lambda zs: [z['id'] if z else None for z in zs]
+    mismatches = sum(a != b for a, b in zip(ids(scalar), ids(batch)))
+    mismatches += sum(a != b for a, b in zip(ids(grid_scalar), ids(batch)))
+    baseline_mismatches = sum(a != b for a, b in zip(ids(baseline), ids(batch)))
+    print(f"\nserviceable: {sum(1 for z in batch if z)} / {n_points}")
+    print(f"mismatches: scalar vs batch={mismatches}, ray casting vs batch={baseline_mismatches}")
+    print(f"cell table: {index.cell_table.stats()}")
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,25 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 import logging
 
 from app.core.config import settings
-from app.db.mongodb import connect_to_mongo, close_mongo_connection
+from app.db.mongodb import connect_to_mongo, close_mongo_connection, get_database
+from app.db.migrations import run_migrations
+from app.db.slow_queries import run_slow_query_explainer
 from app.api.v1.api import api_router
+from app.core.tasks import start_periodic_task, spawn_task, stop_background_tasks
+from app.core.metrics import CONTENT_TYPE, MetricsMiddleware, export_metrics, remove_metrics_export, render_metrics
+from app.services.stats_service import reconcile_stats
+from app.services.velocity_service import refresh_windowed_sales
+from app.services.zone_index import refresh_zone_index
+from app.services.osrm_client import start_osrm_client, close_osrm_client
+from app.services.route_cache import upgrade_fallback_routes
+from app.services.dispatch_service import run_dispatch
+from app.services.wave_service import build_waves
+from app.services.eta_service import refresh_eta_model
+from app.services.location_service import flush_locations
+from app.services.agent_index import reconcile_agent_load_counters, refresh_agent_index
 
 # Configure logging
 logging.basicConfig(
@@ -20,9 +34,39 @@ async def lifespan(app: FastAPI):
     logger.info("Starting up...")
     await connect_to_mongo()
     logger.info("Connected to MongoDB")
+    if settings.RUN_MIGRATIONS_ON_STARTUP:
+        try:
+            report = await run_migrations(await get_database())
+            logger.info(f"Migrations: indexes created={len(report['indexes']['created'])}, applied={report['applied']}")
+        except Exception as e:
+            logger.error(f"Startup migrations failed: {e}")
+    await start_osrm_client()
+    if settings.SLOW_QUERY_ENABLED and settings.SLOW_QUERY_EXPLAIN_VERBOSITY:
+        spawn_task("slow-query-explain", run_slow_query_explainer)
+    # Singleton jobs write shared data and run in one process at a time; the others
+    # refresh or flush this worker's in-memory state, so every worker runs them
+    start_periodic_task("stats-reconcile", reconcile_stats, settings.STATS_RECONCILE_INTERVAL_SECONDS, singleton=True)
+    start_periodic_task("sales-velocity-refresh", refresh_windowed_sales, settings.SALES_VELOCITY_REFRESH_INTERVAL_SECONDS, singleton=True)
+    start_periodic_task("zone-index-refresh", refresh_zone_index, settings.ZONE_INDEX_REFRESH_INTERVAL_SECONDS)
+    start_periodic_task("dispatch", run_dispatch, settings.DISPATCH_INTERVAL_SECONDS, singleton=True)
+    start_periodic_task("wave-build", build_waves, settings.WAVE_BUILD_INTERVAL_SECONDS, singleton=True)
+    start_periodic_task("eta-refresh", refresh_eta_model, settings.ETA_REFRESH_INTERVAL_SECONDS)
+    start_periodic_task("location-flush", flush_locations, settings.LOCATION_FLUSH_INTERVAL_SECONDS, run_immediately=False)
+    start_periodic_task("agent-index-refresh", refresh_agent_index, settings.AGENT_INDEX_REFRESH_INTERVAL_SECONDS)
+    start_periodic_task("agent-load-reconcile", reconcile_agent_load_counters, settings.AGENT_LOAD_RECONCILE_INTERVAL_SECONDS, singleton=True)
+    start_periodic_task("route-upgrade", upgrade_fallback_routes, settings.ROUTE_UPGRADE_INTERVAL_SECONDS, run_immediately=False)
+    if settings.METRICS_ENABLED and settings.METRICS_MULTIPROCESS_DIR:
+        start_periodic_task("metrics-export", export_metrics, settings.METRICS_EXPORT_INTERVAL_SECONDS)
     yield
     # Shutdown
     logger.info("Shutting down...")
+    await stop_background_tasks()
+    remove_metrics_export()
+    try:
+        await flush_locations(await get_database())
+    except Exception as e:
+        logger.error(f"Final location flush failed: {e}")
+    await close_osrm_client()
     await close_mongo_connection()
     logger.info("Disconnected from MongoDB")
 
@@ -43,6 +87,10 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Request latency, in-flight and response size metrics (outermost, so it times the whole stack)
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
 # Include API routers (api_router already includes v1 structure)
 app.include_router(api_router, prefix="/api/v1")
 
@@ -59,12 +107,12 @@ def read_root():
 def health_check():
     return {"status": "healthy", "version": settings.VERSION}
 
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """Prometheus scrape target (summed over workers when METRICS_MULTIPROCESS_DIR is set)"""
+    return Response(render_metrics(), media_type=CONTENT_TYPE)
+
 if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run(
-        "main:app",
-        host="0.0.0.0",
-        port=8000,
-        reload=True,
-        log_level="info"
-    )
\ No newline at end of file
+    # Production launcher (worker processes, uvloop); start_new_api.py is the auto-reload dev server
+    from serve import main
+    main()
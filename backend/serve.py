@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Production launcher for the API.
+
+Runs uvicorn with several worker processes sharing one listening socket, so
+requests are spread over every core this process may use. Indexes and
+migrations are applied once, here, before any worker starts. Each worker
+imports `main:app` and runs its own lifespan: its own Mongo pool, OSRM client,
+in-memory indexes and their refresh jobs; jobs on shared data (dispatch, waves,
+stats) run in whichever worker holds their lease. uvloop and httptools are used when
+installed (uvicorn's "auto"), and on SIGTERM/SIGINT every worker stops
+accepting connections, lets in-flight requests finish for up to
+WEB_GRACEFUL_TIMEOUT_SECONDS, then runs the lifespan shutdown (final location
+flush, closing the pools).
+
+Usage: python serve.py [--workers N] [--backlog N] [--host H] [--port P]
+Settings come from WEB_* (see app/core/config.py); flags override them.
+For development with auto-reload use `python start_new_api.py`.
+"""
+
+import argparse
+import asyncio
+import importlib.util
+import logging
+import math
+import os
+import shutil
+import sys
+import tempfile
+
+import uvicorn
+
+# Add the backend directory to Python path
+sys.path.append(os.path.dirname(__file__))
+
+from app.core.config import settings
+
+logger = logging.getLogger("serve")
+
+def _cgroup_cpu_limit():
+    """CPU quota of the container, if any (cgroup v2, then v1)"""
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+        if quota != "max":
+            return int(quota) / int(period)
+    except (OSError, ValueError):
+        pass
+    try:
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as f:
+            quota = int(f.read())
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as f:
+            period = int(f.read())
+        if quota > 0:
+            return quota / period
+    except (OSError, ValueError):
+        pass
+    return None
+
+def available_cpus() -> int:
+    """CPUs this process may run on: affinity mask, capped by a container quota"""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    limit = _cgroup_cpu_limit()
+    if limit is not None:
+        cpus = min(cpus, max(1, math.ceil(limit)))
+    return cpus
+
+def worker_count(requested: int = 0) -> int:
+    """
+    Number of worker processes: `requested` if positive, else one per
+    available CPU (the workers are async, so more would only contend for
+    cores), capped at WEB_MAX_WORKERS.
+    """
+    if requested > 0:
+        return requested
+    return max(1, min(available_cpus(), settings.WEB_MAX_WORKERS))
+
+def event_loop_stack() -> dict:
+    """What uvicorn's "auto" loop and HTTP parser resolve to here"""
+    return {
+        "loop": "uvloop" if importlib.util.find_spec("uvloop") else "asyncio",
+        "http": "httptools" if importlib.util.find_spec("httptools") else "h11",
+    }
+
+async def _migrate() -> bool:
+    # Imported here so the launcher only loads the database layer when it needs it
+    from app.db.migrations import run_migrations
+    from app.db.mongodb import close_mongo_connection, connect_to_mongo, get_database
+
+    await connect_to_mongo()
+    try:
+        report = await run_migrations(await get_database())
+    finally:
+        await close_mongo_connection()
+    logger.info(f"Migrations: indexes created={len(report['indexes']['created'])}, applied={report['applied']}")
+    return not (report["failed"] or report["indexes"]["failed"])
+
+def run_startup_migrations() -> None:
+    """
+    Ensure indexes and apply pending migrations in the launcher, so workers
+    start on an up-to-date schema and do not race each other for it. Failures
+    are logged and the API starts anyway, as it would from the lifespan.
+    """
+    try:
+        if not asyncio.run(_migrate()):
+            logger.error("Some startup migrations failed; see above")
+    except Exception as e:
+        logger.error(f"Startup migrations failed: {e}")
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Run the API with multiple worker processes")
+    parser.add_argument("--host", default=settings.WEB_HOST)
+    parser.add_argument("--port", type=int, default=settings.WEB_PORT)
+    parser.add_argument("--workers", type=int, default=settings.WEB_WORKERS, help="0: one per available CPU")
+    parser.add_argument("--backlog", type=int, default=settings.WEB_BACKLOG, help="Listen queue length (capped by net.core.somaxconn)")
+    parser.add_argument("--log-level", default="info")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    workers = worker_count(args.workers)
+    stack = event_loop_stack()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    logger.info(
+        f"Serving on {args.host}:{args.port} with {workers} worker(s) of {available_cpus()} CPU(s), "
+        f"loop={stack['loop']}, http={stack['http']}, backlog={args.backlog}, "
+        f"Mongo connections up to {workers * settings.MONGO_MAX_POOL_SIZE} ({settings.MONGO_MAX_POOL_SIZE} per worker)"
+    )
+
+    if settings.RUN_MIGRATIONS_ON_STARTUP:
+        run_startup_migrations()
+        # Already done; the workers read this when they import the settings
+        os.environ["RUN_MIGRATIONS_ON_STARTUP"] = "false"
+
+    # Let /metrics on any worker report all of them (see app/core/metrics.py)
+    metrics_dir = None
+    if workers > 1 and settings.METRICS_ENABLED and not settings.METRICS_MULTIPROCESS_DIR:
+        metrics_dir = os.environ["METRICS_MULTIPROCESS_DIR"] = tempfile.mkdtemp(prefix="delivery-metrics-")
+
+    try:
+        uvicorn.run(
+            "main:app",
+            host=args.host,
+            port=args.port,
+            workers=workers,
+            backlog=args.backlog,
+            loop="auto",
+            http="auto",
+            lifespan="on",
+            timeout_keep_alive=settings.WEB_KEEPALIVE_SECONDS,
+            timeout_graceful_shutdown=settings.WEB_GRACEFUL_TIMEOUT_SECONDS,
+            limit_concurrency=settings.WEB_LIMIT_CONCURRENCY or None,
+            access_log=settings.WEB_ACCESS_LOG,
+            proxy_headers=True,
+            server_header=False,
+            log_level=args.log_level,
+        )
+    finally:
+        if metrics_dir:
+            shutil.rmtree(metrics_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,9 @@
 """
 Startup script for the new enterprise-level API
 Run this instead of server.py to use the new modular structure
+
+Development server: one process with auto-reload. In production use
+`python serve.py` (worker processes, uvloop, graceful shutdown).
 """
 
 import uvicorn
@@ -12,7 +15,7 @@ import os
 sys.path.append(os.path.dirname(__file__))
 
 if __name__ == "__main__":
-    print("🚀 Starting Enterprise Delivery API...")
+    print("🚀 Starting Enterprise Delivery API (development, auto-reload)...")
     print("📚 API Documentation: http://localhost:8000/docs")
     print("🔗 ReDoc Documentation: http://localhost:8000/redoc")
     print("🏥 Health Check: http://localhost:8000/health")
@@ -0,0 +1,50 @@
+from datetime import datetime, timedelta
+
+from app.services.location_service import EPOCH, history_updates
+
+BASE = datetime(2026, 1, 1, 12, 0, 0)
+
+def ping(agent_id, seconds, latitude=12.9, longitude=77.6, accuracy_m=None, speed_mps=None, heading=None):
+    return (agent_id, BASE + timedelta(seconds=seconds), latitude, longitude, accuracy_m, speed_mps, heading)
+
+def by_id(updates):
+    return {update._filter["_id"]: update._doc for update in updates}
+
+def bucket_id(agent_id, seconds, bucket_seconds=60):
+    start = int((BASE + timedelta(seconds=seconds) - EPOCH).total_seconds()) // bucket_seconds * bucket_seconds
+    return f"{agent_id}:{start}"
+
+def test_one_upsert_per_agent_and_bucket():
+    pings = [ping("a", 0), ping("a", 30), ping("a", 61), ping("b", 10), ping("b", 20)]
+    updates = by_id(history_updates(pings, 60))
+    assert set(updates) == {bucket_id("a", 0), bucket_id("a", 61), bucket_id("b", 10)}
+    assert updates[bucket_id("a", 0)]["$inc"] == {"count": 2}
+    assert updates[bucket_id("a", 61)]["$inc"] == {"count": 1}
+    assert updates[bucket_id("b", 10)]["$inc"] == {"count": 2}
+
+def test_bucket_bounds_and_metadata():
+    pings = [ping("a", 45), ping("a", 5), ping("a", 20)]
+    (update,) = history_updates(pings, 60)
+    doc = update._doc
+    assert doc["$min"] == {"first_at": BASE + timedelta(seconds=5)}
+    assert doc["$max"] == {"last_at": BASE + timedelta(seconds=45)}
+    assert doc["$setOnInsert"] == {"agent_id": "a", "bucket_start": BASE}
+    # Points are pushed with a sort so out-of-order pings end up in time order
+    assert doc["$push"]["points"]["$sort"] == {"t": 1}
+    assert [p["t"] for p in doc["$push"]["points"]["$each"]] == [BASE + timedelta(seconds=s) for s in (45, 5, 20)]
+
+def test_bucket_boundaries_follow_the_bucket_size():
+    pings = [ping("a", 0), ping("a", 299), ping("a", 300)]
+    assert len(history_updates(pings, 300)) == 2
+    assert len(history_updates(pings, 600)) == 1
+
+def test_optional_fields_are_only_stored_when_reported():
+    pings = [ping("a", 0), ping("a", 1, accuracy_m=5.0, speed_mps=3.2, heading=90.0)]
+    (update,) = history_updates(pings, 60)
+    bare, full = update._doc["$push"]["points"]["$each"]
+    assert set(bare) == {"t", "lat", "lng"}
+    assert full == {"t": BASE + timedelta(seconds=1), "lat": 12.9, "lng": 77.6, "acc": 5.0, "spd": 3.2, "hdg": 90.0}
+
+def test_upserts_create_missing_buckets():
+    assert all(update._upsert for update in history_updates([ping("a", 0)], 60))
+    assert history_updates([], 60) == []
@@ -0,0 +1,86 @@
+import types
+
+import pytest
+
+from app.services import osrm_client
+from app.services.osrm_client import CircuitBreaker, CircuitOpenError
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(osrm_client, "time", types.SimpleNamespace(monotonic=clock.monotonic))
+    return clock
+
+@pytest.fixture
+def breaker(clock):
+    return CircuitBreaker(failure_threshold=3, reset_timeout=30)
+
+def trip(breaker):
+    for _ in range(breaker.failure_threshold):
+        breaker.before_call()
+        breaker.record_failure()
+
+def test_closed_until_the_failure_threshold(breaker):
+    for _ in range(2):
+        assert breaker.before_call() is False
+        breaker.record_failure()
+    assert breaker.state == "closed"
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+def test_success_resets_the_consecutive_failure_count(breaker):
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == "closed"
+
+def test_open_circuit_fails_fast(breaker, clock):
+    trip(breaker)
+    clock.now += 29
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+def test_half_open_lets_one_trial_through(breaker, clock):
+    trip(breaker)
+    clock.now += 30
+    assert breaker.state == "half_open"
+    assert breaker.before_call() is True
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+def test_successful_trial_closes_the_circuit(breaker, clock):
+    trip(breaker)
+    clock.now += 30
+    breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.failures == 0
+    assert breaker.before_call() is False
+
+def test_failed_trial_reopens_for_a_full_timeout(breaker, clock):
+    trip(breaker)
+    clock.now += 30
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    clock.now += 29
+    assert breaker.state == "open"
+    clock.now += 1
+    assert breaker.state == "half_open"
+
+def test_released_trial_can_be_retried(breaker, clock):
+    trip(breaker)
+    clock.now += 30
+    assert breaker.before_call() is True
+    breaker.release_trial()
+    assert breaker.state == "half_open"
+    assert breaker.before_call() is True
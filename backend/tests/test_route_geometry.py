@@ -0,0 +1,37 @@
+import random
+
+import pytest
+
+from app.services.route_geometry import decode_polyline, encode_polyline
+
+def test_reference_example():
+    # Example from the encoded polyline algorithm documentation
+    points = [(38.5, -120.2), (40.7, -120.95), (43.252, -126.453)]
+    encoded = encode_polyline(points)
+    assert encoded == "_p~iF~ps|U_ulLnnqC_mqNvxq`@"
+    assert decode_polyline(encoded) == points
+
+@pytest.mark.parametrize("precision", [5, 6])
+def test_round_trip(precision):
+    rng = random.Random(precision)
+    points = [
+        (round(rng.uniform(-89.9, 89.9), precision), round(rng.uniform(-179.9, 179.9), precision))
+        for _ in range(500)
+    ]
+    decoded = decode_polyline(encode_polyline(points, precision), precision)
+    assert len(decoded) == len(points)
+    for (lat, lng), (dlat, dlng) in zip(points, decoded):
+        assert dlat == pytest.approx(lat, abs=10 ** -precision / 2)
+        assert dlng == pytest.approx(lng, abs=10 ** -precision / 2)
+
+def test_coordinates_are_rounded_to_the_precision():
+    (lat, lng), = decode_polyline(encode_polyline([(12.9716049, 77.5945627)]))
+    assert (lat, lng) == (12.9716, 77.59456)
+
+def test_repeated_and_single_points():
+    points = [(12.97, 77.59), (12.97, 77.59), (-0.00001, 0.0)]
+    assert decode_polyline(encode_polyline(points)) == points
+
+def test_empty():
+    assert encode_polyline([]) == ""
+    assert decode_polyline("") == []
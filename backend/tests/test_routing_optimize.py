@@ -0,0 +1,98 @@
+import asyncio
+
+import httpx
+import pytest
+from fastapi import HTTPException
+
+from app.api.v1.endpoints import routing
+from app.models.route import Waypoint
+from app.services.osrm_client import CircuitOpenError
+from app.services.route_geometry import decode_polyline
+
+# Start, then three stops requested out of order along a line
+WAYPOINTS = [
+    Waypoint(latitude=12.90, longitude=77.50),
+    Waypoint(latitude=12.90, longitude=77.53),
+    Waypoint(latitude=12.90, longitude=77.51),
+    Waypoint(latitude=12.90, longitude=77.52),
+]
+
+def optimize(waypoints, **kwargs):
+    options = {"fix_start": True, "fix_end": False, "matrix": "haversine", "geometry": "objects", "zoom": None}
+    options.update(kwargs)
+    return asyncio.run(routing.optimize_route(waypoints, current_user=None, **options))
+
+def route_response(coordinates, source="osrm"):
+    route = {"geometry": {"coordinates": [[lng, lat] for lat, lng in coordinates]}, "duration": 600.0, "legs": []}
+    return {"routes": [route], "source": source}
+
+@pytest.fixture
+def routed(monkeypatch):
+    calls = []
+
+    async def get_route(coordinates):
+        calls.append(coordinates)
+        return route_response([(lat, lng) for lng, lat in coordinates])
+
+    monkeypatch.setattr(routing, "get_route", get_route)
+    return calls
+
+def test_waypoints_are_reordered_and_routed_in_the_new_order(routed):
+    result = optimize(WAYPOINTS)
+    assert result["order"] == [0, 2, 3, 1]
+    assert [wp["longitude"] for wp in result["waypoints"]] == [77.50, 77.51, 77.52, 77.53]
+    assert routed == [[(77.50, 12.90), (77.51, 12.90), (77.52, 12.90), (77.53, 12.90)]]
+    optimization = result["optimization"]
+    assert optimization["matrix"] == "haversine"
+    assert optimization["cost_after"] < optimization["cost_before"]
+    assert result["source"] == "osrm"
+    assert result["estimated_delivery_time"]["minutes"] > 0
+
+def test_fixed_end_stays_last(routed):
+    result = optimize(WAYPOINTS, fix_end=True)
+    assert result["order"][0] == 0 and result["order"][-1] == 3
+
+def test_polyline_geometry_is_returned_on_request(routed):
+    result = optimize(WAYPOINTS, geometry="polyline")
+    assert result["route_format"] == "polyline"
+    assert decode_polyline(result["route"]) == [(wp["latitude"], wp["longitude"]) for wp in result["waypoints"]]
+
+def test_fewer_than_two_waypoints_is_a_bad_request(routed):
+    with pytest.raises(HTTPException) as error:
+        optimize(WAYPOINTS[:1])
+    assert error.value.status_code == 400
+    assert routed == []
+
+def test_no_route_is_not_found(monkeypatch):
+    async def get_route(coordinates):
+        return {"routes": []}
+
+    monkeypatch.setattr(routing, "get_route", get_route)
+    with pytest.raises(HTTPException) as error:
+        optimize(WAYPOINTS)
+    assert error.value.status_code == 404
+
+@pytest.mark.parametrize("failure, status", [
+    (CircuitOpenError("open"), 503),
+    (httpx.ConnectError("refused"), 503),
+    (RuntimeError("boom"), 500),
+])
+def test_upstream_failures_map_to_status_codes(monkeypatch, failure, status):
+    async def get_route(coordinates):
+        raise failure
+
+    monkeypatch.setattr(routing, "get_route", get_route)
+    with pytest.raises(HTTPException) as error:
+        optimize(WAYPOINTS)
+    assert error.value.status_code == status
+
+def test_fallback_route_is_labelled(monkeypatch):
+    async def get_route(coordinates):
+        data = route_response([(lat, lng) for lng, lat in coordinates], source="fallback")
+        data["fallback_reason"] = "timeout"
+        return data
+
+    monkeypatch.setattr(routing, "get_route", get_route)
+    result = optimize(WAYPOINTS)
+    assert result["source"] == "fallback"
+    assert result["fallback_reason"] == "timeout"
@@ -0,0 +1,58 @@
+from datetime import datetime, timedelta
+
+from app.services.wave_service import cluster_orders
+
+BASE = datetime(2026, 1, 1, 12, 0)
+# ~11 m of latitude
+STEP = 0.0001
+
+def order(order_id, lat, lng, minutes=0):
+    return {
+        "id": order_id,
+        "delivery_location": {"latitude": lat, "longitude": lng},
+        "created_at": BASE + timedelta(minutes=minutes),
+    }
+
+def ids(clusters):
+    return [sorted(o["id"] for o in cluster) for cluster in clusters]
+
+def cluster(orders, **kwargs):
+    options = {"radius_m": 200, "window_minutes": 15, "max_orders": 6, "min_orders": 2}
+    options.update(kwargs)
+    return cluster_orders(orders, **options)
+
+def test_groups_nearby_orders_and_leaves_lone_orders_out():
+    orders = [
+        order("a1", 12.97, 77.59), order("a2", 12.97 + STEP, 77.59, 1), order("a3", 12.97, 77.59 + STEP, 2),
+        order("b1", 12.99, 77.62, 3), order("b2", 12.99 + STEP, 77.62, 4),
+        order("lone", 13.05, 77.70, 5),
+    ]
+    assert ids(cluster(orders)) == [["a1", "a2", "a3"], ["b1", "b2"]]
+
+def test_orders_outside_the_time_window_are_not_neighbours():
+    orders = [order("early", 12.97, 77.59), order("late", 12.97 + STEP, 77.59, 60)]
+    assert cluster(orders) == []
+
+def test_whole_cluster_fits_inside_the_time_window():
+    # Each order is within the window of the next, but the chain spans 24 minutes
+    orders = [order(f"o{i}", 12.97 + i * STEP, 77.59, i * 8) for i in range(4)]
+    for members in cluster(orders):
+        times = [o["created_at"] for o in members]
+        assert max(times) - min(times) <= timedelta(minutes=15)
+
+def test_cluster_size_is_capped():
+    orders = [order(f"o{i}", 12.97 + (i % 3) * STEP, 77.59 + (i // 3) * STEP, i) for i in range(9)]
+    clusters = cluster(orders, max_orders=4)
+    assert clusters and all(len(members) <= 4 for members in clusters)
+    assert len({o["id"] for members in clusters for o in members}) == sum(len(members) for members in clusters)
+
+def test_too_few_orders_form_no_cluster():
+    assert cluster([order("only", 12.97, 77.59)]) == []
+    assert cluster([order("a", 12.97, 77.59), order("b", 12.97 + STEP, 77.59)], min_orders=3) == []
+
+def test_oldest_cluster_comes_first():
+    orders = [
+        order("new1", 12.99, 77.62, 10), order("new2", 12.99 + STEP, 77.62, 11),
+        order("old1", 12.97, 77.59, 0), order("old2", 12.97 + STEP, 77.59, 1),
+    ]
+    assert ids(cluster(orders)) == [["old1", "old2"], ["new1", "new2"]]
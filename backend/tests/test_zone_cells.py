@@ -0,0 +1,93 @@
+import math
+import random
+
+import numpy as np
+import pytest
+
+from app.services.zone_index import ZoneIndex
+
+def star(cx, cy, radius, points=9, seed=0):
+    rng = random.Random(seed)
+    ring = []
+    for i in range(points * 2):
+        angle = math.pi * i / points
+        r = radius * (1.0 if i % 2 == 0 else rng.uniform(0.3, 0.7))
+        ring.append([cx + r * math.cos(angle), cy + r * math.sin(angle)])
+    return ring + [ring[0]]
+
+def box(x0, y0, x1, y1):
+    return [[x0, y0], [x1, y0], [x1, y1], [x0, y1], [x0, y0]]
+
+ZONES = [
+    {"id": "star", "geometry": {"type": "Polygon", "coordinates": [star(77.60, 12.97, 0.05)]}},
+    # Overlaps the star; the star is listed first and wins where both contain a point
+    {"id": "donut", "geometry": {"type": "Polygon", "coordinates": [
+        box(77.58, 12.95, 77.70, 13.02), box(77.62, 12.97, 77.66, 12.99)[::-1]
+    ]}},
+    {"id": "islands", "geometry": {"type": "MultiPolygon", "coordinates": [
+        [star(77.80, 12.90, 0.02, seed=1)], [box(77.84, 12.88, 77.86, 12.92)]
+    ]}},
+    {"id": "legacy", "coordinates": [
+        {"lat": 12.80, "lng": 77.50}, {"lat": 12.80, "lng": 77.55}, {"lat": 12.84, "lng": 77.52}
+    ]},
+]
+
+def ray_casting(index, x, y):
+    """Exact answer: the first zone whose rings contain the point"""
+    for entry in index.zones:
+        if entry.contains(x, y):
+            return entry.zone.get("id")
+    return None
+
+@pytest.fixture(scope="module")
+def points():
+    rng = np.random.default_rng(7)
+    xs = rng.uniform(77.45, 77.90, 20000)
+    ys = rng.uniform(12.75, 13.05, 20000)
+    return xs.tolist(), ys.tolist()
+
+@pytest.mark.parametrize("table_cell_size", [0.002, 0.01, 0.05])
+def test_cell_table_matches_ray_casting(points, table_cell_size):
+    index = ZoneIndex(cell_size_deg=0.05, table_cell_size_deg=table_cell_size, max_table_cells=10_000_000)
+    index.build(ZONES)
+    assert index.cell_table is not None
+    xs, ys = points
+    for x, y in zip(xs, ys):
+        zone = index.locate(x, y)
+        assert (zone.get("id") if zone else None) == ray_casting(index, x, y), (x, y)
+
+def test_cell_table_classifies_inside_and_boundary_cells():
+    index = ZoneIndex(cell_size_deg=0.05, table_cell_size_deg=0.005, max_table_cells=10_000_000)
+    index.build(ZONES)
+    stats = index.cell_table.stats()
+    assert stats["inside_cells"] > 0 and stats["boundary_cells"] > 0
+    # A point deep inside a zone is answered from an inside cell without a polygon test
+    before = index.cell_table.boundary_lookups
+    assert index.locate(77.68, 13.01)["id"] == "donut"
+    assert index.cell_table.boundary_lookups == before
+
+def test_holes_and_outside_points():
+    index = ZoneIndex(cell_size_deg=0.05, table_cell_size_deg=0.005, max_table_cells=10_000_000)
+    index.build(ZONES)
+    assert index.locate(77.64, 12.98) is None  # in the donut's hole
+    assert index.locate(77.30, 12.50) is None  # far from every zone
+    assert index.locate(77.52, 12.81)["id"] == "legacy"
+
+def test_grid_fallback_and_batch_lookups_agree(points):
+    table = ZoneIndex(cell_size_deg=0.05, table_cell_size_deg=0.005, max_table_cells=10_000_000)
+    grid = ZoneIndex(cell_size_deg=0.05, table_cell_size_deg=0)
+    table.build(ZONES)
+    grid.build(ZONES)
+    assert grid.cell_table is None
+    xs, ys = points
+    batch = [zone.get("id") if zone else None for zone in table.locate_many(xs, ys)]
+    assert batch == [ray_casting(table, x, y) for x, y in zip(xs, ys)]
+    for x, y, expected in list(zip(xs, ys, batch))[:2000]:
+        zone = grid.locate(x, y)
+        assert (zone.get("id") if zone else None) == expected
+
+def test_table_over_the_cell_limit_is_disabled():
+    index = ZoneIndex(cell_size_deg=0.05, table_cell_size_deg=0.0001, max_table_cells=1000)
+    index.build(ZONES)
+    assert index.cell_table is None
+    assert index.locate(77.68, 13.01)["id"] == "donut"
@@ -0,0 +1,84 @@
+import pytest
+
+from app.services.zone_geometry import _signed_area, normalize_zone_geometry, simplify_ring, validate_polygon_rings
+
+def square(x0, y0, size, clockwise=False):
+    ring = [[x0, y0], [x0 + size, y0], [x0 + size, y0 + size], [x0, y0 + size], [x0, y0]]
+    return ring[::-1] if clockwise else ring
+
+def polygon(*rings):
+    return {"type": "Polygon", "coordinates": list(rings)}
+
+def test_valid_polygon_with_hole_is_kept():
+    geometry, report = normalize_zone_geometry(polygon(square(0, 0, 1), square(0.25, 0.25, 0.5, clockwise=True)))
+    assert geometry["type"] == "Polygon"
+    exterior, hole = geometry["coordinates"]
+    assert _signed_area(exterior) > 0 and _signed_area(hole) < 0
+    assert report["repairs"] == []
+    assert report["rings"] == 2
+
+def test_closure_and_winding_are_repaired():
+    # Clockwise exterior, not closed
+    geometry, report = normalize_zone_geometry(polygon(square(0, 0, 1, clockwise=True)[:-1]))
+    ring = geometry["coordinates"][0]
+    assert ring[0] == ring[-1]
+    assert _signed_area(ring) > 0
+    assert any("closed ring" in repair for repair in report["repairs"])
+    assert any("reversed winding order" in repair for repair in report["repairs"])
+
+def test_repeated_vertices_are_removed():
+    ring = [[0, 0], [1, 0], [1, 0], [1, 1], [0, 1], [0, 0]]
+    geometry, report = normalize_zone_geometry(polygon(ring))
+    assert len(geometry["coordinates"][0]) == 5
+    assert any("repeated vertex" in repair for repair in report["repairs"])
+
+@pytest.mark.parametrize("rings, message", [
+    ([[[0, 0], [2, 2], [2, 0], [0, 1], [0, 0]]], "self-intersects"),
+    ([[[0, 0], [1, 0], [2, 0], [0, 0]]], "zero area"),
+    ([[[0, 0], [1, 0], [0, 0]]], "at least 3"),
+    ([[[0, 0], [200, 0], [0, 1], [0, 0]]], "out of range"),
+    ([square(0, 0, 1), square(2, 2, 0.5)], "outside the exterior"),
+    ([square(0, 0, 1), square(0.5, 0.5, 1)], "cross"),
+    ([square(0, 0, 1), square(0.1, 0.1, 0.8), square(0.3, 0.3, 0.2)], "inside hole"),
+])
+def test_invalid_polygons_are_rejected(rings, message):
+    with pytest.raises(ValueError, match=message):
+        normalize_zone_geometry(polygon(*rings))
+
+def test_multipolygon_parts_are_validated_separately():
+    geometry, report = normalize_zone_geometry({
+        "type": "MultiPolygon",
+        "coordinates": [[square(0, 0, 1)], [square(1, 0, 1)]],  # sharing an edge is allowed
+    })
+    assert geometry["type"] == "MultiPolygon"
+    assert report["polygons"] == 2
+
+def test_unsupported_geometry_is_rejected():
+    with pytest.raises(ValueError):
+        normalize_zone_geometry({"type": "Point", "coordinates": [0, 0]})
+
+def test_ring_validation_reports_the_crossing_rings():
+    exterior = [tuple(p) for p in square(0, 0, 1)]
+    hole = [tuple(p) for p in square(0.9, 0.4, 0.2, clockwise=True)]
+    with pytest.raises(ValueError, match="rings 0 and 1 cross"):
+        validate_polygon_rings([exterior, hole], "zone")
+
+def test_simplification_drops_collinear_vertices_within_tolerance():
+    # Exterior with many vertices along its bottom edge
+    bottom = [[i / 100, 0.0] for i in range(101)]
+    ring = bottom + [[1.0, 1.0], [0.0, 1.0], [0.0, 0.0]]
+    geometry, report = normalize_zone_geometry(polygon(ring), simplify_tolerance_m=10)
+    assert report["vertices_after"] < report["vertices_before"]
+    assert report["vertices_after"] == 4
+
+def test_simplification_that_breaks_a_hole_keeps_the_original_rings():
+    # A ~110 m dent in the exterior holds the bottom of a hole; simplifying the dent away cuts through the hole
+    exterior = [[0.0, 0.0], [0.4, 0.0], [0.5, -0.001], [0.6, 0.0], [1.0, 0.0], [1.0, 1.0], [0.0, 1.0], [0.0, 0.0]]
+    hole = [[0.47, -0.0003], [0.47, 0.1], [0.53, 0.1], [0.53, -0.0003], [0.47, -0.0003]]
+    geometry, report = normalize_zone_geometry(polygon(exterior, hole), simplify_tolerance_m=200)
+    assert [0.5, -0.001] in geometry["coordinates"][0]
+    assert any("kept the unsimplified rings" in repair for repair in report["repairs"])
+
+def test_small_rings_are_not_simplified():
+    ring = [(0.0, 0.0), (1.0, 0.0), (1.0, 1.0), (0.0, 0.0)]
+    assert simplify_ring(ring, 1_000_000) == ring